@@ -114,7 +114,7 @@ class scattershot_preferences(AddonPreferences):
   )
   name: bpy.props.StringProperty(
     name = 'File Name',
-    description = 'Supported variables: C = channel, G = node group name, L = node label, M = material name, N = node name. Do not exclude the channel or the textures will overwrite each other',
+    description = 'Supported variables: C = channel, G = node group name, L = node label, M = material name, N = node name, S = texture size. Do not exclude the channel or the textures will overwrite each other',
     default = "{M}_{G}_{C}"
   )
   format: bpy.props.EnumProperty(
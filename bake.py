@@ -21,13 +21,19 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, see <https://www.gnu.org/licenses/>.
 '''
 
-import bpy, mathutils
-from .utilities.node_interface import create_socket, get_io_sockets, get_socket, move_socket
-from .utilities.utilities import get_scatter_sources, has_scatter_uvs, mode_toggle, save_image
-from .defaults import texture_names, data_channels, detail_channels, data_color_spaces, file_types
+import bpy, mathutils, os, shutil, hashlib
+import numpy as np
+from .utilities.node_interface import create_socket, get_io_sockets, get_socket, move_socket, remove_socket
+from .utilities.utilities import get_scatter_sources, is_scatter_source, get_material_scatter_nodes, get_node_tree_material, has_scatter_uvs, mode_toggle, save_image
+from .defaults import texture_names, data_channels, detail_channels, data_color_spaces, file_types, bake_targets_property
 from .clear_bake import clear_bake
 from .unwrap import unwrap
 from .denoise_image import denoise_image
+from .utilities.image_processing import (
+  get_image_pixels, set_image_pixels, new_image_from_pixels, create_mip_levels, rasterize_uv_triangles,
+  count_uv_coverage, dilate_pixels, srgb_to_linear, sample_image
+)
+from .utilities.shader_evaluation import ShaderEvaluator, UnsupportedNodeError, to_array, is_group_input, get_source_selection, select_source_images
 from copy import copy
 
 
@@ -71,154 +77,1145 @@ def is_in_texture_set(object, active_material):
   return False
 
 
-def bake_scatter(self, context, objects):
+def get_material_objects(context, material):
+  return [x for x in context.scene.objects if x.material_slots.items() and is_in_texture_set(x, material)]
+
+
+def get_objects_materials(objects):
+  materials = []
+  for obj in objects:
+    for slot in obj.material_slots:
+      if slot.material and slot.material not in materials:
+        materials.append(slot.material)
+  return materials
+
+
+def get_object_scatter_nodes(obj):
+  scatter_nodes = []
+  if obj:
+    for material in get_objects_materials([obj]):
+      scatter_nodes.extend(get_material_scatter_nodes(material))
+  return scatter_nodes
+
+
+def get_texture_file_name(preferences, channel, scatter_node, material):
+  return preferences.name.replace(
+    '{C}', channel).replace(
+    '{G}', scatter_node.node_tree.name).replace(
+    '{L}', scatter_node.label).replace(
+    '{M}', material.name).replace(
+    '{N}', scatter_node.name)
+
+
+def get_atlas_name(objects, scatter_nodes):
+  # The atlas layout depends on the objects that are unwrapped together and on the scatter nodes that share it,
+  # so both go into the name. Otherwise different objects or scatter sets would overwrite each other's atlas.
+  object_names = sorted(x.name for x in objects)
+  scatter_names = sorted(f"{x.id_data.name}/{x.name}" for x in scatter_nodes)
+  digest = hashlib.sha1('|'.join(object_names + scatter_names).encode()).hexdigest()[:8]
+  return object_names[0] if object_names else 'Atlas', f"Atlas {digest}"
+
+
+def get_atlas_file_name(preferences, channel, atlas_name):
+  object_name, set_name = atlas_name
+  return preferences.name.replace(
+    '{C}', channel).replace(
+    '{G}', set_name).replace(
+    '{L}', set_name).replace(
+    '{M}', object_name).replace(
+    '{N}', set_name)
+
+
+def get_sized_file_name(file_name, width, height, is_lod=False):
+  size = str(width) if width == height else f"{width}x{height}"
+  if '{S}' in file_name:
+    return file_name.replace('{S}', size)
+  elif is_lod:
+    return f"{file_name}_{size}"
+  return file_name
+
+
+def get_format_settings(preferences, channel):
+  if channel in detail_channels:
+    file_format = preferences.data_format
+  else:
+    file_format = preferences.format
+
+  if channel in detail_channels and preferences.data_format == 'OPEN_EXR':
+    color_depth = preferences.data_float
+  elif channel in detail_channels:
+    color_depth = preferences.data_depth
+  elif preferences.format == 'OPEN_EXR':
+    color_depth = preferences.color_float
+  else:
+    color_depth = preferences.color_depth
+
+  return {
+    'format': file_format,
+    'color_depth': color_depth,
+  }
+
+
+def get_bake_image(self, job):
+  # Reuses the image from the previous bake of this node and channel so that re-baking does not leak buffers
+  channel = job['channel']
+  image = None
+  for target in job['targets']:
+    image_name = target['scatter_node'].node_tree.get(bake_targets_property, {}).get(channel)
+    if image_name and image_name in bpy.data.images:
+      image = bpy.data.images[image_name]
+      break
+
+  if image and not image.is_float:
+    bpy.data.images.remove(image)
+    image = None
+  if image:
+    # Sequences and denoised results are file images, but baking only needs the pixel buffer
+    if image.source == 'SEQUENCE':
+      image.source = 'FILE'
+    if tuple(image.size) != (self.width, self.height):
+      image.scale(self.width, self.height)
+    image.name = job['file_name']
+    set_bake_color_space(image, channel)
+  else:
+    image = create_bake_image(self, job['file_name'], channel)
+
+  for target in job['targets']:
+    node_tree = target['scatter_node'].node_tree
+    if bake_targets_property not in node_tree:
+      node_tree[bake_targets_property] = {}
+    node_tree[bake_targets_property][channel] = image.name
+  return image
+
+
+def create_bake_image(self, name, channel):
+  image = bpy.data.images.new(name, self.width, self.height, float_buffer = True, is_data = True)
+  set_bake_color_space(image, channel)
+  return image
+
+
+def set_bake_color_space(image, channel):
+  color_spaces = [x.name for x in bpy.types.ColorManagedInputColorspaceSettings.bl_rna.properties['name'].enum_items]
+  if channel in data_channels or channel in detail_channels:
+    for space in data_color_spaces:
+      if space in color_spaces:
+        image.colorspace_settings.name = space
+        break
+  else:
+    image.colorspace_settings.name = 'sRGB'
+
+
+def get_bake_texture(scatter_node, channel, output_idx):
+  # Overwrites previous baked result or creates a new texture
+  group_nodes = scatter_node.node_tree.nodes
+  texture_node_name = f"Baked {channel}"
+  if texture_node_name in [x.name for x in group_nodes]:
+    return group_nodes[texture_node_name], False
+  texture = group_nodes.new('ShaderNodeTexImage')
+  texture.name = texture_node_name
+  texture.location = [3000, -300 * output_idx]
+  return texture, True
+
+
+def get_material_output(node_tree):
+  if node_tree.get_output_node('CYCLES'):
+    return node_tree.get_output_node('CYCLES')
+  return node_tree.nodes.new('ShaderNodeOutputMaterial')
+
+
+def link_bake_output(output):
+  # Links the channel output to the material output and returns the previous connection
+  node_tree = output.node.id_data
+  material_output = get_material_output(node_tree)
+  if material_output.inputs[0].links:
+    current_output_socket = material_output.inputs[0].links[0].from_socket
+  else:
+    current_output_socket = None
+  if output.name == 'Normal':
+    # TODO: Properly output tangent space normals
+    pass
+  node_tree.links.new(output, material_output.inputs[0])
+  return material_output, current_output_socket
+
+
+def restore_bake_output(material_output, current_output_socket):
+  links = material_output.id_data.links
+  if current_output_socket:
+    links.new(current_output_socket, material_output.inputs[0])
+  elif material_output.inputs[0].links:
+    links.remove(material_output.inputs[0].links[0])
+
+
+def set_plane_bake_properties(scene, samples):
+  set_bake_properties(scene, {
+    'engine': 'CYCLES',
+    'bake_type': 'EMIT',
+    'use_selected_to_active': False,
+    'target': 'IMAGE_TEXTURES',
+    'use_clear': True,
+    'use_bake_multires': False,
+    'samples': samples,
+    'margin_type': 'EXTEND',
+    'margin': 0,
+    'denoise': False,
+  })
+
+
+def create_bake_plane(context, material, uv_width, uv_height):
+  # A temporary quad for baking a patch of UV space. The scatter reads the render UVs, while the bake fills the whole image.
+  mesh = bpy.data.meshes.new('Scattershot Bake Plane')
+  mesh.from_pydata([(0, 0, 0), (uv_width, 0, 0), (uv_width, uv_height, 0), (0, uv_height, 0)], [], [(0, 1, 2, 3)])
+  obj_uvs = context.active_object.data.uv_layers if context.active_object and context.active_object.type == 'MESH' else []
+  render_uvs = [x for x in obj_uvs if x.active_render]
+  scatter_uvs = mesh.uv_layers.new(name=render_uvs[0].name if render_uvs else 'UVMap')
+  bake_uvs = mesh.uv_layers.new(name='ScattershotPlaneBake')
+  for loop_idx, corner in enumerate([(0, 0), (1, 0), (1, 1), (0, 1)]):
+    scatter_uvs.data[loop_idx].uv = (corner[0] * uv_width, corner[1] * uv_height)
+    bake_uvs.data[loop_idx].uv = corner
+  scatter_uvs.active_render = True
+  mesh.uv_layers.active = bake_uvs
+  mesh.materials.append(material)
+  plane = bpy.data.objects.new('Scattershot Bake Plane', mesh)
+  context.scene.collection.objects.link(plane)
+  return plane
+
+
+def remove_bake_plane(plane):
+  mesh = plane.data
+  bpy.data.objects.remove(plane)
+  bpy.data.meshes.remove(mesh)
+
+
+def bake_plane_channel(context, plane, material, output, name, width, height):
+  image = bpy.data.images.new(name, width, height, float_buffer = True, is_data = True)
+  set_bake_color_space(image, output.name)
+  texture = material.node_tree.nodes.new('ShaderNodeTexImage')
+  texture.image = image
+  material.node_tree.nodes.active = texture
+  connection = link_bake_output(output)
+  try:
+    for obj in context.scene.objects:
+      obj.select_set(obj == plane)
+    context.view_layer.objects.active = plane
+    bpy.ops.object.bake(type='EMIT')
+  finally:
+    restore_bake_output(*connection)
+    material.node_tree.nodes.remove(texture)
+  return image
+
+
+def connect_baked_socket(scatter_node, from_socket, output):
+  # Exposes a baked result as a "Baked" output of the scatter node and moves the existing connections to it
+  links = scatter_node.id_data.links
+  group_nodes = scatter_node.node_tree.nodes
+  group_links = scatter_node.node_tree.links
+  baked_output_name = f"Baked {output.name}"
+  if baked_output_name not in [x.name for x in scatter_node.outputs]:
+    if output.name == 'Normal':
+      output_type = 'NodeSocketVector'
+    elif output.name in data_channels:
+      output_type = 'NodeSocketFloat'
+    else:
+      output_type = 'NodeSocketColor'
+    new_socket = create_socket(scatter_node.node_tree, 'OUTPUT', output_type, baked_output_name)
+    output_count = len(get_io_sockets(scatter_node.node_tree, 'OUTPUT'))
+    move_socket(scatter_node.node_tree, 'OUTPUT', new_socket, output_count -2)
+  group_links.new(from_socket, group_nodes["Group Output"].inputs[baked_output_name])
+
+  # Rewires socket connections
+  to_sockets = [x.to_socket for x in output.links]
+  for socket in to_sockets:
+    links.new(scatter_node.outputs[baked_output_name], socket)
+
+
+def finish_baked_node(self, scatter_node, new_textures, only_displacement):
+  # Moves Displacement to the bottom
+  displacement_socket = get_socket(scatter_node.node_tree, 'OUTPUT', 'Baked Displacement')
+  if displacement_socket:
+    output_count = len(scatter_node.outputs)
+    move_socket(scatter_node.node_tree, 'OUTPUT', displacement_socket, output_count -2)
+
+  # Sets up nodes for UVs
+  if 'UV Map' not in [x.name for x in scatter_node.inputs]:
+    uv_input = create_socket(scatter_node.node_tree, 'INPUT', 'NodeSocketVector', 'UV Map')
+    uv_input.hide_value = True
+  group_input = scatter_node.node_tree.nodes['Group Input']
+  mixed_uvs = scatter_node.node_tree.nodes['UVs']
+  scatter_node.node_tree.links.new(group_input.outputs['UV Map'], scatter_node.node_tree.nodes['User UVs'].inputs[0])
+  for texture in new_textures:
+    if texture.type == 'TEX_IMAGE':
+      scatter_node.node_tree.links.new(mixed_uvs.outputs[0], texture.inputs[0])
+  if self.should_unwrap and self.target == 'IMAGE_TEXTURES':
+    scatter_node.node_tree.nodes['UV Map'].uv_map = "ScattershotUVs"
+
+  # Hides unused sockets
+  if not only_displacement:
+    for output in scatter_node.outputs:
+      if output.name in texture_names.keys() or output.name == 'Random Color' or output.name == 'Image':
+        output.hide = True
+    for input in scatter_node.inputs:
+      if input.name != 'UV Map':
+        input.hide = True
+
+
+def get_bake_jobs(self, context, scatter_nodes, objects):
+  # Each job bakes one channel into one image. Atlas jobs share the image between several scatter nodes.
   preferences = context.preferences.addons[__package__].preferences
-  selected_nodes = context.selected_nodes
-  nodes = selected_nodes[0].id_data.nodes
-  links = selected_nodes[0].id_data.links
+  atlas_name = get_atlas_name(objects, scatter_nodes) if self.use_atlas else None
+  jobs = []
+  atlas_jobs = {}
+  for scatter_node in scatter_nodes:
+    material = get_node_tree_material(scatter_node.id_data)
+    bake_outputs = [x for x in scatter_node.outputs if x.name == 'Image' or x.name in texture_names.keys()]
+    for output_idx, output in enumerate(bake_outputs):
+      if not getattr(self, output.name):
+        continue
+      target = {'scatter_node': scatter_node, 'material': material, 'output': output, 'output_idx': output_idx}
+      if self.use_atlas:
+        if output.name not in atlas_jobs:
+          atlas_jobs[output.name] = {
+            'channel': output.name,
+            'file_name': get_atlas_file_name(preferences, output.name, atlas_name),
+            'atlas_name': atlas_name,
+            'targets': [],
+            'objects': objects,
+            'is_atlas': True,
+          }
+          jobs.append(atlas_jobs[output.name])
+        if material in [x['material'] for x in atlas_jobs[output.name]['targets']]:
+          self.report({'WARNING'}, f'Only one scatter node per material can be baked to the {output.name} atlas. Skipping {scatter_node.name} in {material.name}')
+          continue
+        atlas_jobs[output.name]['targets'].append(target)
+      else:
+        jobs.append({
+          'channel': output.name,
+          'file_name': get_texture_file_name(preferences, output.name, scatter_node, material),
+          'targets': [target],
+          'objects': [x for x in objects if is_in_texture_set(x, material)],
+          'is_atlas': False,
+        })
+
+  if self.target == 'VERTEX_COLORS':
+    assign_color_attributes(self, context, jobs)
+  elif self.use_deferred and not self.use_atlas and not self.use_frame_range:
+    jobs = defer_source_channels(self, jobs)
+  return jobs
+
+
+def assign_color_attributes(self, context, jobs):
+  # Color channels get their own attribute, while value channels are packed three to an attribute
+  preferences = context.preferences.addons[__package__].preferences
+  packed_channels = {}
+  for job in jobs:
+    target = job['targets'][0]
+    if job['channel'] not in data_channels:
+      job['attribute'] = (job['file_name'], None)
+      continue
+    if job['is_atlas']:
+      key = None
+      base_name = get_atlas_file_name(preferences, 'Data', job['atlas_name'])
+    else:
+      key = target['scatter_node']
+      base_name = get_texture_file_name(preferences, 'Data', target['scatter_node'], target['material'])
+    pack_idx = packed_channels.get(key, 0)
+    packed_channels[key] = pack_idx + 1
+    job['attribute'] = (f"{base_name} {pack_idx // 3 + 1}", pack_idx % 3)
+
+
+def pack_color_attribute(mesh, source_name, packed_name, component):
+  source = mesh.color_attributes[source_name]
+  values = np.empty(len(source.data) * 4, dtype=np.float32)
+  source.data.foreach_get('color', values)
+  if packed_name in mesh.color_attributes:
+    packed_values = np.empty(len(values), dtype=np.float32)
+    mesh.color_attributes[packed_name].data.foreach_get('color', packed_values)
+  else:
+    mesh.color_attributes.new(packed_name, 'FLOAT_COLOR', 'POINT')
+    packed_values = np.ones(len(values), dtype=np.float32)
+  packed_values.reshape(-1, 4)[:, component] = values.reshape(-1, 4)[:, 0]
+  mesh.color_attributes[packed_name].data.foreach_set('color', packed_values)
+  mesh.color_attributes.remove(mesh.color_attributes[source_name])
+
+
+def get_baked_attribute_socket(scatter_node, channel, attribute_name, component, output_idx):
+  nodes = scatter_node.node_tree.nodes
+  attribute_node = nodes.new('ShaderNodeVertexColor')
+  attribute_node.name = f"Baked {channel}"
+  attribute_node.layer_name = attribute_name
+  attribute_node.location = [3000, -300 * output_idx]
+  if component is None:
+    return attribute_node, attribute_node.outputs['Color']
+  separate = nodes.new('ShaderNodeSeparateColor')
+  separate.name = f"Baked {channel} Component"
+  separate.location = [3200, -300 * output_idx]
+  scatter_node.node_tree.links.new(attribute_node.outputs['Color'], separate.inputs[0])
+  return attribute_node, separate.outputs[component]
+
+
+def bake_color_attribute(self, context, job):
+  # Cycles bakes into the active color attribute. Value channels bake into a temporary attribute first
+  # and are then copied into one component of their packed attribute.
+  channel = job['channel']
+  attribute_name, component = job['attribute']
+  bake_name = attribute_name if component is None else f"{attribute_name} {channel}"
+  meshes = []
+  for obj in job['objects']:
+    if obj.data not in meshes:
+      meshes.append(obj.data)
+
+  prev_active_names = {}
+  for mesh in meshes:
+    if mesh.color_attributes.active_color:
+      prev_active_names[mesh] = mesh.color_attributes.active_color.name
+    if bake_name not in mesh.color_attributes:
+      mesh.color_attributes.new(bake_name, 'FLOAT_COLOR', 'POINT')
+    mesh.color_attributes.active_color = mesh.color_attributes[bake_name]
+
+  connections = [link_bake_output(x['output']) for x in job['targets']]
+  try:
+    select_bake_objects(job)
+    yield
+    if component is not None:
+      for mesh in meshes:
+        pack_color_attribute(mesh, bake_name, attribute_name, component)
+  finally:
+    for material_output, current_output_socket in connections:
+      restore_bake_output(material_output, current_output_socket)
+    for mesh, name in prev_active_names.items():
+      if name in mesh.color_attributes:
+        mesh.color_attributes.active_color = mesh.color_attributes[name]
+
+  new_textures = []
+  for target in job['targets']:
+    scatter_node = target['scatter_node']
+    attribute_node, socket = get_baked_attribute_socket(scatter_node, channel, attribute_name, component, target['output_idx'])
+    new_textures.append((scatter_node, attribute_node))
+    connect_baked_socket(scatter_node, socket, target['output'])
+  job['new_textures'] = new_textures
+
+
+def select_bake_objects(job):
+  for obj in job['objects']: obj.select_set(True)
+
+
+def add_temp_bake_images(job, bake_materials, image, temp_textures):
+  # Every material on the baked objects needs an active image, otherwise Cycles cancels the bake.
+  # Outside of an atlas, the other materials bake into a throwaway image so they cannot overwrite earlier results.
+  temp_image = image if job['is_atlas'] else None
+  for obj in job['objects']:
+    for slot in obj.material_slots:
+      if slot.material and slot.material.node_tree and slot.material not in bake_materials:
+        if not temp_image:
+          temp_image = bpy.data.images.new('Scattershot Temp Bake', 8, 8)
+        temp_texture = slot.material.node_tree.nodes.new('ShaderNodeTexImage')
+        temp_texture.image = temp_image
+        slot.material.node_tree.nodes.active = temp_texture
+        temp_textures.append(temp_texture)
+        bake_materials.append(slot.material)
+
+
+def remove_temp_bake_images(temp_textures, image):
+  temp_images = [x.image for x in temp_textures if x.image and x.image != image]
+  for temp_texture in temp_textures:
+    temp_texture.id_data.nodes.remove(temp_texture)
+  for temp_image in set(temp_images):
+    bpy.data.images.remove(temp_image)
+
+
+def get_upstream_nodes(socket):
+  nodes = []
+  sockets = [socket]
+  while sockets:
+    for link in sockets.pop().links:
+      if link.from_node not in nodes:
+        nodes.append(link.from_node)
+        sockets.extend(link.from_node.inputs)
+  return nodes
+
+
+def get_deferred_leaves(scatter_node, source, count, random_pixels=None):
+  # The values that the resampler provides directly: the source color, and the cell's random color wherever it is read
+  coordinates = scatter_node.node_tree.nodes['Scatter Coordinates']
+  random_color = random_pixels if random_pixels is not None else np.full((count, 3), 0.5, dtype=np.float32)
+  leaves = {source.outputs[0]: np.zeros((count, 3), dtype=np.float32), coordinates.outputs['Random Color']: random_color}
+  for output in source.outputs[1:]:
+    inner_output = source.node_tree.nodes['Group Output'].inputs.get(output.name)
+    if inner_output and is_group_input(inner_output, 'Random Color'):
+      leaves[output] = random_color
+  return leaves
+
+
+def get_deferred_inputs(scatter_node, count):
+  # Linked inputs of the scatter node are left out, so anything that reads them cannot be deferred
+  return {x.name: to_array(x.default_value, count) for x in scatter_node.inputs if not x.is_linked and hasattr(x, 'default_value')}
+
+
+def get_deferred_source(scatter_node, output):
+  # Channels can be rebuilt from the scatter coordinates when they come out of a single scatter source,
+  # optionally through adjustments like Cell HSV that only depend on the cell's random color.
+  # Tri-planar mapping, cell blending, noise textures and anything else the evaluator does not know still need Cycles.
+  nodes = scatter_node.node_tree.nodes
+  if 'Scatter Coordinates' not in nodes or 'Tri-Planar Mapping' in nodes or 'White Noise Texture' in nodes:
+    return None
+  if 'Density' in scatter_node.inputs and (scatter_node.inputs['Density'].is_linked or scatter_node.inputs['Density'].default_value < 1):
+    return None
+  socket = nodes['Group Output'].inputs.get(output.name)
+  if not socket or not socket.links:
+    return None
+  sources = [x for x in get_upstream_nodes(socket) if is_scatter_source(x)]
+  if len(sources) != 1 or 'Number of Images' not in sources[0].node_tree.nodes:
+    return None
+  source = sources[0]
+  coordinates = nodes['Scatter Coordinates']
+  for input_name in ['Vector', 'Random Color']:
+    links = source.inputs[input_name].links if input_name in source.inputs else []
+    if not links or links[0].from_socket != coordinates.outputs[input_name]:
+      return None
+  selection = get_source_selection(source)
+  if not selection:
+    return None
+  for image_node, threshold in selection:
+    if not image_node.image or image_node.image.source not in ['FILE', 'GENERATED'] or image_node.projection != 'FLAT':
+      return None
+  try:
+    ShaderEvaluator(get_deferred_leaves(scatter_node, source, 1), get_deferred_inputs(scatter_node, 1), 1).evaluate(socket)
+  except UnsupportedNodeError:
+    return None
+  return source
+
+
+def uses_random_color(scatter_node, output, source):
+  # Channels with adjustments read the cell's random color, which needs its own bake
+  socket = scatter_node.node_tree.nodes['Group Output'].inputs[output.name]
+  return socket.links[0].from_socket != source.outputs[0]
+
+
+def defer_source_channels(self, jobs):
+  # Scatter nodes with several deferrable channels bake their coordinates once and rebuild those channels in NumPy
+  deferrable = {}
+  for job in jobs:
+    target = job['targets'][0]
+    source = get_deferred_source(target['scatter_node'], target['output'])
+    if source:
+      deferrable.setdefault(target['scatter_node'], []).append((job, source))
+
+  vector_jobs = []
+  for scatter_node, deferred in deferrable.items():
+    if len(deferred) < 2:
+      continue
+    first_job = deferred[0][0]
+    vector_job = {
+      'channel': 'Scatter Vector',
+      'file_name': f'{scatter_node.name} Scatter Vector',
+      'targets': [{'scatter_node': scatter_node, 'material': first_job['targets'][0]['material'], 'output': None, 'output_idx': -1}],
+      'objects': first_job['objects'],
+      'is_atlas': False,
+      'is_scatter_vector': True,
+      'use_random_color': any(uses_random_color(scatter_node, job['targets'][0]['output'], source) for job, source in deferred),
+    }
+    vector_jobs.append(vector_job)
+    for job, source in deferred:
+      job['vector_job'] = vector_job
+      job['targets'][0]['deferred_source'] = source
+  return vector_jobs + jobs
+
+
+def bake_scatter_vector(self, context, job):
+  # Bakes the scatter coordinates into RG and the cell's random value into B with a single sample,
+  # since averaging coordinates across a cell border would point into the wrong part of the texture.
+  # Channels with adjustments also need the full random color, which takes a second bake of the same image.
+  target = job['targets'][0]
+  scatter_node = target['scatter_node']
+  node_tree = scatter_node.node_tree
+  nodes = node_tree.nodes
+  coordinates = nodes['Scatter Coordinates']
+  image = bpy.data.images.new(job['file_name'], self.width, self.height, float_buffer = True, is_data = True)
+  create_socket(node_tree, 'OUTPUT', 'NodeSocketVector', job['channel'])
+  separate = nodes.new('ShaderNodeSeparateXYZ')
+  combine = nodes.new('ShaderNodeCombineXYZ')
+  texture = nodes.new('ShaderNodeTexImage')
+  texture.image = image
+  node_tree.links.new(coordinates.outputs['Vector'], separate.inputs[0])
+  node_tree.links.new(separate.outputs[0], combine.inputs[0])
+  node_tree.links.new(separate.outputs[1], combine.inputs[1])
+  node_tree.links.new(coordinates.outputs['Random Color'], combine.inputs[2])
+  node_tree.links.new(combine.outputs[0], nodes['Group Output'].inputs[job['channel']])
+  nodes.active = texture
+  scatter_node.id_data.nodes.active = scatter_node
+
+  temp_textures = []
+  samples = context.scene.cycles.samples
+  connection = link_bake_output(scatter_node.outputs[job['channel']])
+  try:
+    add_temp_bake_images(job, [target['material']], image, temp_textures)
+    context.scene.cycles.samples = 1
+    select_bake_objects(job)
+    yield
+    dilate_baked_image(self, context, job, image)
+    job['vector_pixels'] = get_image_pixels(image)
+    if job.get('use_random_color'):
+      node_tree.links.new(coordinates.outputs['Random Color'], nodes['Group Output'].inputs[job['channel']])
+      yield
+      dilate_baked_image(self, context, job, image)
+      job['random_pixels'] = get_image_pixels(image)
+  finally:
+    context.scene.cycles.samples = samples
+    remove_temp_bake_images(temp_textures, image)
+    restore_bake_output(*connection)
+    for node in [separate, combine, texture]:
+      nodes.remove(node)
+    remove_socket(node_tree, 'OUTPUT', job['channel'])
+    bpy.data.images.remove(image)
+
+
+def resample_deferred_channel(job, image):
+  target = job['targets'][0]
+  scatter_node = target['scatter_node']
+  source = target['deferred_source']
+  vectors = job['vector_job']['vector_pixels'].reshape(-1, 4)
+  selection = get_source_selection(source)
+  image_indices = select_source_images(selection, vectors[:, 2])
+
+  colors = np.zeros((len(vectors), 3), dtype=np.float32)
+  for image_idx, (image_node, threshold) in enumerate(selection):
+    selected = image_indices == image_idx
+    if not selected.any():
+      continue
+    pixels = get_image_pixels(image_node.image)
+    if not image_node.image.is_float and image_node.image.colorspace_settings.name == 'sRGB':
+      pixels = srgb_to_linear(pixels)
+    samples = sample_image(pixels, vectors[selected, 0], vectors[selected, 1], image_node.interpolation, image_node.extension)
+    colors[selected] = samples[:, :3]
+
+  # Runs the nodes between the source and the output, like Cell HSV, on the resampled colors
+  random_pixels = job['vector_job'].get('random_pixels')
+  random_colors = random_pixels.reshape(-1, 4)[:, :3] if random_pixels is not None else None
+  leaves = get_deferred_leaves(scatter_node, source, len(vectors), random_colors)
+  leaves[source.outputs[0]] = colors
+  socket = scatter_node.node_tree.nodes['Group Output'].inputs[target['output'].name]
+  values = ShaderEvaluator(leaves, get_deferred_inputs(scatter_node, len(vectors)), len(vectors)).evaluate(socket)
+  result = np.ones((len(vectors), 4), dtype=np.float32)
+  result[:, :3] = values if values.ndim == 2 else values[:, None]
+  set_image_pixels(image, result.reshape(image.size[1], image.size[0], 4))
+
+
+def bake_job_steps(self, context, job):
+  # Yields every time a Cycles bake needs to run so that bakes can be driven by either a loop or a modal operator
+  if job.get('is_scatter_vector'):
+    yield from bake_scatter_vector(self, context, job)
+    return
+  if self.target == 'VERTEX_COLORS':
+    yield from bake_color_attribute(self, context, job)
+    return
+  channel = job['channel']
+  image = get_bake_image(self, job)
+  new_textures = []
+  connections = []
+  bake_materials = []
+  temp_textures = []
+
+  for target in job['targets']:
+    scatter_node = target['scatter_node']
+    texture, is_new = get_bake_texture(scatter_node, channel, target['output_idx'])
+    if is_new:
+      new_textures.append((scatter_node, texture))
+    texture.image = image
+    scatter_node.node_tree.nodes.active = texture
+    scatter_node.id_data.nodes.active = scatter_node
+    if 'vector_job' not in job:
+      connections.append(link_bake_output(target['output']))
+    bake_materials.append(target['material'])
+
+  is_baked = False
+  try:
+    if 'vector_job' in job:
+      # The channel is rebuilt from the baked scatter coordinates without running Cycles
+      resample_deferred_channel(job, image)
+      save_baked_image(self, context, image, job['file_name'], channel)
+    elif self.use_frame_range:
+      add_temp_bake_images(job, bake_materials, image, temp_textures)
+      yield from bake_frame_sequence(self, context, job, image)
+    else:
+      add_temp_bake_images(job, bake_materials, image, temp_textures)
+      select_bake_objects(job)
+      yield
+      dilate_baked_image(self, context, job, image)
+      save_baked_image(self, context, image, job['file_name'], channel)
+    is_baked = True
+  finally:
+    remove_temp_bake_images(temp_textures, image)
+    for material_output, current_output_socket in connections:
+      restore_bake_output(material_output, current_output_socket)
+    # Cancelled bakes do not leave unconnected texture nodes behind
+    if not is_baked:
+      for scatter_node, texture in new_textures:
+        scatter_node.node_tree.nodes.remove(texture)
+
+  # Links texture to group node
+  for target in job['targets']:
+    scatter_node = target['scatter_node']
+    texture = scatter_node.node_tree.nodes[f"Baked {channel}"]
+    connect_baked_socket(scatter_node, texture.outputs[0], target['output'])
+
+  job['new_textures'] = new_textures
+
+
+def count_bake_steps(self, jobs):
+  cycles_jobs = [x for x in jobs if 'vector_job' not in x]
+  if self.use_frame_range and self.target == 'IMAGE_TEXTURES':
+    return len(cycles_jobs) * (self.frame_end - self.frame_start + 1)
+  # Vector jobs bake the random color a second time when any of their channels has adjustments
+  return len(cycles_jobs) + len([x for x in cycles_jobs if x.get('use_random_color')])
+
+
+def run_bake_job(self, context, job):
+  for step in bake_job_steps(self, context, job):
+    bpy.ops.object.bake()
+  return job.get('new_textures')
+
+
+def get_bake_margin(self):
+  return int((self.width + self.height / 4) / 128)
+
+
+def get_mesh_triangles(context, obj, materials=None):
+  # Returns the UV and world space corners of every triangle that bakes into the material's image
+  depsgraph = context.evaluated_depsgraph_get()
+  evaluated_obj = obj.evaluated_get(depsgraph)
+  mesh = evaluated_obj.to_mesh()
+  try:
+    if not mesh.uv_layers.active:
+      return np.empty((0, 3, 2)), np.empty((0, 3, 3))
+    mesh.calc_loop_triangles()
+    loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('loops', loops)
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get('uv', uvs)
+    vertex_indices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', vertex_indices)
+    coordinates = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coordinates)
+    matrix = np.array(obj.matrix_world)
+    coordinates = coordinates.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+    uv_triangles = uvs.reshape(-1, 2)[loops].reshape(-1, 3, 2)
+    world_triangles = coordinates[vertex_indices[loops]].reshape(-1, 3, 3)
+    if materials is not None:
+      # Faces of other materials bake into a different image
+      material_indices = np.empty(len(mesh.loop_triangles), dtype=np.int32)
+      mesh.loop_triangles.foreach_get('material_index', material_indices)
+      slot_indices = [i for i, slot in enumerate(obj.material_slots) if slot.material in materials]
+      is_baked = np.isin(material_indices, slot_indices)
+      uv_triangles = uv_triangles[is_baked]
+      world_triangles = world_triangles[is_baked]
+    return uv_triangles, world_triangles
+  finally:
+    evaluated_obj.to_mesh_clear()
+
+
+def get_uv_triangles(context, obj, materials=None):
+  return get_mesh_triangles(context, obj, materials)[0]
+
+
+def get_coverage_mask(self, context, job, width, height):
+  # The mask only depends on the UVs, so it is shared by every channel baked from the same objects
+  materials = None if job['is_atlas'] else [x['material'] for x in job['targets']]
+  key = (
+    tuple(x.name for x in job['objects']),
+    tuple(x.name for x in materials) if materials else None,
+    width, height
+  )
+  if key not in self.coverage_masks:
+    triangles = [get_uv_triangles(context, x, materials) for x in job['objects']]
+    self.coverage_masks[key] = rasterize_uv_triangles(np.concatenate(triangles), width, height)
+  return self.coverage_masks[key]
+
+
+def dilate_baked_image(self, context, job, image):
+  if self.margin_method != 'dilate':
+    return
+  width, height = image.size
+  mask = get_coverage_mask(self, context, job, width, height)
+  set_image_pixels(image, dilate_pixels(get_image_pixels(image), mask, get_bake_margin(self)))
+
+
+def get_file_path(preferences, file_name, format_settings):
+  return f"{preferences.path}\\{file_name}.{file_types[format_settings['format']]}"
 
+
+def save_baked_image(self, context, image, file_name, channel, frame_suffix=''):
+  preferences = context.preferences.addons[__package__].preferences
+  format_settings = get_format_settings(preferences, channel)
+  sized_file_name = get_sized_file_name(file_name, self.width, self.height) + frame_suffix
+  image.filepath_raw = get_file_path(preferences, sized_file_name, format_settings)
+  save_image(context, image, format_settings)
+
+  if self.denoise:
+    denoise_image(context, image, format_settings)
+
+  if self.lod_levels:
+    save_lod_levels(self, context, image, file_name, channel, format_settings, frame_suffix)
+
+
+def get_image_user_frame(image_user, frame):
+  # The frame of an image sequence or movie that Blender shows on the given scene frame
+  length = image_user.frame_duration
+  if not length:
+    return 0
+  frame = frame - image_user.frame_start + 1
+  if image_user.use_cyclic:
+    frame = frame % length or length
+  else:
+    frame = min(max(frame, 0), length)
+  return frame + image_user.frame_offset
+
+
+def get_frame_state(context, job):
+  # Everything that can change the baked result between frames: unlinked node values, node properties, the frames of
+  # image sequences and movies, and the evaluated meshes and transforms of the objects
+  depsgraph = context.evaluated_depsgraph_get()
+  state = hashlib.sha1()
+  base_properties = {x.identifier for x in bpy.types.ShaderNode.bl_rna.properties}
+
+  def add_value(value):
+    if isinstance(value, bpy.types.ID):
+      value = value.name_full
+    elif hasattr(value, '__len__') and not isinstance(value, str):
+      value = tuple(value)
+    state.update(repr(value).encode())
+
+  def add_node_tree(node_tree, visited):
+    if node_tree in visited:
+      return
+    visited.append(node_tree)
+    for node in node_tree.nodes:
+      state.update(node.name.encode())
+      for property in node.bl_rna.properties:
+        if property.identifier == 'image' or (property.identifier not in base_properties and property.type not in ['POINTER', 'COLLECTION']):
+          add_value(getattr(node, property.identifier))
+      for input in node.inputs:
+        if not input.is_linked and hasattr(input, 'default_value'):
+          add_value(input.default_value)
+      if node.type == 'TEX_IMAGE' and node.image and node.image.source in ['SEQUENCE', 'MOVIE']:
+        add_value(get_image_user_frame(node.image_user, context.scene.frame_current))
+      if node.type == 'GROUP' and node.node_tree:
+        add_node_tree(node.node_tree, visited)
+
+  visited = []
+  for target in job['targets']:
+    add_node_tree(target['material'].node_tree, visited)
+  for obj in job['objects']:
+    evaluated_object = obj.evaluated_get(depsgraph)
+    mesh = evaluated_object.data
+    coordinates = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coordinates)
+    state.update(coordinates.tobytes())
+    add_value([tuple(x) for x in evaluated_object.matrix_world])
+  return state.hexdigest()
+
+
+def link_frame_file(source, destination):
+  # Hard links avoid duplicating data on disk, but not every file system supports them
+  if os.path.exists(destination):
+    os.remove(destination)
+  try:
+    os.link(source, destination)
+  except OSError:
+    shutil.copyfile(source, destination)
+
+
+def bake_frame_sequence(self, context, job, image):
+  preferences = context.preferences.addons[__package__].preferences
+  scene = context.scene
+  channel = job['channel']
+  format_settings = get_format_settings(preferences, channel)
+  initial_frame = scene.frame_current
+  baked_frames = {}
+  file_paths = {}
+
+  def bake_frames():
+    for frame in range(self.frame_start, self.frame_end + 1):
+      scene.frame_set(frame)
+      frame_suffix = f".{frame:04d}"
+      frame_state = get_frame_state(context, job)
+      file_names = [get_sized_file_name(job['file_name'], self.width, self.height) + frame_suffix]
+      if self.lod_levels:
+        for width, height in get_lod_sizes(self):
+          file_names.append(get_sized_file_name(job['file_name'], width, height, is_lod=True) + frame_suffix)
+      frame_paths = [bpy.path.native_pathsep(bpy.path.abspath(get_file_path(preferences, x, format_settings))) for x in file_names]
+      if frame == self.frame_start:
+        file_paths['first'] = get_file_path(preferences, file_names[0], format_settings)
+
+      if frame_state in baked_frames:
+        for source, destination in zip(baked_frames[frame_state], frame_paths):
+          link_frame_file(source, destination)
+      else:
+        select_bake_objects(job)
+        yield
+        dilate_baked_image(self, context, job, image)
+        save_baked_image(self, context, image, job['file_name'], channel, frame_suffix)
+        baked_frames[frame_state] = frame_paths
+
+  try:
+    yield from bake_frames()
+  finally:
+    scene.frame_set(initial_frame)
+
+  # Plays the baked files back as an image sequence
+  image.source = 'SEQUENCE'
+  image.filepath = file_paths['first']
+  for target in job['targets']:
+    texture = target['scatter_node'].node_tree.nodes[f"Baked {channel}"]
+    texture.image_user.frame_start = self.frame_start
+    texture.image_user.frame_duration = self.frame_end - self.frame_start + 1
+    texture.image_user.frame_offset = self.frame_start - 1
+    texture.image_user.use_auto_refresh = True
+
+
+def get_lod_sizes(self):
+  sizes = []
+  width, height = self.width, self.height
+  for level in range(self.lod_levels):
+    if min(width, height) < 2:
+      break
+    width, height = (width + 1) // 2, (height + 1) // 2
+    sizes.append((width, height))
+  return sizes
+
+
+def save_lod_levels(self, context, image, file_name, channel, format_settings, frame_suffix=''):
+  # Derives the lower resolutions from the top level instead of baking each one
+  preferences = context.preferences.addons[__package__].preferences
+  levels = create_mip_levels(get_image_pixels(image), self.lod_levels, self.lod_filter, channel == 'Normal')
+  for pixels in levels:
+    height, width = pixels.shape[:2]
+    lod_file_name = get_sized_file_name(file_name, width, height, is_lod=True) + frame_suffix
+    lod_image = new_image_from_pixels(lod_file_name, pixels, is_data=image.colorspace_settings.is_data)
+    lod_image.colorspace_settings.name = image.colorspace_settings.name
+    lod_image.filepath_raw = get_file_path(preferences, lod_file_name, format_settings)
+    save_image(context, lod_image, format_settings)
+    bpy.data.images.remove(lod_image)
+
+
+def get_bake_objects(self, context):
+  if self.objects == 'texture_set':
+    return get_material_objects(context, context.active_object.active_material)
+  return context.selected_objects
+
+
+def get_bake_scatter_nodes(self, context, objects):
+  if self.use_atlas or self.scope == 'objects':
+    # Gathers the scatter nodes of every material so that they can all be baked with a single setup
+    scatter_nodes = []
+    for material in get_objects_materials(objects):
+      scatter_nodes.extend(get_material_scatter_nodes(material))
+    return scatter_nodes
+  return [x for x in context.selected_nodes if get_scatter_sources([x])]
+
+
+def get_uv_groups(self, objects, scatter_nodes):
+  # Each group of objects and materials bakes into the same images, so their UVs have to share the texture
+  if self.use_atlas:
+    return [(objects, None)]
+  materials = []
+  for scatter_node in scatter_nodes:
+    material = get_node_tree_material(scatter_node.id_data)
+    if material and material not in materials:
+      materials.append(material)
+  return [([x for x in objects if is_in_texture_set(x, material)], [material]) for material in materials]
+
+
+def get_triangle_areas(triangles):
+  if triangles.shape[-1] == 2:
+    edges_a = triangles[:, 1] - triangles[:, 0]
+    edges_b = triangles[:, 2] - triangles[:, 0]
+    return np.abs(edges_a[:, 0] * edges_b[:, 1] - edges_a[:, 1] * edges_b[:, 0]) * 0.5
+  return np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1) * 0.5
+
+
+def check_bake_setup(self, context, objects, scatter_nodes):
+  # Catches setups that would bake black or overlapping textures before any time is spent in Cycles
+  errors = []
+  warnings = []
+  check_resolution = 256
+  uses_existing_uvs = self.target == 'IMAGE_TEXTURES' and not self.should_unwrap
+
+  if not objects:
+    errors.append('There are no objects to bake.')
+  for obj in objects:
+    if obj.type != 'MESH':
+      errors.append(f'{obj.name} is not a mesh.')
+      continue
+    for slot in obj.material_slots:
+      if not slot.material:
+        errors.append(f'{obj.name} has an empty material slot.')
+      elif not slot.material.node_tree:
+        errors.append(f'{slot.material.name} on {obj.name} does not use nodes.')
+    if uses_existing_uvs and not obj.data.uv_layers:
+      errors.append(f'{obj.name} has no UV map. Enable Unwrap to create one.')
+
+  for scatter_node in scatter_nodes:
+    material = get_node_tree_material(scatter_node.id_data)
+    if material and not material.node_tree.get_output_node('CYCLES'):
+      errors.append(f'{material.name} has no active Material Output node.')
+    missing_nodes = [x for x in ['Group Input', 'UV Map', 'User UVs', 'UVs'] if x not in scatter_node.node_tree.nodes]
+    if missing_nodes:
+      errors.append(f'{scatter_node.name} is missing the {", ".join(missing_nodes)} nodes needed to use the baked UVs.')
+  if errors or not uses_existing_uvs:
+    return errors, warnings
+
+  for group_objects, materials in get_uv_groups(self, objects, scatter_nodes):
+    names = ', '.join(x.name for x in group_objects)
+    meshes = [get_mesh_triangles(context, x, materials) for x in group_objects]
+    if not meshes:
+      continue
+    uv_triangles = np.concatenate([x[0] for x in meshes])
+    if len(uv_triangles) and (uv_triangles.min() < -1e-4 or uv_triangles.max() > 1 + 1e-4):
+      errors.append(f'The UVs of {names} go outside of the 0 to 1 range and would not be baked.')
+    if self.check_uvs:
+      coverage = count_uv_coverage(uv_triangles, check_resolution, check_resolution)
+      overlap = np.count_nonzero(coverage > 1) / max(np.count_nonzero(coverage), 1)
+      if overlap > 0.01:
+        errors.append(f'The UVs of {names} overlap on {overlap:.0%} of the texture. Enable Unwrap or turn off Check UVs.')
+
+    # Pixels per unit for each object sharing the texture
+    densities = []
+    for uv_mesh_triangles, world_triangles in meshes:
+      world_area = get_triangle_areas(world_triangles).sum()
+      if world_area > 0:
+        densities.append(np.sqrt(get_triangle_areas(uv_mesh_triangles).sum() / world_area) * max(self.width, self.height))
+    if len(densities) > 1 and min(densities) > 0 and max(densities) / min(densities) > 2:
+      warnings.append(f'The texel density of {names} varies from {min(densities):.0f} to {max(densities):.0f} pixels per unit.')
+  return errors, warnings
+
+
+def prepare_bake_scatter(self, context, objects, scatter_nodes):
+  clear_bake(context, scatter_nodes, remove_images=False)
+  return scatter_nodes, get_bake_jobs(self, context, scatter_nodes, objects)
+
+
+def get_displacement_settings(scatter_node):
+  # Uses the Displacement node that the baked map feeds so the modifier matches the shader's midlevel and scale
+  baked_output = scatter_node.outputs.get('Baked Displacement')
+  links = baked_output.links if baked_output else []
+  for link in links:
+    if link.to_node.type == 'DISPLACEMENT':
+      return link.to_node, link.to_node.inputs['Midlevel'].default_value, link.to_node.inputs['Scale'].default_value
+  return None, 0.5, 1.0
+
+
+def add_subdivision_modifier(self, obj):
+  subdivision = obj.modifiers.get('Scattershot Subdivision') or obj.modifiers.new('Scattershot Subdivision', 'SUBSURF')
+  subdivision.subdivision_type = 'SIMPLE'
+  subdivision.levels = self.displace_subdivisions
+  subdivision.render_levels = self.displace_subdivisions
+  return subdivision
+
+
+def get_apply_error(obj):
+  # The usual reasons that Blender refuses to apply a modifier, checked before anything is applied
+  if obj.library or obj.data.library:
+    return 'its mesh is linked from a library'
+  if obj.data.users > 1:
+    return 'its mesh is shared with other objects'
+  if obj.data.shape_keys:
+    return 'its mesh has shape keys'
+  return None
+
+
+def apply_displace_modifiers(self, context, obj):
+  # Subdivision and Displace are applied together or not at all, so a failure never leaves a dense mesh without displacement
+  apply_error = get_apply_error(obj)
+  if apply_error:
+    self.report({'WARNING'}, f'Kept the displacement modifiers on {obj.name} because {apply_error}')
+    return
+  prev_mesh = obj.data.copy()
+  applied = []
+  try:
+    with context.temp_override(object = obj, active_object = obj):
+      for modifier_name in ['Scattershot Subdivision', 'Scattershot Displace']:
+        bpy.ops.object.modifier_apply(modifier = modifier_name)
+        applied.append(modifier_name)
+  except RuntimeError as error:
+    if applied:
+      # Puts the original mesh back and adds the applied subdivision again in front of the displacement
+      applied_mesh = obj.data
+      mesh_name = applied_mesh.name
+      obj.data = prev_mesh
+      bpy.data.meshes.remove(applied_mesh)
+      prev_mesh.name = mesh_name
+      prev_mesh = None
+      add_subdivision_modifier(self, obj)
+      with context.temp_override(object = obj, active_object = obj):
+        bpy.ops.object.modifier_move_to_index(modifier = 'Scattershot Subdivision', index = obj.modifiers.find('Scattershot Displace'))
+    self.report({'WARNING'}, f'Could not apply the displacement to {obj.name}, so its modifiers were kept: {error}')
+  finally:
+    if prev_mesh:
+      bpy.data.meshes.remove(prev_mesh)
+
+
+def add_displace_modifiers(self, context, jobs):
+  # Moves baked displacement from the shader to real geometry so that renders no longer need adaptive subdivision
+  for job in jobs:
+    if job['channel'] != 'Displacement' or 'new_textures' not in job:
+      continue
+    scatter_node = job['targets'][0]['scatter_node']
+    image = scatter_node.node_tree.nodes['Baked Displacement'].image
+    displacement_node, midlevel, scale = get_displacement_settings(scatter_node)
+
+    texture_name = f"{job['file_name']} Displace"
+    texture = bpy.data.textures.get(texture_name) or bpy.data.textures.new(texture_name, 'IMAGE')
+    texture.image = image
+    texture.extension = 'EXTEND'
+    if image.source == 'SEQUENCE':
+      texture.image_user.frame_start = self.frame_start
+      texture.image_user.frame_duration = self.frame_end - self.frame_start + 1
+      texture.image_user.frame_offset = self.frame_start - 1
+      texture.image_user.use_auto_refresh = True
+
+    for obj in job['objects']:
+      add_subdivision_modifier(self, obj)
+      displace = obj.modifiers.get('Scattershot Displace') or obj.modifiers.new('Scattershot Displace', 'DISPLACE')
+      displace.texture = texture
+      displace.texture_coords = 'UV'
+      displace.uv_layer = 'ScattershotUVs' if self.should_unwrap else obj.data.uv_layers.active.name
+      displace.mid_level = midlevel
+      displace.strength = scale
+      if self.apply_displacement:
+        apply_displace_modifiers(self, context, obj)
+
+    # The geometry is displaced now, so the shader should not displace it again
+    for target in job['targets']:
+      node_tree = target['material'].node_tree
+      material_output = node_tree.get_output_node('CYCLES')
+      if material_output:
+        for link in material_output.inputs['Displacement'].links:
+          if link.from_node in [displacement_node, target['scatter_node']]:
+            node_tree.links.remove(link)
+
+
+def finish_bake_scatter(self, context, scatter_nodes, jobs):
+  # Only jobs that ran to the end have new textures, so cancelled bakes keep the finished channels
   only_displacement = self.Displacement and all(x == False for x in [self.Image, 
     self.Albedo, self.AO, self.Metalness, self.Roughness, self.Glossiness,
     self.Specular, self.Emission, self.Alpha, self.Bump, self.Normal
   ])
 
-  scatter_nodes = [x for x in selected_nodes if get_scatter_sources([x])]
-  for scatter_node in scatter_nodes:
-    channel_outputs = scatter_node.outputs
-
-    new_textures = []
-    bake_outputs = [x for x in channel_outputs if x.name == 'Image' or x.name in texture_names.keys()]
+  baked_nodes = {}
+  for job in jobs:
+    if 'new_textures' in job:
+      for target in job['targets']:
+        baked_nodes.setdefault(target['scatter_node'], [])
+      for scatter_node, texture in job['new_textures']:
+        baked_nodes[scatter_node].append(texture)
 
-    clear_bake(context)
+  for scatter_node in scatter_nodes:
+    if scatter_node in baked_nodes:
+      finish_baked_node(self, scatter_node, baked_nodes[scatter_node], only_displacement)
 
-    for output_idx, output in enumerate(bake_outputs):
-      if getattr(self, output.name):
-        texture_node_name = f"Baked {output.name}"
-
-        texture_file_name = preferences.name.replace(
-          '{C}', output.name).replace(
-          '{G}', scatter_node.node_tree.name).replace(
-          '{L}', scatter_node.label).replace(
-          '{M}', context.active_object.active_material.name).replace(
-          '{N}', scatter_node.name)
-
-        group_nodes = scatter_node.node_tree.nodes
-        group_links = scatter_node.node_tree.links
-
-        # Overwrites previous baked result or creates a new texture
-        if texture_node_name in [x.name for x in group_nodes]:
-          texture = group_nodes[texture_node_name]
-        else:
-          texture = group_nodes.new('ShaderNodeTexImage')
-          new_textures.append(texture)
-          texture.name = texture_node_name
-          texture.location = [3000, -300 * output_idx]
-          texture.image = bpy.data.images.new(texture_file_name, self.width, self.height, float_buffer = True, is_data = True)
-          color_spaces = [x.name for x in bpy.types.ColorManagedInputColorspaceSettings.bl_rna.properties['name'].enum_items]
-          if output.name in data_channels or output.name in detail_channels:
-            for space in data_color_spaces:
-              if space in color_spaces:
-                texture.image.colorspace_settings.name = space
-                break
-          else:
-            texture.image.colorspace_settings.name = 'sRGB'
-
-        # Links the channel output to the material output
-        if selected_nodes[0].id_data.get_output_node('CYCLES'):
-          material_output = selected_nodes[0].id_data.get_output_node('CYCLES')
-        else:
-          material_output = nodes.new('ShaderNodeOutputMaterial')
-        if material_output.inputs[0].links:
-          current_output_socket = material_output.inputs[0].links[0].from_socket
-        else:
-          current_output_socket = ''
-        if output.name == 'Normal':
-          # TODO: Properly output tangent space normals
-          pass
-        links.new(output, material_output.inputs[0])
-
-        # Bakes the texture
-        group_nodes.active = texture
-        for obj in objects: obj.select_set(True)
-        bpy.ops.object.bake()
-
-        # Saves the texture
-        if output.name in detail_channels:
-          file_format = preferences.data_format
-        else:
-          file_format = preferences.format
-
-        if output.name in detail_channels and preferences.data_format == 'OPEN_EXR':
-          color_depth = preferences.data_float
-        elif output.name in detail_channels:
-          color_depth = preferences.data_depth
-        elif preferences.format == 'OPEN_EXR':
-          color_depth = preferences.color_float
-        else:
-          color_depth = preferences.color_depth
-
-        format_settings = {
-          'format': file_format,
-          'color_depth': color_depth,
-        }
-        texture.image.filepath_raw = f"{preferences.path}\{texture_file_name}.{file_types[file_format]}"
-        save_image(context, texture.image, format_settings)
-
-        if self.denoise:
-          denoise_image(context, texture.image, format_settings)
-
-        # Cleans up output connections
-        if current_output_socket:
-          links.new(current_output_socket, material_output.inputs[0])
-        else:
-          links.remove(material_output.inputs[0].links[0])
-
-        # Links texture to group node
-        if texture_node_name not in [x.name for x in scatter_node.outputs]:
-          if output.name == 'Normal':
-            output_type = 'NodeSocketVector'
-          elif output.name in data_channels:
-            output_type = 'NodeSocketFloat'
-          else:
-            output_type = 'NodeSocketColor'
-          new_socket = create_socket(scatter_node.node_tree, 'OUTPUT', output_type, texture_node_name)
-          output_count = len(get_io_sockets(scatter_node.node_tree, 'OUTPUT'))
-          move_socket(scatter_node.node_tree, 'OUTPUT', new_socket, output_count -2)
-        group_links.new(texture.outputs[0], group_nodes["Group Output"].inputs[texture_node_name])
-
-        # Rewires socket connections
-        to_sockets = [x.to_socket for x in output.links]
-        for socket in to_sockets:
-          links.new(scatter_node.outputs[texture_node_name], socket)
-
-    # Moves Displacement to the bottom
-    displacement_socket = get_socket(scatter_node.node_tree, 'OUTPUT', 'Baked Displacement')
-    if displacement_socket:
-      output_count = len(scatter_node.outputs)
-      move_socket(scatter_node.node_tree, 'OUTPUT', displacement_socket, output_count -2)
-
-    # Sets up nodes for UVs
-    # TODO: Make sure the right UVs are always used
-    # TODO: Make sure object has UVs!
-    if 'UV Map' not in [x.name for x in scatter_node.inputs]:
-      uv_input = create_socket(scatter_node.node_tree, 'INPUT', 'NodeSocketVector', 'UV Map')
-      uv_input.hide_value = True
-    group_input = scatter_node.node_tree.nodes['Group Input']
-    mixed_uvs = scatter_node.node_tree.nodes['UVs']
-    scatter_node.node_tree.links.new(group_input.outputs['UV Map'], scatter_node.node_tree.nodes['User UVs'].inputs[0])
-    for texture in new_textures:
-      scatter_node.node_tree.links.new(mixed_uvs.outputs[0], texture.inputs[0])
-    if not self.unwrap_method == 'existing':
-      scatter_node.node_tree.nodes['UV Map'].uv_map = "ScattershotUVs"
+  if self.use_displace_modifier and self.target == 'IMAGE_TEXTURES':
+    add_displace_modifiers(self, context, jobs)
 
-    # Hides unused sockets
-    if not only_displacement:
-      for output in scatter_node.outputs:
-        if output.name in texture_names.keys() or output.name == 'Random Color' or output.name == 'Image':
-          output.hide = True
-      for input in scatter_node.inputs:
-        if input.name != 'UV Map':
-          input.hide = True
 
 def bake_vectors(self, context, objects):
   selected_nodes = context.selected_nodes
@@ -238,6 +1235,55 @@ def bake_vectors(self, context, objects):
 
       # Hides relavent inputs
 
+bake_status = {'running': False, 'cancelled': False}
+
+def on_bake_complete(*args):
+  bake_status['running'] = False
+
+def on_bake_cancel(*args):
+  bake_status['running'] = False
+  bake_status['cancelled'] = True
+
+
+def start_bake(self, context, objects):
+  self.coverage_masks = {}
+  # switching modes prevents context errors
+  state = {
+    'prev_mode': mode_toggle(context, 'OBJECT'),
+    'prev_bake_properties': get_bake_properties(context.scene),
+    'selected_object_names': [x.name for x in context.selected_objects],
+    'active_obj_name': copy(context.active_object.name),
+  }
+  set_bake_properties(context.scene, {
+    'engine': 'CYCLES',
+    'bake_type': 'EMIT',
+    'use_selected_to_active': False,
+    'target': self.target,
+    'use_clear': False,
+    'use_bake_multires': False,
+    'samples': self.samples,
+    'margin_type': 'ADJACENT_FACES',
+    'denoise': False,
+    # Fast dilation adds the margin itself after each bake
+    'margin': 0 if self.margin_method == 'dilate' else get_bake_margin(self)
+  })
+  state['objects'] = objects
+
+  if self.should_unwrap and self.target == 'IMAGE_TEXTURES': unwrap(self, context, objects)
+  return state
+
+
+def end_bake(context, state):
+  for obj in context.scene.objects:
+    if obj.name in state['selected_object_names']:
+      obj.select_set(True)
+    else:
+      obj.select_set(False)
+  context.view_layer.objects.active = bpy.data.objects[state['active_obj_name']]
+  set_bake_properties(context.scene, state['prev_bake_properties'])
+  mode_toggle(context, state['prev_mode'])
+
+
 class NODE_OT_bake_scatter(bpy.types.Operator):
   bl_label = "Bake Scatter"
   bl_idname = "node.bake_scatter"
@@ -257,6 +1303,30 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     default = 'texture_set'
   )
 
+  target: bpy.props.EnumProperty(
+    name = "Target",
+    description = "Choose what to bake the scatter into",
+    items = [
+      ('IMAGE_TEXTURES', 'Image Textures', 'Bakes each channel to an image texture using UV coordinates'),
+      ('VERTEX_COLORS', 'Color Attributes', 'Bakes each channel to the mesh vertices without unwrapping. Value channels are packed three to an attribute. Best for meshes with more vertices than texture pixels')
+    ],
+    default = 'IMAGE_TEXTURES'
+  )
+  scope: bpy.props.EnumProperty(
+    name = "Scatter Nodes",
+    description = "Choose which scatter nodes to bake",
+    items = [
+      ('selected', 'Selected Nodes', 'Bakes the selected scatter nodes of this material'),
+      ('objects', 'All Materials', 'Bakes every scatter node in every material of the baked objects in one run')
+    ],
+    default = 'selected'
+  )
+  use_atlas: bpy.props.BoolProperty(
+    name = "Shared Atlas",
+    description = "Bakes the scatter nodes of every material on the baked objects into one shared texture per channel. The objects are unwrapped together so each material gets its own region of the atlas",
+    default = False
+  )
+
   bake_type: bpy.props.EnumProperty(
     name="Bake Type",
     description="Bake the final scatter result or just the vector coordinates",
@@ -333,6 +1403,11 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     description = 'Creates a new UV unwrap before baking',
     default = True
   )
+  check_uvs: bpy.props.BoolProperty(
+    name = 'Check UVs',
+    description = 'Cancels the bake before it starts if the existing UVs overlap. Turn off for intentionally mirrored or stacked UVs',
+    default = True
+  )
   unwrap_method: bpy.props.EnumProperty(
     name = 'Method',
     description = 'Determines how the new UVs are projected',
@@ -375,6 +1450,64 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     default = 1080
   )
 
+  lod_levels: bpy.props.IntProperty(
+    name = "LOD Levels",
+    description = "Number of additional half resolution textures to save for each channel. They are derived from the baked texture rather than baked again",
+    default = 0,
+    min = 0,
+    max = 6
+  )
+  lod_filter: bpy.props.EnumProperty(
+    name = "LOD Filter",
+    description = "How the pixels are combined when reducing the resolution",
+    items = [
+      ('box', 'Box', 'Averages each block of 2x2 pixels. Fastest'),
+      ('lanczos', 'Lanczos', 'A sharper filter that keeps more detail in the lower resolutions'),
+    ],
+    default = 'box'
+  )
+
+  use_frame_range: bpy.props.BoolProperty(
+    name = "Animation",
+    description = "Bakes every frame in the range to a numbered image sequence. Frames whose inputs match an earlier frame reuse its files instead of being baked again",
+    default = False
+  )
+  frame_start: bpy.props.IntProperty(
+    name = "Frame Start",
+    description = "First frame of the baked image sequence",
+    default = 1,
+    min = 0
+  )
+  frame_end: bpy.props.IntProperty(
+    name = "End",
+    description = "Last frame of the baked image sequence",
+    default = 250,
+    min = 0
+  )
+
+  use_background_bake: bpy.props.BoolProperty(
+    name = "Background",
+    description = "Bakes one channel at a time in the background with a progress bar so that Blender stays responsive. Press Esc to cancel the channel that is baking and stop. The channels that are already baked are kept",
+    default = True
+  )
+
+  use_displace_modifier: bpy.props.BoolProperty(
+    name = 'Displace Modifier',
+    description = 'Adds Subdivision and Displace modifiers that use the baked displacement map and disconnects the shader displacement so renders no longer need adaptive subdivision',
+    default = False
+  )
+  displace_subdivisions: bpy.props.IntProperty(
+    name = 'Subdivisions',
+    description = 'The number of simple subdivisions added before displacing',
+    default = 4,
+    min = 0,
+    max = 8
+  )
+  apply_displacement: bpy.props.BoolProperty(
+    name = 'Apply',
+    description = 'Applies the modifiers so that the displaced mesh can be cached or exported. Meshes shared by several objects cannot be applied',
+    default = False
+  )
   samples: bpy.props.IntProperty(
     name = "Samples",
     description = "The number of Cycles samples to bake with",
@@ -382,6 +1515,20 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     min = 1,
     max = 500
   )
+  use_deferred: bpy.props.BoolProperty(
+    name = 'Deferred Channels',
+    description = 'Bakes the scatter coordinates once and rebuilds channels from the source textures without baking each of them in Cycles, including their Cell HSV adjustments. Channels with noise color randomization, tri-planar mapping or cell blending are still baked normally',
+    default = False
+  )
+  margin_method: bpy.props.EnumProperty(
+    name = "Margin",
+    description = "How to extend the baked texture past the edges of the UV islands",
+    items = [
+      ('adjacent_faces', 'Adjacent Faces', 'Lets Cycles fill the margin with the neighboring faces. Slow on dense meshes'),
+      ('dilate', 'Fast Dilation', 'Copies the nearest baked pixel outward after each bake, reusing the UV coverage for every channel')
+    ],
+    default = 'adjacent_faces'
+  )
   denoise: bpy.props.BoolProperty(
     name = 'Denoise',
     description = 'Run denoising on the texture after it is baked.',
@@ -389,7 +1536,10 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
   )
 
   def draw(self, context):
-    scatter_nodes = [x for x in context.selected_nodes if get_scatter_sources([x])]
+    if self.scope == 'objects' or self.use_atlas:
+      scatter_nodes = get_object_scatter_nodes(context.object)
+    else:
+      scatter_nodes = [x for x in context.selected_nodes if get_scatter_sources([x])]
     channels = []
     for scatter_node in scatter_nodes:
       for output in scatter_node.outputs:
@@ -398,6 +1548,9 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     layout = self.layout
     layout.use_property_split = True
     layout.prop(self, "objects")
+    layout.prop(self, "target")
+    layout.prop(self, "scope")
+    layout.prop(self, "use_atlas")
 
     layout.separator()
 
@@ -430,38 +1583,73 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
         normal_row.prop(self, "Normal")
       if 'Displacement' in channels:
         channels_column.prop(self, "Displacement")
+        if self.target == 'IMAGE_TEXTURES':
+          displace_column = channels_column.column()
+          displace_column.enabled = self.Displacement
+          displace_column.prop(self, "use_displace_modifier")
+          modifier_column = displace_column.column()
+          modifier_column.enabled = self.use_displace_modifier
+          modifier_column.prop(self, "displace_subdivisions")
+          modifier_column.prop(self, "apply_displacement")
 
     layout.separator()
 
-    uv = layout.column(heading="UVs")
-    uv.prop(self, "should_unwrap")
-    uv_column = uv.column()
-    uv_column.enabled = self.should_unwrap
-    uv_column.prop(self, "unwrap_method")
-    if self.unwrap_method == 'smart':
-      uv_column.prop(self, 'smart_project_angle')
-    uv_column.prop(self, 'apply_scale')
-
-    layout.separator()
-
-    tex = layout.column(heading='Texture')
-    resolution = tex.column(align = True)
-    resolution.prop(self, "width")
-    resolution.prop(self, "height")
-
-    layout.separator()
+    # Color attributes need no UVs or image settings
+    if self.target == 'IMAGE_TEXTURES':
+      uv = layout.column(heading="UVs")
+      uv.prop(self, "should_unwrap")
+      uv_column = uv.column()
+      uv_column.enabled = self.should_unwrap
+      uv_column.prop(self, "unwrap_method")
+      if self.unwrap_method == 'smart':
+        uv_column.prop(self, 'smart_project_angle')
+      uv_column.prop(self, 'apply_scale')
+      check_column = uv.column()
+      check_column.enabled = not self.should_unwrap
+      check_column.prop(self, 'check_uvs')
+
+      layout.separator()
+
+      tex = layout.column(heading='Texture')
+      resolution = tex.column(align = True)
+      resolution.prop(self, "width")
+      resolution.prop(self, "height")
+      tex.prop(self, "lod_levels")
+      lod_filter = tex.row()
+      lod_filter.enabled = self.lod_levels > 0
+      lod_filter.prop(self, "lod_filter")
+
+      layout.separator()
+
+      animation = layout.column(heading='Animation')
+      animation.prop(self, "use_frame_range", text = 'Bake Frame Range')
+      frame_range = animation.column(align = True)
+      frame_range.enabled = self.use_frame_range
+      frame_range.prop(self, "frame_start")
+      frame_range.prop(self, "frame_end")
+
+      layout.separator()
 
     layout.prop(self, "samples")
-    layout.prop(self, "denoise")
+    image_options = layout.column()
+    image_options.enabled = self.target == 'IMAGE_TEXTURES'
+    image_options.prop(self, "use_deferred")
+    image_options.prop(self, "margin_method")
+    image_options.prop(self, "denoise")
+    layout.prop(self, "use_background_bake")
 
     layout.separator()
 
 
   @classmethod
   def poll(cls, context):
-    return context.area.ui_type == 'ShaderNodeTree' and get_scatter_sources(context.selected_nodes)
+    return context.area.ui_type == 'ShaderNodeTree' and (
+      get_scatter_sources(context.selected_nodes) or get_object_scatter_nodes(context.object)
+    )
 
   def invoke(self, context, event):
+      self.frame_start = context.scene.frame_start
+      self.frame_end = context.scene.frame_end
       return context.window_manager.invoke_props_dialog(self)
 
   def execute(self, context):
@@ -471,48 +1659,136 @@ class NODE_OT_bake_scatter(bpy.types.Operator):
     ]):
       self.report({'WARNING'}, 'Cancelling bake. Please select at least one channel to bake.')
       return {'FINISHED'}
+    if self.scope == 'selected' and not self.use_atlas and not get_scatter_sources(context.selected_nodes):
+      self.report({'WARNING'}, 'Cancelling bake. Please select at least one scatter node or bake all materials.')
+      return {'FINISHED'}
+    if self.use_frame_range and self.frame_end < self.frame_start:
+      self.report({'WARNING'}, 'Cancelling bake. The end frame must come after the start frame.')
+      return {'FINISHED'}
     
-    # switching modes prevents context errors
-    prev_mode = mode_toggle(context, 'OBJECT')
-    prev_bake_properties = get_bake_properties(context.scene)
-    set_bake_properties(context.scene, {
-      'engine': 'CYCLES',
-      'bake_type': 'EMIT',
-      'use_selected_to_active': False,
-      'target': 'IMAGE_TEXTURES',
-      'use_clear': False,
-      'use_bake_multires': False,
-      'samples': self.samples,
-      'margin_type': 'ADJACENT_FACES',
-      'denoise': False,
-      'margin': int((self.width + self.height / 4) / 128)
-    })
-    selected_object_names = [x.name for x in context.selected_objects]
-    active_material = context.active_object.active_material
-    active_obj_name = copy(context.active_object.name)
-
-    if self.objects == 'texture_set':
-      objects = [x for x in context.scene.objects if x.material_slots.items() and is_in_texture_set(x, active_material)]
-    else:
-      objects = context.selected_objects
-
-    if self.unwrap_method != 'existing': unwrap(self, context, objects)
-
+    objects = get_bake_objects(self, context)
+    scatter_nodes = get_bake_scatter_nodes(self, context, objects)
+    errors, warnings = check_bake_setup(self, context, objects, scatter_nodes)
+    for warning in warnings:
+      self.report({'WARNING'}, warning)
+    if errors:
+      self.report({'ERROR'}, 'Cancelling bake. ' + ' '.join(errors))
+      return {'CANCELLED'}
+
+    self.bake_state = start_bake(self, context, objects)
     if self.bake_type == 'combined':
-      bake_scatter(self, context, objects)
+      self.scatter_nodes, self.jobs = prepare_bake_scatter(self, context, objects, scatter_nodes)
     else:
-      pass
+      self.scatter_nodes, self.jobs = [], []
       # bake_vectors(self, context, objects)
 
-    for obj in context.scene.objects:
-      if obj.name in selected_object_names:
-        obj.select_set(True)
-      else:
-        obj.select_set(False)
-    context.view_layer.objects.active = bpy.data.objects[active_obj_name]
-    set_bake_properties(context.scene, prev_bake_properties)
-    mode_toggle(context, prev_mode)
+    if self.use_background_bake and context.window and self.jobs:
+      return self.start_modal(context)
+
+    for job in self.jobs:
+      run_bake_job(self, context, job)
+    finish_bake_scatter(self, context, self.scatter_nodes, self.jobs)
+    end_bake(context, self.bake_state)
+    return {'FINISHED'}
 
+  def start_modal(self, context):
+    self.job_idx = 0
+    self.job_steps = None
+    self.completed_steps = 0
+    self.total_steps = count_bake_steps(self, self.jobs)
+    self.cancel_requested = False
+    bake_status['running'] = False
+    bake_status['cancelled'] = False
+    bpy.app.handlers.object_bake_complete.append(on_bake_complete)
+    bpy.app.handlers.object_bake_cancel.append(on_bake_cancel)
+    context.window_manager.progress_begin(0, self.total_steps)
+    self.timer = context.window_manager.event_timer_add(0.2, window=context.window)
+    context.window_manager.modal_handler_add(self)
+    return {'RUNNING_MODAL'}
+
+  def modal(self, context, event):
+    # Anything that stops the modal, including errors, has to remove the bake handlers
+    is_baking = False
+    try:
+      if event.type == 'ESC' and event.value == 'PRESS' and not self.cancel_requested:
+        # Cycles handles Esc while it is baking, so this only happens between two channels
+        self.cancel_requested = True
+        self.report({'INFO'}, 'Cancelling bake')
+      if event.type != 'TIMER' or bake_status['running']:
+        is_baking = True
+        return {'PASS_THROUGH'}
+
+      if bake_status['cancelled']:
+        # Cycles' own bake job was cancelled, so the current channel is incomplete
+        bake_status['cancelled'] = False
+        self.job_steps.close()
+        self.job_steps = None
+        self.cancel_requested = True
+
+      is_baking = self.advance_bake(context)
+      return {'PASS_THROUGH'} if is_baking else {'FINISHED'}
+    finally:
+      if not is_baking:
+        self.finish_modal(context)
+
+  def cancel(self, context):
+    self.finish_modal(context)
+
+  def advance_bake(self, context):
+    # Runs everything up to the next bake, then starts that bake in the background
+    while True:
+      if self.job_steps is None:
+        if self.cancel_requested or self.job_idx >= len(self.jobs):
+          return False
+        self.job_steps = bake_job_steps(self, context, self.jobs[self.job_idx])
+        self.job_idx += 1
+      try:
+        next(self.job_steps)
+      except StopIteration:
+        self.job_steps = None
+        continue
+      channel = self.jobs[self.job_idx - 1]['channel']
+      context.workspace.status_text_set(
+        f"Baking {channel}: channel {self.job_idx} of {len(self.jobs)}. Press Esc to cancel this channel and stop"
+      )
+      context.window_manager.progress_update(self.completed_steps)
+      self.completed_steps += 1
+      bake_status['running'] = True
+      if 'RUNNING_MODAL' not in bpy.ops.object.bake('INVOKE_DEFAULT'):
+        bake_status['running'] = False
+        self.report({'ERROR'}, f'Could not start baking {channel}')
+        self.job_steps.close()
+        self.job_steps = None
+        return False
+      return True
+
+  def finish_modal(self, context):
+    if self.timer is None:
+      return {'FINISHED'}
+    try:
+      context.window_manager.event_timer_remove(self.timer)
+      self.timer = None
+      context.window_manager.progress_end()
+      context.workspace.status_text_set(None)
+      if self.job_steps is not None:
+        # Restores the material outputs and removes the new texture nodes of the unfinished channel
+        self.job_steps.close()
+        self.job_steps = None
+      finish_bake_scatter(self, context, self.scatter_nodes, self.jobs)
+      end_bake(context, self.bake_state)
+    finally:
+      for handlers, handler in [
+        (bpy.app.handlers.object_bake_complete, on_bake_complete),
+        (bpy.app.handlers.object_bake_cancel, on_bake_cancel)
+      ]:
+        if handler in handlers:
+          handlers.remove(handler)
+    channel_jobs = [x for x in self.jobs if not x.get('is_scatter_vector')]
+    completed = len([x for x in channel_jobs if 'new_textures' in x])
+    if completed < len(channel_jobs):
+      self.report({'WARNING'}, f'Bake cancelled. Kept {completed} of {len(channel_jobs)} baked channels')
+    else:
+      self.report({'INFO'}, f'Baked {completed} channels')
     return {'FINISHED'}
 
 def register():
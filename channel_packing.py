@@ -0,0 +1,145 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy, os, hashlib
+import numpy as np
+from .defaults import data_channels, data_color_spaces, packed_channels_property
+from .utilities.utilities import save_image
+from .utilities.image_processing import get_image_pixels, new_image_from_pixels, resize_pixels, get_luminance
+
+# Separate Color splits the packed image into three channels. The alpha is left for the alpha of the kept channel's image, which is used for transparency
+max_packed_channels = 3
+
+
+def get_channel_packs(sorted_textures, scatter_sources):
+  # Groups the data channels that have the same number of images and scatter sources, so that every image set packs into one image
+  packs = []
+  for channel in [x for x in data_channels if x in sorted_textures and x in scatter_sources]:
+    pack = next((
+      x for x in packs if len(x) < max_packed_channels
+      and len(sorted_textures[x[0]]) == len(sorted_textures[channel])
+      and len(scatter_sources[x[0]]) == len(scatter_sources[channel])
+    ), None)
+    if pack:
+      pack.append(channel)
+    else:
+      packs.append([channel])
+  return [x for x in packs if len(x) > 1]
+
+
+def get_packed_file_path(images, channels, alpha_idx):
+  # The file name includes a hash of the sources and of the image the alpha comes from, so that editing any of them packs them again
+  source_paths = [bpy.path.abspath(x.filepath) for x in images]
+  state = hashlib.sha1()
+  state.update(channels[alpha_idx].encode())
+  for image, path in zip(images, source_paths):
+    state.update(path.encode() if path else image.name.encode())
+    if path and os.path.exists(path):
+      state.update(str(os.path.getmtime(path)).encode())
+  directory = os.path.dirname(source_paths[0]) if source_paths[0] else ''
+  if not directory or not os.path.isdir(directory):
+    return None, f"{images[0].name} Packed"
+  name = f"{os.path.splitext(os.path.basename(source_paths[0]))[0]}_{'-'.join(channels)}_{state.hexdigest()[:8]}"
+  return os.path.join(directory, f"{name}.png"), name
+
+
+def set_data_color_space(image):
+  color_spaces = [x.name for x in bpy.types.ColorManagedInputColorspaceSettings.bl_rna.properties['name'].enum_items]
+  for space in data_color_spaces:
+    if space in color_spaces:
+      image.colorspace_settings.name = space
+      break
+
+
+def get_packed_image(context, images, channels, alpha_idx):
+  file_path, name = get_packed_file_path(images, channels, alpha_idx)
+  if file_path and os.path.exists(file_path):
+    packed_image = bpy.data.images.load(file_path, check_existing=True)
+    set_data_color_space(packed_image)
+    packed_image.alpha_mode = 'CHANNEL_PACKED'
+    return packed_image
+
+  height = max(x.size[1] for x in images)
+  width = max(x.size[0] for x in images)
+  pixels = np.ones((height, width, 4), dtype=np.float32)
+  for channel_idx, image in enumerate(images):
+    image_pixels = get_image_pixels(image)
+    if image_pixels.shape[:2] != (height, width):
+      image_pixels = resize_pixels(image_pixels, width, height)
+    # Data maps are read as they are stored, which is what the scatter sees once they are set to Non-Color
+    pixels[..., channel_idx] = get_luminance(image_pixels)
+    if channel_idx == alpha_idx:
+      pixels[..., 3] = image_pixels[..., 3]
+  packed_image = new_image_from_pixels(name, pixels, is_data=True)
+  set_data_color_space(packed_image)
+  # The alpha must not be multiplied into the packed channels
+  packed_image.alpha_mode = 'CHANNEL_PACKED'
+  if file_path:
+    packed_image.filepath_raw = file_path
+    save_image(context, packed_image, {'format': 'PNG', 'color_depth': '16', 'color_mode': 'RGBA'})
+  else:
+    packed_image.pack()
+  return packed_image
+
+
+def pack_scatter_sources(self, context, scatter_node, scatter_sources, sorted_textures):
+  # Each pack keeps one scatter source, which looks up the packed images once and splits them back into the channels.
+  # The other scatter sources of the pack are removed and their links are moved to the split channels.
+  if not self.use_channel_packing:
+    return
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  for pack in get_channel_packs(sorted_textures, scatter_sources):
+    set_count = len(sorted_textures[pack[0]])
+    original_images = {channel: [x.image for x in sorted_textures[channel]] for channel in pack}
+    # The source named Scatter Source is used elsewhere for the scatter's alpha, so it has to be the one that is kept
+    kept_channel = next((x for x in pack if any(y.name == 'Scatter Source' for y in scatter_sources[x])), pack[0])
+    packed_images = [
+      get_packed_image(context, [original_images[channel][idx] for channel in pack], pack, pack.index(kept_channel)) for idx in range(set_count)
+    ]
+
+    for source_idx, kept_source in enumerate(scatter_sources[kept_channel]):
+      for image_node in kept_source.node_tree.nodes:
+        if image_node.type == 'TEX_IMAGE' and image_node.image in original_images[kept_channel]:
+          image_node.image = packed_images[original_images[kept_channel].index(image_node.image)]
+      kept_source.node_tree[packed_channels_property] = pack
+
+      separate_color = nodes.new('ShaderNodeSeparateColor')
+      separate_color.location = [kept_source.location[0] + 200, kept_source.location[1] + 100]
+      separate_color.hide = True
+      for channel_idx, channel in enumerate(pack):
+        source = scatter_sources[channel][source_idx]
+        for output_idx, output in enumerate(source.outputs):
+          from_socket = separate_color.outputs[channel_idx] if output_idx == 0 else kept_source.outputs[output_idx]
+          for to_socket in [x.to_socket for x in output.links]:
+            links.new(from_socket, to_socket)
+      links.new(kept_source.outputs[0], separate_color.inputs[0])
+
+      for channel in pack:
+        if channel != kept_channel:
+          source = scatter_sources[channel][source_idx]
+          bpy.data.node_groups.remove(source.node_tree)
+          nodes.remove(source)
+    for channel in pack:
+      if channel != kept_channel:
+        del scatter_sources[channel]
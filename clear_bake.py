@@ -26,19 +26,38 @@ from copy import copy
 import bpy
 from .utilities.node_interface import remove_socket
 from .utilities.utilities import get_scatter_sources, get_baked_sources, mode_toggle
-from .defaults import texture_names
+from .defaults import texture_names, bake_targets_property
 
-def clear_bake(context):
-  selected_nodes = context.selected_nodes
-  links = selected_nodes[0].id_data.links
-  baked_nodes = [x for x in selected_nodes if get_baked_sources([x])]
+def remove_baked_images(scatter_node, images):
+  # Only removes images that nothing else uses, such as an atlas still shared by another material
+  tracked_images = scatter_node.node_tree.get(bake_targets_property, {})
+  for image_name in tracked_images.values():
+    if image_name in bpy.data.images and bpy.data.images[image_name] not in images:
+      images.append(bpy.data.images[image_name])
+  for image in images:
+    if image.users == 0:
+      bpy.data.images.remove(image)
+  if bake_targets_property in scatter_node.node_tree:
+    del scatter_node.node_tree[bake_targets_property]
+
+def clear_bake(context, scatter_nodes=None, remove_images=True):
+  if scatter_nodes is None:
+    scatter_nodes = context.selected_nodes
+  baked_nodes = get_baked_sources(scatter_nodes)
   for scatter_node in baked_nodes:
+    links = scatter_node.id_data.links
     # Remove images
-    for node in scatter_node.node_tree.nodes:
-      if node.type == 'TEX_IMAGE':
-        scatter_node.node_tree.nodes.remove(node)
+    images = []
+    # Collects the nodes first, since removing them while iterating skips the ones that follow
+    removed_nodes = [x for x in scatter_node.node_tree.nodes if x.type == 'TEX_IMAGE' or x.name.startswith('Baked ')]
+    for node in removed_nodes:
+      if node.type == 'TEX_IMAGE' and node.image and node.image not in images:
+        images.append(node.image)
+      scatter_node.node_tree.nodes.remove(node)
+    if remove_images:
+      remove_baked_images(scatter_node, images)
     # Remove baked sockets
-    for output in scatter_node.outputs:
+    for output in list(scatter_node.outputs):
       if output.name in texture_names.keys() or output.name == 'Image':
         baked_output_name = f"Baked {output.name}"
         if baked_output_name in scatter_node.outputs:
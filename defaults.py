@@ -60,16 +60,28 @@ default_view_transforms = ['Standard', 'Display Native']
 
 # Defaults for the operators. Do not add or remove any of these.
 scatter = {
+  'backend': 'nodes', # nodes or osl
   'projection_method': 'uv', # uv or tri-planar
+  'triplanar_blend_method': 'dither', # dither or smooth
   'texture_interpolation': 'Closest', # Closest or Cubic
-  'layering': 'simple',   # coordinates, simple, blended, simple_alpha, layered, or overlapping
+  'layering': 'simple',   # coordinates, simple, blended, hex_tiling, simple_alpha, layered, or overlapping
+  'cell_engine': 'voronoi', # voronoi, square, or hex
+  'use_shared_cells': False,
+  'overlap_cells': '9', # 1, 4, or 9
+  'use_channel_packing': False,
   'use_pbr': True,
   'use_edge_blur': True,
+  'cell_blend_method': 'dither', # dither or smooth
   'use_edge_warp': True,
   'use_texture_warp': False,
   'use_random_col': True,
   'use_noise_col': False,
-  'use_manage_col': True
+  'use_shared_random': False,
+  'use_manage_col': True,
+  'variation_source': 'none', # none, object_random, object_attribute, or instancer_attribute
+  'variation_attribute': 'variation',
+  'use_simple_indirect': False,
+  'use_distance_lod': False
 }
 unscatter = {
   'interpolation': 'Linear', # Linear, Closest, Cubic, or Smart
@@ -108,6 +120,11 @@ layering = {
     'Random Texture Location X': 1,
     'Random Texture Location Y': 1,
   },
+  'hex_tiling': {
+    'Cell Scale': 2,
+    'Random Texture Location X': 1,
+    'Random Texture Location Y': 1,
+  },
   'blended': {
     'Mix Noise Scale': 1,
     'Mix Noise Detail': 6,
@@ -136,6 +153,12 @@ layering = {
 # Node names
 node_tree_names = {
   "tri-planar": ".tri-planar_mapping",
+  "tri-planar_smooth": ".tri-planar_mapping_smooth",
+  "grid_cells": ".grid_cells",
+  "hex_tiling": ".hex_tiling_corner",
+  "periodic_cells": ".periodic_cells",
+  "shared_cells": ".shared_cells",
+  "wang_tiles": ".wang_tiles",
   "uv_normal_map": ".uv_normal_map",
   "tri-planar_normal_map": ".tri-planar_normal_map",
   "scatter_vectors": "Scatter Vectors",
@@ -146,12 +169,19 @@ node_tree_names = {
   "randomize_noise_hsv": ".noise_randomize_hsv",
   "randomize_cell_value": ".randomize_cell_value",
   "randomize_noise_value": ".noise_randomize_value",
+  "random_adjustments": ".random_adjustments",
   "scatter_coordinates": ".scatter_coordinates",
   "scatter_source": ".scatter_source",
   "scatter_source_empty": ".scatter_source_empty",
   "scatter_layered": "Scatter Layered"
 }
 
+# Custom property on scatter node trees that remembers which image each channel was baked to
+bake_targets_property = 'scattershot_bake_targets'
+
+# Custom property on scatter source trees that lists the channels packed into the red, green, and blue of their images
+packed_channels_property = 'scattershot_packed_channels'
+
 prev_node_tree_names = {
   "scatter_source": "Scatter Source",
   "scatter_source_empty": "Scatter Source Empty",
@@ -0,0 +1,213 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+from .bake import (
+  get_bake_properties, set_bake_properties, set_plane_bake_properties, create_bake_plane, remove_bake_plane, bake_plane_channel,
+  get_texture_file_name, get_sized_file_name, get_format_settings, get_file_path, get_bake_texture, connect_baked_socket, finish_baked_node
+)
+from .defaults import bake_targets_property, texture_names
+from .grid_cells import get_periodic_cells_tree, replace_voronoi
+from .utilities.utilities import get_active_scatter_node, get_baked_sources, get_node_tree_material, mode_toggle, save_image
+
+
+def get_cells_node(node_tree):
+  for name in ['Voronoi Texture', 'Cells']:
+    if name in node_tree.nodes:
+      return node_tree.nodes[name]
+  return None
+
+
+def get_cell_groups(node_tree):
+  # Every group node that searches for cells, including the ones inside layered scatters
+  cell_groups = []
+  for node in node_tree.nodes:
+    if node.type == 'GROUP' and node.node_tree:
+      if get_cells_node(node.node_tree):
+        cell_groups.append(node)
+      else:
+        cell_groups.extend(get_cell_groups(node.node_tree))
+  return cell_groups
+
+
+def use_periodic_cells(scatter_node, period):
+  # Swaps each coordinates tree for a copy with periodic cells and returns what is needed to swap them back
+  swapped_groups = []
+  for group_node in get_cell_groups(scatter_node.node_tree):
+    original_tree = group_node.node_tree
+    periodic_tree = original_tree.copy()
+    cells_node = get_cells_node(periodic_tree)
+    feature = cells_node.feature if cells_node.type == 'TEX_VORONOI' else 'F1'
+    scale = cells_node.inputs['Scale'].default_value if not cells_node.inputs['Scale'].links else 1
+    periodic_cells = replace_voronoi(periodic_tree, get_periodic_cells_tree(feature), cells_node.name)
+    # Cell Scale is how many pattern units the UV tile spans
+    periodic_cells.inputs['Period'].default_value = period
+    periodic_cells.inputs['Scale'].default_value = scale
+    group_node.node_tree = periodic_tree
+    swapped_groups.append((group_node, original_tree))
+  return swapped_groups
+
+
+def restore_cells(swapped_groups):
+  for group_node, original_tree in swapped_groups:
+    periodic_tree = group_node.node_tree
+    group_node.node_tree = original_tree
+    bpy.data.node_groups.remove(periodic_tree)
+
+
+def get_tile_channels(scatter_node):
+  return [x for x in scatter_node.outputs if x.name in texture_names.keys() or x.name == 'Image']
+
+
+def get_tile_error(scatter_node):
+  nodes = scatter_node.node_tree.nodes
+  if 'Tri-Planar Mapping' in nodes:
+    return 'The tile repeats in UV space, so the scatter node must use UV mapping'
+  if 'Cell Scale' not in scatter_node.inputs or scatter_node.inputs['Cell Scale'].links:
+    return 'The scatter node needs an unconnected Cell Scale input to be flattened'
+  if 'Hex Corner 2 Coordinates' in nodes:
+    return 'Hex Tiling scatters cannot be flattened'
+  return None
+
+
+def bake_tile(context, scatter_node, outputs, resolution, samples, image_names):
+  # Bakes the outputs over one UV tile with periodic cells, so that the images repeat seamlessly
+  material = get_node_tree_material(scatter_node.id_data)
+  cell_scale = scatter_node.inputs['Cell Scale']
+  prev_cell_scale = cell_scale.default_value
+  period = max(round(prev_cell_scale), 1)
+  prev_selected = [x.name for x in context.selected_objects]
+  prev_active = context.view_layer.objects.active
+  prev_bake_properties = get_bake_properties(context.scene)
+  set_plane_bake_properties(context.scene, samples)
+  cell_scale.default_value = period
+  swapped_groups = use_periodic_cells(scatter_node, period)
+  plane = create_bake_plane(context, material, 1, 1)
+  images = {}
+  try:
+    for output in outputs:
+      images[output.name] = bake_plane_channel(context, plane, material, output, image_names[output.name], resolution, resolution)
+  finally:
+    remove_bake_plane(plane)
+    restore_cells(swapped_groups)
+    cell_scale.default_value = prev_cell_scale
+    set_bake_properties(context.scene, prev_bake_properties)
+    for obj in context.scene.objects:
+      obj.select_set(obj.name in prev_selected)
+    context.view_layer.objects.active = prev_active
+  return images
+
+
+def flatten_tile(self, context, scatter_node):
+  material = get_node_tree_material(scatter_node.id_data)
+  preferences = context.preferences.addons[__package__].preferences
+  image_names = {
+    x.name: get_sized_file_name(get_texture_file_name(preferences, x.name, scatter_node, material), self.resolution, self.resolution)
+    for x in get_tile_channels(scatter_node)
+  }
+  images = bake_tile(context, scatter_node, get_tile_channels(scatter_node), self.resolution, self.samples, image_names)
+
+  # The tile goes in the same place as a regular bake, so Clear Baked Scatter turns it back into the procedural node
+  new_textures = []
+  node_tree = scatter_node.node_tree
+  if bake_targets_property not in node_tree:
+    node_tree[bake_targets_property] = {}
+  for output_idx, output in enumerate(get_tile_channels(scatter_node)):
+    image = images[output.name]
+    format_settings = get_format_settings(preferences, output.name)
+    image.filepath_raw = get_file_path(preferences, image.name, format_settings)
+    save_image(context, image, format_settings)
+    node_tree[bake_targets_property][output.name] = image.name
+    texture, is_new = get_bake_texture(scatter_node, output.name, output_idx)
+    texture.image = image
+    texture.extension = 'REPEAT'
+    new_textures.append(texture)
+    connect_baked_socket(scatter_node, texture.outputs[0], output)
+  finish_baked_node(self, scatter_node, new_textures, False)
+
+
+class NODE_OT_flatten_tile(bpy.types.Operator):
+  bl_label = "Flatten to Tile"
+  bl_idname = "node.flatten_scatter_tile"
+  bl_description = "Bakes the selected scatter node into seamless textures that repeat once per UV tile. Clear Baked Scatter turns it back into the procedural node"
+  bl_space_type = "NODE_EDITOR"
+  bl_region_type = "UI"
+  bl_options = {'REGISTER', 'UNDO'}
+
+  # Used by finish_baked_node, since the tile is always baked in the existing UVs
+  should_unwrap = False
+  target = 'IMAGE_TEXTURES'
+
+  resolution: bpy.props.IntProperty(
+    name = "Resolution",
+    description = "The width and height of the tile in pixels",
+    default = 1024,
+    min = 16,
+    max = 8192
+  )
+  samples: bpy.props.IntProperty(
+    name = "Samples",
+    description = "Render samples used for baking the scatter",
+    default = 8,
+    min = 1
+  )
+
+  @classmethod
+  def poll(cls, context):
+    return context.area.ui_type == 'ShaderNodeTree' and get_active_scatter_node(context)
+
+  def invoke(self, context, event):
+    return context.window_manager.invoke_props_dialog(self)
+
+  def draw(self, context):
+    layout = self.layout
+    layout.use_property_split = True
+    layout.prop(self, "resolution")
+    layout.prop(self, "samples")
+
+  def execute(self, context):
+    scatter_node = get_active_scatter_node(context)
+    if not get_node_tree_material(scatter_node.id_data):
+      self.report({'ERROR'}, 'Only scatter nodes that are directly in a material can be flattened')
+      return {'CANCELLED'}
+    if get_baked_sources([scatter_node]):
+      self.report({'ERROR'}, 'The scatter node is already baked. Clear the bake before flattening it')
+      return {'CANCELLED'}
+    tile_error = get_tile_error(scatter_node)
+    if tile_error:
+      self.report({'ERROR'}, tile_error)
+      return {'CANCELLED'}
+    if any(x.default_value for x in scatter_node.inputs if x.name in ['Edge Warp', 'Texture Warp'] and not x.links):
+      self.report({'WARNING'}, 'Edge Warp and Texture Warp do not repeat, so they may show seams at the tile edges')
+    # switching modes prevents context errors
+    prev_mode = mode_toggle(context, 'OBJECT')
+    flatten_tile(self, context, scatter_node)
+    mode_toggle(context, prev_mode)
+    return {'FINISHED'}
+
+
+def register():
+  bpy.utils.register_class(NODE_OT_flatten_tile)
+
+def unregister():
+  bpy.utils.unregister_class(NODE_OT_flatten_tile)
@@ -0,0 +1,350 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+from math import sqrt
+from .defaults import node_tree_names
+from .utilities.node_interface import create_socket
+
+
+def add_math_node(node_tree, node_type, operation, inputs, location):
+  math_node = node_tree.nodes.new(node_type)
+  math_node.operation = operation
+  math_node.location = location
+  for idx, value in enumerate(inputs):
+    if isinstance(value, bpy.types.NodeSocket):
+      node_tree.links.new(value, math_node.inputs[idx])
+    elif value is not None:
+      math_node.inputs[idx].default_value = value
+  if operation in ['DISTANCE', 'LENGTH', 'DOT_PRODUCT']:
+    return math_node.outputs['Value']
+  return math_node.outputs[0]
+
+
+def create_cells_tree(name):
+  # Cell trees stand in for the Voronoi Texture, so they have the same sockets
+  node_tree = bpy.data.node_groups.new(name, 'ShaderNodeTree')
+  create_socket(node_tree, 'INPUT', 'NodeSocketVector', 'Vector')
+  create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Scale').default_value = 5
+  create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Randomness').default_value = 1
+  create_socket(node_tree, 'OUTPUT', 'NodeSocketFloat', 'Distance')
+  create_socket(node_tree, 'OUTPUT', 'NodeSocketColor', 'Color')
+  create_socket(node_tree, 'OUTPUT', 'NodeSocketVector', 'Position')
+  input_node = node_tree.nodes.new('NodeGroupInput')
+  input_node.location = [-1000, 0]
+  output_node = node_tree.nodes.new('NodeGroupOutput')
+  output_node.location = [2000, 0]
+  return node_tree, input_node, output_node
+
+
+def get_grid_cells_tree(shape, neighbor=None, quadrant=False):
+  # The cell is found with a single floor (two for hexagons) and every random value is hashed from the cell center,
+  # so there is no neighborhood search. Square cells can be offset to a neighbor, and quadrant flips the offset
+  # toward the side of the cell that the point is on.
+  name = node_tree_names['grid_cells'] + '_' + shape
+  if neighbor:
+    name += '_%d_%d' % neighbor + ('_quadrant' if quadrant else '')
+  if name in bpy.data.node_groups:
+    return bpy.data.node_groups[name]
+  node_tree, input_node, output_node = create_cells_tree(name)
+  nodes = node_tree.nodes
+  links = node_tree.links
+  column = [-800]
+
+  def add_vector_math(operation, a, b=None):
+    column[0] += 175
+    return add_math_node(node_tree, 'ShaderNodeVectorMath', operation, [a, b], [column[0], 0])
+
+  def add_white_noise(vector, offset):
+    white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+    white_noise.noise_dimensions = '3D'
+    white_noise.location = [column[0], -300]
+    links.new(add_vector_math('ADD', vector, offset), white_noise.inputs['Vector'])
+    return white_noise.outputs['Color']
+
+  # The grid is flat like the UVs it is used with
+  scaled_position = add_vector_math('SCALE', input_node.outputs['Vector'])
+  links.new(input_node.outputs['Scale'], scaled_position.node.inputs['Scale'])
+  position = add_vector_math('MULTIPLY', scaled_position, (1, 1, 0))
+
+  if shape == 'hex':
+    # Hexagon centers are the closer of two offset rectangular grids
+    size = (1, sqrt(3), 1)
+    half_size = (0.5, sqrt(3) / 2, 0)
+    first_center = add_vector_math('MULTIPLY', add_vector_math('ADD', add_vector_math('FLOOR', add_vector_math('DIVIDE', position, size)), (0.5, 0.5, 0)), size)
+    offset_position = add_vector_math('SUBTRACT', position, half_size)
+    second_center = add_vector_math('ADD', add_vector_math('MULTIPLY', add_vector_math('ADD', add_vector_math('FLOOR', add_vector_math('DIVIDE', offset_position, size)), (0.5, 0.5, 0)), size), half_size)
+    is_second = add_math_node(node_tree, 'ShaderNodeMath', 'GREATER_THAN', [
+      add_vector_math('DISTANCE', position, first_center),
+      add_vector_math('DISTANCE', position, second_center)
+    ], [column[0], -150])
+    center_offset = add_vector_math('SCALE', add_vector_math('SUBTRACT', second_center, first_center))
+    links.new(is_second, center_offset.node.inputs['Scale'])
+    center = add_vector_math('ADD', first_center, center_offset)
+    jitter_range = 0.5
+  else:
+    cell = add_vector_math('FLOOR', position)
+    if neighbor:
+      offset = (neighbor[0], neighbor[1], 0)
+      if quadrant:
+        side = add_vector_math('SIGN', add_vector_math('SUBTRACT', add_vector_math('SUBTRACT', position, cell), (0.5, 0.5, 0)))
+        offset = add_vector_math('MULTIPLY', side, offset)
+      cell = add_vector_math('ADD', cell, offset)
+    center = add_vector_math('ADD', cell, (0.5, 0.5, 0))
+    jitter_range = 1
+
+  # Feature points stay inside their cell so that textures centered on them do not drift into the neighbors
+  jitter = add_vector_math('MULTIPLY', add_vector_math('SUBTRACT', add_white_noise(center, (17.3, 5.1, 0)), (0.5, 0.5, 0.5)), (jitter_range, jitter_range, 0))
+  scaled_jitter = add_vector_math('SCALE', jitter)
+  links.new(input_node.outputs['Randomness'], scaled_jitter.node.inputs['Scale'])
+  feature = add_vector_math('ADD', center, scaled_jitter)
+
+  inverse_scale = add_math_node(node_tree, 'ShaderNodeMath', 'DIVIDE', [1, input_node.outputs['Scale']], [column[0], -150])
+  feature_position = add_vector_math('SCALE', feature)
+  links.new(inverse_scale, feature_position.node.inputs['Scale'])
+
+  links.new(add_vector_math('DISTANCE', position, feature), output_node.inputs['Distance'])
+  links.new(add_white_noise(center, (0, 0, 0)), output_node.inputs['Color'])
+  links.new(feature_position, output_node.inputs['Position'])
+  return node_tree
+
+
+def get_hex_tiling_tree(corner):
+  # One corner of the triangle of hexagon centers around each point. Distance outputs the barycentric weight of the corner.
+  name = node_tree_names['hex_tiling'] + '_' + str(corner)
+  if name in bpy.data.node_groups:
+    return bpy.data.node_groups[name]
+  node_tree, input_node, output_node = create_cells_tree(name)
+  nodes = node_tree.nodes
+  links = node_tree.links
+  column = [-800]
+
+  def add_math(operation, a, b=None, node_type='ShaderNodeMath'):
+    column[0] += 175
+    return add_math_node(node_tree, node_type, operation, [a, b], [column[0], 0])
+
+  def separate(vector):
+    separate_xyz = nodes.new('ShaderNodeSeparateXYZ')
+    separate_xyz.location = [column[0], -300]
+    links.new(vector, separate_xyz.inputs[0])
+    return separate_xyz.outputs
+
+  def combine(x, y):
+    combine_xyz = nodes.new('ShaderNodeCombineXYZ')
+    combine_xyz.location = [column[0], -300]
+    links.new(x, combine_xyz.inputs[0])
+    links.new(y, combine_xyz.inputs[1])
+    return combine_xyz.outputs[0]
+
+  scaled_position = add_math('SCALE', input_node.outputs['Vector'], None, 'ShaderNodeVectorMath')
+  links.new(input_node.outputs['Scale'], scaled_position.node.inputs['Scale'])
+  position = separate(scaled_position)
+
+  # Skewing turns the triangles into halves of unit squares
+  skewed = combine(
+    add_math('SUBTRACT', position[0], add_math('DIVIDE', position[1], sqrt(3))),
+    add_math('MULTIPLY', position[1], 2 / sqrt(3))
+  )
+  base = add_math('FLOOR', skewed, None, 'ShaderNodeVectorMath')
+  fraction = separate(add_math('SUBTRACT', skewed, base, 'ShaderNodeVectorMath'))
+  remainder = add_math('SUBTRACT', add_math('SUBTRACT', 1, fraction[0]), fraction[1])
+  is_lower = add_math('GREATER_THAN', remainder, 0)
+
+  # Corner offsets and weights of the lower triangle, then of the upper triangle
+  lower_offsets = [(0, 0, 0), (0, 1, 0), (1, 0, 0)]
+  upper_offsets = [(1, 1, 0), (1, 0, 0), (0, 1, 0)]
+  lower_weights = [remainder, fraction[1], fraction[0]]
+  upper_weights = [
+    add_math('MULTIPLY', remainder, -1),
+    add_math('SUBTRACT', 1, fraction[1]),
+    add_math('SUBTRACT', 1, fraction[0])
+  ]
+  offset_difference = [lower - upper for lower, upper in zip(lower_offsets[corner], upper_offsets[corner])]
+  scaled_difference = add_math('SCALE', offset_difference, None, 'ShaderNodeVectorMath')
+  links.new(is_lower, scaled_difference.node.inputs['Scale'])
+  skewed_corner = add_math('ADD', base, add_math('ADD', scaled_difference, upper_offsets[corner], 'ShaderNodeVectorMath'), 'ShaderNodeVectorMath')
+  weight = add_math('ADD', upper_weights[corner], add_math('MULTIPLY', add_math('SUBTRACT', lower_weights[corner], upper_weights[corner]), is_lower))
+
+  corner_values = separate(skewed_corner)
+  corner_position = combine(
+    add_math('ADD', corner_values[0], add_math('MULTIPLY', corner_values[1], 0.5)),
+    add_math('MULTIPLY', corner_values[1], sqrt(3) / 2)
+  )
+  inverse_scale = add_math('DIVIDE', 1, input_node.outputs['Scale'])
+  scaled_corner = add_math('SCALE', corner_position, None, 'ShaderNodeVectorMath')
+  links.new(inverse_scale, scaled_corner.node.inputs['Scale'])
+
+  white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+  white_noise.noise_dimensions = '3D'
+  white_noise.location = [column[0], -450]
+  links.new(skewed_corner, white_noise.inputs['Vector'])
+
+  links.new(weight, output_node.inputs['Distance'])
+  links.new(white_noise.outputs['Color'], output_node.inputs['Color'])
+  links.new(scaled_corner, output_node.inputs['Position'])
+  return node_tree
+
+
+def get_shared_cells_tree():
+  # Reuses the closest cell found by another layer. Each layer hashes its own random color and a small offset of the
+  # feature point from the shared cell color, so no cell search is needed.
+  name = node_tree_names['shared_cells']
+  if name in bpy.data.node_groups:
+    return bpy.data.node_groups[name]
+  node_tree, input_node, output_node = create_cells_tree(name)
+  create_socket(node_tree, 'INPUT', 'NodeSocketColor', 'Cell Color')
+  create_socket(node_tree, 'INPUT', 'NodeSocketVector', 'Cell Position')
+  create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Layer')
+  nodes = node_tree.nodes
+  links = node_tree.links
+  column = [-800]
+
+  def add_math(operation, a, b=None, node_type='ShaderNodeMath'):
+    column[0] += 175
+    return add_math_node(node_tree, node_type, operation, [a, b], [column[0], 0])
+
+  def add_layer_hash(offset):
+    white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+    white_noise.noise_dimensions = '4D'
+    white_noise.location = [column[0], -300]
+    links.new(input_node.outputs['Cell Color'], white_noise.inputs['Vector'])
+    links.new(add_math('ADD', input_node.outputs['Layer'], offset), white_noise.inputs['W'])
+    return white_noise.outputs['Color']
+
+  # Offsets stay within a quarter of a cell so that the textures do not drift far from the cell they belong to
+  jitter = add_math('MULTIPLY', add_math('SUBTRACT', add_layer_hash(0.5), (0.5, 0.5, 0.5), 'ShaderNodeVectorMath'), (0.5, 0.5, 0), 'ShaderNodeVectorMath')
+  jitter_range = add_math('DIVIDE', input_node.outputs['Randomness'], add_math('MAXIMUM', input_node.outputs['Scale'], 0.001))
+  scaled_jitter = add_math('SCALE', jitter, None, 'ShaderNodeVectorMath')
+  links.new(jitter_range, scaled_jitter.node.inputs['Scale'])
+  position = add_math('ADD', input_node.outputs['Cell Position'], scaled_jitter, 'ShaderNodeVectorMath')
+  distance = add_math('MULTIPLY', add_math('DISTANCE', input_node.outputs['Vector'], position, 'ShaderNodeVectorMath'), input_node.outputs['Scale'])
+
+  links.new(distance, output_node.inputs['Distance'])
+  links.new(add_layer_hash(0), output_node.inputs['Color'])
+  links.new(position, output_node.inputs['Position'])
+  return node_tree
+
+
+def get_periodic_cells_tree(feature='F1'):
+  # Voronoi cells that repeat every Period units of the input vector. The cell IDs are wrapped before hashing, so the
+  # cells on one side of the period have the same random values as the cells on the other side. Scale is rounded to fit
+  # a whole number of cells in the period. The 3x3 neighborhood search is built out of math nodes, so this is only meant for baking.
+  name = node_tree_names['periodic_cells'] + '_' + feature.lower()
+  if name in bpy.data.node_groups:
+    return bpy.data.node_groups[name]
+  node_tree, input_node, output_node = create_cells_tree(name)
+  create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Period').default_value = 1
+  nodes = node_tree.nodes
+  links = node_tree.links
+  column = [-800]
+
+  def add_math(operation, a, b=None, c=None, node_type='ShaderNodeMath'):
+    column[0] += 175
+    return add_math_node(node_tree, node_type, operation, [a, b, c], [column[0], 0])
+
+  def add_vector_math(operation, a, b=None, c=None):
+    return add_math(operation, a, b, c, 'ShaderNodeVectorMath')
+
+  def add_white_noise(vector):
+    white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+    white_noise.noise_dimensions = '3D'
+    white_noise.location = [column[0], -300]
+    links.new(vector, white_noise.inputs['Vector'])
+    return white_noise.outputs['Color']
+
+  def select(condition, a, b, operation_type='ShaderNodeMath'):
+    # a where the condition is 1, b where it is 0
+    return add_math('MULTIPLY_ADD', add_math('SUBTRACT', a, b, None, operation_type), condition, b, operation_type)
+
+  period = add_math('MAXIMUM', input_node.outputs['Period'], 0.001)
+  cell_count = add_math('MAXIMUM', add_math('ROUND', add_math('MULTIPLY', period, input_node.outputs['Scale'])), 1)
+  scale = add_math('DIVIDE', cell_count, period)
+  scaled_position = add_vector_math('SCALE', input_node.outputs['Vector'])
+  links.new(scale, scaled_position.node.inputs['Scale'])
+  position = add_vector_math('MULTIPLY', scaled_position, (1, 1, 0))
+  cell = add_vector_math('FLOOR', position)
+  period_cells = nodes.new('ShaderNodeCombineXYZ')
+  period_cells.location = [column[0], -450]
+  links.new(cell_count, period_cells.inputs[0])
+  links.new(cell_count, period_cells.inputs[1])
+  period_cells.inputs[2].default_value = 1
+  jitter_scale = add_vector_math('MULTIPLY', (1, 1, 0), (1, 1, 0))
+  links.new(input_node.outputs['Randomness'], jitter_scale.node.inputs[0])
+
+  closest = []
+  for offset in [(x, y, 0) for y in [-1, 0, 1] for x in [-1, 0, 1]]:
+    neighbor = add_vector_math('ADD', cell, offset)
+    wrapped = add_vector_math('SUBTRACT', neighbor, add_vector_math('MULTIPLY', add_vector_math('FLOOR', add_vector_math('DIVIDE', neighbor, period_cells.outputs[0])), period_cells.outputs[0]))
+    feature_position = add_vector_math('MULTIPLY_ADD', add_white_noise(add_vector_math('ADD', wrapped, (17.3, 5.1, 0))), jitter_scale, neighbor)
+    candidate = [add_vector_math('DISTANCE', position, feature_position), add_white_noise(wrapped), feature_position]
+    if not closest:
+      closest = [candidate, [100, (0, 0, 0), (0, 0, 0)]] if feature == 'F2' else [candidate]
+      continue
+    is_closest = add_math('LESS_THAN', candidate[0], closest[0][0])
+    if feature == 'F2':
+      is_second = add_math('LESS_THAN', candidate[0], closest[1][0])
+      closest[1] = [
+        select(is_closest, closest[0][0], select(is_second, candidate[0], closest[1][0])),
+        select(is_closest, closest[0][1], select(is_second, candidate[1], closest[1][1], 'ShaderNodeVectorMath'), 'ShaderNodeVectorMath'),
+        select(is_closest, closest[0][2], select(is_second, candidate[2], closest[1][2], 'ShaderNodeVectorMath'), 'ShaderNodeVectorMath')
+      ]
+    closest[0] = [
+      add_math('MINIMUM', candidate[0], closest[0][0]),
+      select(is_closest, candidate[1], closest[0][1], 'ShaderNodeVectorMath'),
+      select(is_closest, candidate[2], closest[0][2], 'ShaderNodeVectorMath')
+    ]
+
+  distance, color, feature_position = closest[-1]
+  links.new(distance, output_node.inputs['Distance'])
+  links.new(color, output_node.inputs['Color'])
+  position_output = add_vector_math('SCALE', feature_position)
+  links.new(add_math('DIVIDE', 1, scale), position_output.node.inputs['Scale'])
+  links.new(position_output, output_node.inputs['Position'])
+  return node_tree
+
+
+def replace_voronoi(node_tree, cells_tree, cells_name='Voronoi Texture'):
+  # Swaps the Voronoi Texture of a coordinates tree for another cell tree, keeping every link
+  nodes = node_tree.nodes
+  links = node_tree.links
+  voronoi = nodes[cells_name]
+  cells = nodes.new('ShaderNodeGroup')
+  cells.node_tree = cells_tree
+  cells.location = voronoi.location
+  cells.label = 'Cells'
+  for input_name in ['Vector', 'Scale', 'Randomness']:
+    if voronoi.inputs[input_name].links:
+      links.new(voronoi.inputs[input_name].links[0].from_socket, cells.inputs[input_name])
+    elif input_name != 'Vector':
+      cells.inputs[input_name].default_value = voronoi.inputs[input_name].default_value
+  for output in voronoi.outputs:
+    if output.name in cells.outputs:
+      for link in output.links:
+        links.new(cells.outputs[output.name], link.to_socket)
+  nodes.remove(voronoi)
+  cells.name = 'Cells'
+  return cells
+
+
+def use_grid_cells(node_tree, shape):
+  return replace_voronoi(node_tree, get_grid_cells_tree(shape))
@@ -24,7 +24,7 @@ along with this program; if not, see <https://www.gnu.org/licenses/>.
 
 import bpy
 
-from . import voronoi_scattering, unscatter, noise_blending, randomize_color, triplanar_mapping, label_socket, bake, clear_bake, denoise_image
+from . import voronoi_scattering, unscatter, noise_blending, randomize_color, triplanar_mapping, label_socket, bake, clear_bake, denoise_image, wang_tiles, flatten_tile, shader_lod
 
 class NODE_MT_scattershot(bpy.types.Menu):
     bl_label = 'Scattershot'
@@ -33,7 +33,11 @@ class NODE_MT_scattershot(bpy.types.Menu):
     def draw(self, context):
         self.layout.operator(voronoi_scattering.NODE_OT_scatter.bl_idname)
         self.layout.operator(bake.NODE_OT_bake_scatter.bl_idname)
+        self.layout.operator(bake.NODE_OT_bake_scatter.bl_idname, text='Bake All Scatters').scope = 'objects'
         self.layout.operator(clear_bake.NODE_OT_clear_baked_scatter.bl_idname)
+        self.layout.operator(wang_tiles.NODE_OT_bake_wang_tiles.bl_idname)
+        self.layout.operator(flatten_tile.NODE_OT_flatten_tile.bl_idname)
+        self.layout.operator(shader_lod.NODE_OT_bake_far_field.bl_idname)
         self.layout.operator(unscatter.NODE_OT_unscatter.bl_idname)
         self.layout.operator(noise_blending.NODE_OT_noise_blend.bl_idname)
         self.layout.operator(randomize_color.NODE_OT_randomize_col.bl_idname)
@@ -59,6 +63,9 @@ def register():
     bake.register()
     clear_bake.register()
     denoise_image.register()
+    wang_tiles.register()
+    flatten_tile.register()
+    shader_lod.register()
     bpy.utils.register_class(NODE_MT_scattershot)
     bpy.types.NODE_MT_context_menu.append(draw_context_menu)
     bpy.types.NODE_MT_node.prepend(draw_node_menu)
@@ -73,6 +80,9 @@ def unregister():
     bake.unregister()
     clear_bake.unregister()
     denoise_image.unregister()
+    wang_tiles.unregister()
+    flatten_tile.unregister()
+    shader_lod.unregister()
     bpy.utils.unregister_class(NODE_MT_scattershot)
     bpy.types.NODE_MT_context_menu.remove(draw_context_menu)
     bpy.types.NODE_MT_node.remove(draw_node_menu)
\ No newline at end of file
@@ -0,0 +1,321 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+from .defaults import data_channels
+
+# The whole scatter as one Open Shading Language shader. Tokens in capitals are filled in for each scatter.
+osl_template = '''
+#include "stdosl.h"
+
+color randomize_hsv(color col, vector random, float hue, float saturation, float value)
+{
+  color hsv = transformc("rgb", "hsv", col);
+  hsv[0] = mod(hsv[0] + hue * (random[0] - 0.5), 1.0);
+  hsv[1] = clamp(hsv[1] * (1.0 + saturation * (random[1] * 2.0 - 1.0)), 0.0, 1.0);
+  hsv[2] = hsv[2] * max(1.0 + value * (random[2] * 2.0 - 1.0), 0.0);
+  return transformc("hsv", "rgb", hsv);
+}
+
+color rotate_normal(color col, float angle)
+{
+  float x = col[0] * 2.0 - 1.0;
+  float y = col[1] * 2.0 - 1.0;
+  return color((x * cos(angle) - y * sin(angle)) * 0.5 + 0.5, (x * sin(angle) + y * cos(angle)) * 0.5 + 0.5, col[2]);
+}
+
+shader scattershot_scatter(
+  point Vector = point(0, 0, 0),
+  int Tri_Planar = 0,
+  float Scale = 5.0,
+  float Cell_Randomness = 1.0,
+  float Texture_Scale = 1.0,
+  float Random_Texture_Scale = 0.25,
+  float Texture_Rotation = 0.0,
+  float Random_Texture_Rotation = 1.0,
+  float Random_Texture_Location = 0.0,
+  float Density = 1.0,
+  float Alpha_Clip = 0.0,
+  float Random_Hue = 0.0,
+  float Random_Saturation = 0.0,
+  float Random_Value = 0.0,
+  float Seed = 0.0,
+PARAMETERS
+  output color Random_Color = 0
+)
+{
+IMAGES
+  point position = Vector;
+  vector tangent = normalize(dPdu);
+  vector bitangent = cross(N, tangent);
+  if (Tri_Planar) {
+    point object_position = transform("object", P);
+    vector axes = abs(normalize(transform("object", N)));
+    if (axes[0] >= axes[1] && axes[0] >= axes[2]) {
+      position = point(object_position[1], object_position[2], 0);
+      tangent = vector(0, 1, 0);
+      bitangent = vector(0, 0, 1);
+    }
+    else if (axes[1] >= axes[2]) {
+      position = point(object_position[0], object_position[2], 0);
+      tangent = vector(1, 0, 0);
+      bitangent = vector(0, 0, 1);
+    }
+    else {
+      position = point(object_position[0], object_position[1], 0);
+      tangent = vector(1, 0, 0);
+      bitangent = vector(0, 1, 0);
+    }
+    tangent = normalize(transform("object", "common", tangent));
+    bitangent = normalize(transform("object", "common", bitangent));
+  }
+  else {
+    // The same tangent frame as the Normal Map node uses for the active UV map
+    vector uv_tangent = 0;
+    float tangent_sign = 1;
+    if (getattribute("geom:tangent", uv_tangent) && getattribute("geom:tangent_sign", tangent_sign)) {
+      tangent = normalize(transform("object", "common", uv_tangent));
+      bitangent = tangent_sign * cross(N, tangent);
+    }
+  }
+  point p = position * Scale;
+  point cell = point(floor(p[0]), floor(p[1]), Seed);
+
+  // A texture can only reach as far as its rotated corner plus its offset, so only those neighbors are searched
+  float reach_distance = 0.5 * Cell_Randomness + 0.5 * Random_Texture_Location + M_SQRT2 * 0.5 * Texture_Scale * (1.0 + Random_Texture_Scale);
+  int reach = OVERLAP ? min((int)ceil(reach_distance), MAX_REACH) : 1;
+
+  int count = 0;
+  float priorities[CELL_COUNT];
+  point uvs[CELL_COUNT];
+  float angles[CELL_COUNT];
+  color randoms[CELL_COUNT];
+  float closest = 1e10;
+  for (int x = -reach; x <= reach; x++) {
+    for (int y = -reach; y <= reach; y++) {
+      point c = cell + vector(x, y, 0);
+      vector jitter = noise("cell", c);
+      vector shape = noise("cell", c + vector(0, 0, 1000));
+      color random = noise("cell", c + vector(0, 0, 2000));
+      point feature = point(c[0] + 0.5 + (jitter[0] - 0.5) * Cell_Randomness, c[1] + 0.5 + (jitter[1] - 0.5) * Cell_Randomness, 0);
+      float cell_distance = hypot(p[0] - feature[0], p[1] - feature[1]);
+      if (!OVERLAP && cell_distance >= closest)
+        continue;
+      // The closest cell is found before the Density test, so a culled closest cell leaves the background like the node backend
+      if (OVERLAP && jitter[2] >= Density)
+        continue;
+      float angle = M_2PI * (Texture_Rotation + Random_Texture_Rotation * (shape[0] - 0.5));
+      float size = max(Texture_Scale * (1.0 + Random_Texture_Scale * (shape[1] * 2.0 - 1.0)), 1e-4);
+      float local_x = p[0] - feature[0] - Random_Texture_Location * (shape[2] - 0.5);
+      float local_y = p[1] - feature[1] - Random_Texture_Location * (random[0] - 0.5);
+      point uv = point(
+        (local_x * cos(angle) + local_y * sin(angle)) / size + 0.5,
+        (local_y * cos(angle) - local_x * sin(angle)) / size + 0.5,
+        0
+      );
+      if (OVERLAP) {
+        if (uv[0] < 0 || uv[0] > 1 || uv[1] < 0 || uv[1] > 1)
+          continue;
+        // Insertion sort so that cells are composited from the lowest priority to the highest
+        float priority = jitter[2] + shape[2];
+        int idx = count;
+        while (idx > 0 && priorities[idx - 1] > priority) {
+          priorities[idx] = priorities[idx - 1];
+          uvs[idx] = uvs[idx - 1];
+          angles[idx] = angles[idx - 1];
+          randoms[idx] = randoms[idx - 1];
+          idx--;
+        }
+        priorities[idx] = priority;
+        uvs[idx] = uv;
+        angles[idx] = angle;
+        randoms[idx] = random;
+        count++;
+      }
+      else {
+        closest = cell_distance;
+        priorities[0] = jitter[2];
+        uvs[0] = uv;
+        angles[0] = angle;
+        randoms[0] = random;
+        count = 1;
+      }
+    }
+  }
+  if (!OVERLAP && count && priorities[0] >= Density)
+    count = 0;
+
+  for (int idx = 0; idx < count; idx++) {
+    point uv = uvs[idx];
+    float angle = angles[idx];
+    color random = randoms[idx];
+    Random_Color = random;
+    float alpha = 1;
+LOOKUPS
+  }
+NORMALS
+}
+'''
+
+
+def get_image_path(image):
+  # OSL reads images from disk, so packed and generated images can not be used
+  if image.packed_file or image.source != 'FILE' or not image.filepath:
+    return None
+  return bpy.path.abspath(image.filepath, library=image.library).replace('\\', '/')
+
+
+def get_osl_name(channel):
+  return channel.replace(' ', '_')
+
+
+def create_osl_source(self, sorted_textures):
+  overlap = self.layering in ['simple_alpha', 'layered', 'overlapping']
+  wrap = '"black"' if overlap else '"periodic"'
+  parameters = []
+  images = []
+  lookups = []
+  normals = []
+
+  if self.layering == 'coordinates':
+    parameters.append('  output point Scattered_Vector = 0,')
+    lookups.append('    Scattered_Vector = uv;')
+  else:
+    # The alpha of each cell comes from the Alpha channel if there is one, otherwise from the alpha of the first image
+    alpha_channel = 'Alpha' if 'Alpha' in sorted_textures else list(sorted_textures.keys())[0]
+    for channel in sorted_textures:
+      name = get_osl_name(channel)
+      if channel in data_channels:
+        parameters.append('  float %s_Background = 0,' % name)
+        parameters.append('  output float %s = %s_Background,' % (name, name))
+      elif channel == 'Normal':
+        # Normal maps are mixed in tangent space and only turned into a shading normal after the loop
+        parameters.append('  color Normal_Background = color(0.5, 0.5, 1),')
+        parameters.append('  float Normal_Strength = 1.0,')
+        parameters.append('  output normal Normal = N,')
+        images.append('  color Normal_tangent = Normal_Background;')
+        normals.append('  vector Normal_vector = vector(Normal_tangent[0], Normal_tangent[1], Normal_tangent[2]) * 2 - 1;')
+        normals.append('  Normal = normalize(Normal_vector[0] * tangent + Normal_vector[1] * bitangent + Normal_vector[2] * N);')
+        normals.append('  Normal = normalize(N + (Normal - N) * max(Normal_Strength, 0.0));')
+      else:
+        parameters.append('  color %s_Background = color(0),' % name)
+        parameters.append('  output color %s = %s_Background,' % (name, name))
+
+    channels = [alpha_channel] + [x for x in sorted_textures if x != alpha_channel]
+    for channel in channels:
+      name = get_osl_name(channel)
+      paths = ', '.join(['"%s"' % get_image_path(x.image) for x in sorted_textures[channel]])
+      images.append('  string %s_images[%d] = {%s};' % (name, len(sorted_textures[channel]), paths))
+      index = 'min((int)floor(random[1] * %d), %d)' % (len(sorted_textures[channel]), len(sorted_textures[channel]) - 1)
+      lookup = 'texture(%s_images[%s], uv[0], 1 - uv[1], "wrap", %s' % (name, index, wrap)
+      if channel in data_channels:
+        sample = 'float %s_sample = %s);' % (name, lookup)
+        # Overlapping alpha channels show where any cell is, not just the top one
+        result = '1.0' if channel == 'Alpha' and overlap else '%s_sample' % name
+      else:
+        if channel == alpha_channel:
+          sample = 'color %s_sample = %s, "alpha", alpha);' % (name, lookup)
+        else:
+          sample = 'color %s_sample = %s);' % (name, lookup)
+        result = '%s_sample' % name
+        if channel == 'Normal':
+          # Rotate the tangent space normal along with the texture
+          result = 'rotate_normal(%s, angle)' % result
+        else:
+          result = 'randomize_hsv(%s, random, Random_Hue, Random_Saturation, Random_Value)' % result
+      lookups.append('    ' + sample)
+      if channel == alpha_channel:
+        if channel == 'Alpha':
+          lookups.append('    alpha = Alpha_sample;')
+        if overlap:
+          lookups.append('    alpha = alpha > Alpha_Clip ? alpha : 0;')
+        else:
+          lookups.append('    alpha = 1;')
+      target = 'Normal_tangent' if channel == 'Normal' else name
+      lookups.append('    %s = mix(%s, %s, alpha);' % (target, target, result))
+
+  max_reach = 3
+  cell_count = (max_reach * 2 + 1) ** 2 if overlap else 1
+  # Image paths go in last so that a file name can never be mistaken for a token
+  return (osl_template
+    .replace('OVERLAP', '1' if overlap else '0')
+    .replace('MAX_REACH', str(max_reach))
+    .replace('CELL_COUNT', str(cell_count))
+    .replace('PARAMETERS', '\n'.join(parameters))
+    .replace('LOOKUPS', '\n'.join(lookups))
+    .replace('NORMALS', '\n'.join(normals))
+    .replace('IMAGES', '\n'.join(images))
+  )
+
+
+def create_osl_scatter_node(self, context, selected_nodes, sorted_textures):
+  nodes = selected_nodes[0].id_data.nodes
+  links = selected_nodes[0].id_data.links
+  textures = [x for x in selected_nodes if x.type == 'TEX_IMAGE' and x.image]
+
+  if context.scene.render.engine != 'CYCLES':
+    self.report({'ERROR'}, 'The OSL backend only works in Cycles')
+    return None
+  if self.layering in ['blended', 'hex_tiling']:
+    method = 'Interspersed with Cell Blending' if self.layering == 'blended' else 'Hex Tiling'
+    self.report({'ERROR'}, 'The OSL backend does not support %s. Please use the Nodes backend' % method)
+    return None
+  unsaved_images = [x.image.name for x in textures if not get_image_path(x.image)]
+  if unsaved_images:
+    self.report({'ERROR'}, 'The OSL backend can only use saved image files. Please save or unpack: %s' % ', '.join(unsaved_images))
+    return None
+  if not context.scene.cycles.shading_system:
+    context.scene.cycles.shading_system = True
+    self.report({'INFO'}, 'Open Shading Language has been enabled in the render settings')
+
+  # Scatters with the same script share one text, and texts left over from removed scatters are rewritten
+  source = create_osl_source(self, sorted_textures)
+  scripts = [x for x in bpy.data.texts if x.name.startswith('Scattershot OSL')]
+  script = next((x for x in scripts if x.as_string() == source), None)
+  if not script:
+    script = next((x for x in scripts if not x.users), None) or bpy.data.texts.new('Scattershot OSL')
+    script.from_string(source)
+  # Cycles compiles the script and creates its sockets as soon as it is assigned
+  scatter_node = nodes.new('ShaderNodeScript')
+  scatter_node.mode = 'INTERNAL'
+  scatter_node.script = script
+  scatter_node.label = 'Scatter OSL'
+  scatter_node.width = 250
+  scatter_node.location = [
+    sum([x.location[0] for x in textures]) / len(textures),
+    sum([x.location[1] for x in textures]) / len(textures) + 150
+  ]
+
+  if 'Tri_Planar' in scatter_node.inputs:
+    if self.projection_method == 'tri-planar':
+      scatter_node.inputs['Tri_Planar'].default_value = 1
+    else:
+      uv_node = nodes.new('ShaderNodeUVMap')
+      uv_node.location = [scatter_node.location[0] - 250, scatter_node.location[1]]
+      links.new(uv_node.outputs[0], scatter_node.inputs['Vector'])
+
+  if self.layering == 'coordinates' and 'Scattered_Vector' in scatter_node.outputs:
+    scatter_node.location[0] = min([x.location[0] for x in textures]) - 350
+    for texture in textures:
+      links.new(scatter_node.outputs['Scattered_Vector'], texture.inputs['Vector'])
+  return scatter_node
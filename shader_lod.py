@@ -0,0 +1,434 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+import numpy as np
+from .defaults import data_channels, packed_channels_property
+from .utilities.node_interface import create_socket, get_socket
+from .utilities.utilities import copy_node, get_active_scatter_node, get_node_scatter_sources, get_node_tree_material, is_shader, mode_toggle
+from .utilities.image_processing import get_image_pixels, srgb_to_linear, get_luminance
+from .flatten_tile import bake_tile, get_tile_channels, get_tile_error
+
+# Every node added for a simplified branch is labeled with this prefix so that re-scattering can remove it
+lod_label = 'LOD'
+far_field_size = 256
+far_field_samples = 4
+
+
+def get_linear_pixels(image, component=None):
+  pixels = get_image_pixels(image)
+  if not image.is_float and image.colorspace_settings.name == 'sRGB':
+    pixels = srgb_to_linear(pixels)
+  if component is not None:
+    pixels = pixels.copy()
+    pixels[..., :3] = pixels[..., component:component + 1]
+  return pixels
+
+
+def get_scatter_channel_images(scatter_node):
+  # The images of each channel with the component that holds it, which is None unless several channels are packed together
+  channel_images = {}
+  for scatter_source in get_node_scatter_sources(scatter_node):
+    packed_channels = scatter_source.node_tree.get(packed_channels_property)
+    if packed_channels:
+      channels = [(channel, component) for component, channel in enumerate(packed_channels)]
+    else:
+      # Overlapping scatter sources keep their original output name and always output the image channel
+      channel = scatter_source.outputs[0].name
+      if channel not in scatter_node.outputs:
+        channel = 'Image'
+      channels = [(channel, None)]
+    for channel, component in channels:
+      images = channel_images.setdefault(channel, [])
+      for node in scatter_source.node_tree.nodes:
+        if node.type == 'TEX_IMAGE' and node.image and (node.image, component) not in images:
+          images.append((node.image, component))
+  return channel_images
+
+
+def get_channel_averages(scatter_node):
+  # The alpha premultiplied mean of every image in each channel, so transparent areas show the background
+  averages = {}
+  for channel, images in get_scatter_channel_images(scatter_node).items():
+    means = []
+    for image, component in images:
+      pixels = get_linear_pixels(image, component).reshape(-1, 4)
+      means.append(np.append((pixels[:, :3] * pixels[:, 3:]).mean(axis=0), pixels[:, 3].mean()))
+    averages[channel] = np.mean(means, axis=0)
+  return averages
+
+
+def get_average_value(scatter_node, channel, average, socket):
+  is_transparent = 'Transparency' in scatter_node.inputs
+  if is_transparent:
+    background_input = scatter_node.inputs.get('Background' if channel == 'Image' else channel)
+    background = background_input.default_value if background_input else socket.default_value
+    if not hasattr(background, '__len__'):
+      background = [background] * 3
+    color = average[:3] + np.array(background[:3]) * (1 - average[3])
+  else:
+    color = average[:3] / max(average[3], 1e-6)
+  if socket.type == 'VALUE':
+    return float(get_luminance(color))
+  return [*color, 1]
+
+
+def depends_on(node, source, visited=None):
+  if visited is None:
+    visited = []
+  if node == source:
+    return True
+  if node in visited:
+    return False
+  visited.append(node)
+  return any(depends_on(link.from_node, source, visited) for input in node.inputs for link in input.links)
+
+
+def get_scatter_shaders(scatter_node):
+  node_tree = scatter_node.id_data
+  return [x for x in node_tree.nodes if is_shader(x) and not x.label.startswith(lod_label) and depends_on(x, scatter_node)]
+
+
+def link_simplified_input(scatter_node, input, simple_input, averages, channel_sockets, copies):
+  # Scatter outputs become the cheaper socket of their channel or its average, and nodes in between are copied
+  node_tree = scatter_node.id_data
+  link = input.links[0]
+  if link.from_node == scatter_node:
+    channel = link.from_socket.name
+    if channel in channel_sockets:
+      node_tree.links.new(channel_sockets[channel], simple_input)
+    elif channel in averages and channel != 'Normal' and hasattr(input, 'default_value'):
+      simple_input.default_value = get_average_value(scatter_node, channel, averages[channel], input)
+  elif depends_on(link.from_node, scatter_node):
+    node_tree.links.new(copy_scatter_branch(scatter_node, link.from_socket, averages, channel_sockets, copies), simple_input)
+  else:
+    node_tree.links.new(link.from_socket, simple_input)
+
+
+def copy_scatter_branch(scatter_node, socket, averages, channel_sockets, copies):
+  # Nodes like Normal Map or Color Ramp between the scatter node and the shader are evaluated again from the simplified channels
+  node = socket.node
+  copy = next((x[1] for x in copies if x[0] == node), None)
+  if not copy:
+    copy = copy_node(scatter_node.id_data.nodes, node)
+    copy.label = f"{lod_label} {node.label or node.name}"
+    copy.location = [node.location[0], node.location[1] - 700]
+    copy.hide = True
+    copies.append((node, copy))
+    for input, copy_input in zip(node.inputs, copy.inputs):
+      if input.links:
+        link_simplified_input(scatter_node, input, copy_input, averages, channel_sockets, copies)
+  return copy.outputs[list(node.outputs).index(socket)]
+
+
+def create_simplified_shader(scatter_node, shader, averages, name, channel_sockets=None):
+  # A copy of the shader with each scattered input replaced by the channel average or a cheaper socket
+  if channel_sockets is None:
+    channel_sockets = {}
+  node_tree = shader.id_data
+  simple_shader = node_tree.nodes.new(shader.bl_idname)
+  simple_shader.name = f"{shader.name} {name}"
+  simple_shader.label = f"{lod_label} {name}"
+  simple_shader.location = [shader.location[0], shader.location[1] - 700]
+  simple_shader.hide = True
+  for prop in shader.bl_rna.properties:
+    if prop.type == 'ENUM' and not prop.is_readonly:
+      setattr(simple_shader, prop.identifier, getattr(shader, prop.identifier))
+
+  copies = []
+  for input, simple_input in zip(shader.inputs, simple_shader.inputs):
+    if hasattr(input, 'default_value'):
+      simple_input.default_value = input.default_value
+    if input.links:
+      link_simplified_input(scatter_node, input, simple_input, averages, channel_sockets, copies)
+  return simple_shader
+
+
+def insert_shader_switch(shader, simple_socket, factor_socket, name):
+  # Cycles skips every node that only feeds a Mix Shader input with no weight
+  node_tree = shader.id_data
+  mix = node_tree.nodes.new('ShaderNodeMixShader')
+  mix.name = f"{shader.name} {name} Switch"
+  mix.label = f"{lod_label} {name}"
+  mix.location = [shader.location[0] + 300, shader.location[1] + 100]
+  for link in list(shader.outputs[0].links):
+    node_tree.links.new(mix.outputs[0], link.to_socket)
+  node_tree.links.new(factor_socket, mix.inputs[0])
+  node_tree.links.new(simple_socket, mix.inputs[1])
+  node_tree.links.new(shader.outputs[0], mix.inputs[2])
+  return mix
+
+
+def remove_lod_nodes(node, nodes):
+  for input in node.inputs:
+    for link in input.links:
+      if link.from_node.label.startswith(lod_label):
+        remove_lod_nodes(link.from_node, nodes)
+  if node.label.startswith(lod_label) and node.name in nodes:
+    nodes.remove(node)
+
+
+def remove_shader_switches(shader):
+  node_tree = shader.id_data
+  while True:
+    switches = [x.to_node for x in shader.outputs[0].links if x.to_node.label.startswith(lod_label)]
+    if not switches:
+      return
+    switch = switches[0]
+    for link in list(switch.outputs[0].links):
+      node_tree.links.new(shader.outputs[0], link.to_socket)
+    for input in switch.inputs[1:]:
+      for link in input.links:
+        if link.from_node != shader:
+          remove_lod_nodes(link.from_node, node_tree.nodes)
+    node_tree.nodes.remove(switch)
+
+
+def clear_shader_lods(scatter_node):
+  # Switches left over from a previous scatter would otherwise lose their factor inputs
+  for shader in get_scatter_shaders(scatter_node):
+    remove_shader_switches(shader)
+
+
+def get_light_path(node_tree):
+  light_path = node_tree.nodes.get('Scattershot Light Path')
+  if not light_path:
+    light_path = node_tree.nodes.new('ShaderNodeLightPath')
+    light_path.name = 'Scattershot Light Path'
+    light_path.label = f"{lod_label} Light Path"
+  return light_path
+
+
+def add_light_path_switch(scatter_node):
+  # Only camera rays evaluate the full scatter. Bounces and shadows use the average of each channel.
+  averages = get_channel_averages(scatter_node)
+  for shader in get_scatter_shaders(scatter_node):
+    light_path = get_light_path(shader.id_data)
+    light_path.location = [shader.location[0], shader.location[1] + 300]
+    simple_shader = create_simplified_shader(scatter_node, shader, averages, 'Indirect')
+    insert_shader_switch(shader, simple_shader.outputs[0], light_path.outputs['Is Camera Ray'], 'Indirect')
+
+
+def get_far_field_image_names(scatter_node):
+  return {x.name: f"{scatter_node.node_tree.name} {x.name} Far Field" for x in get_tile_channels(scatter_node) if x.name != 'Normal'}
+
+
+def get_far_field_images(scatter_node):
+  # Far field images are only made by Bake Far Field, so scattering again reuses whatever was baked before
+  image_names = get_far_field_image_names(scatter_node)
+  return {channel: bpy.data.images[name] for channel, name in image_names.items() if name in bpy.data.images}
+
+
+def bake_far_field_images(context, scatter_node, resolution, samples):
+  # A small seamless tile of the scatter result per channel, for when cells are smaller than a pixel.
+  # Existing images are updated in place so that the nodes using them do not change.
+  image_names = get_far_field_image_names(scatter_node)
+  outputs = [x for x in get_tile_channels(scatter_node) if x.name in image_names]
+  baked_images = bake_tile(context, scatter_node, outputs, resolution, samples, {x: f"{name} Temp" for x, name in image_names.items()})
+  far_field_images = {}
+  for channel, baked_image in baked_images.items():
+    image = bpy.data.images.get(image_names[channel])
+    if image and tuple(image.size) == tuple(baked_image.size):
+      image.pixels.foreach_set(get_image_pixels(baked_image).ravel())
+      image.colorspace_settings.name = baked_image.colorspace_settings.name
+      bpy.data.images.remove(baked_image)
+    else:
+      if image:
+        bpy.data.images.remove(image)
+      image = baked_image
+      image.name = image_names[channel]
+    image.pack()
+    far_field_images[channel] = image
+  return far_field_images
+
+
+def get_far_field_averages(scatter_node, far_field_images):
+  # The far field tiles are the scatter result itself, so they give a better flat color than the source images.
+  # Their background is already composited, which an alpha of one keeps as it is.
+  averages = get_channel_averages(scatter_node)
+  for channel, image in far_field_images.items():
+    pixels = get_linear_pixels(image).reshape(-1, 4)
+    averages[channel] = np.append(pixels[:, :3].mean(axis=0), 1)
+  return averages
+
+
+def add_far_field_shaders(scatter_node, shader, far_mix, far_field_images):
+  # The far field shader reads the tiles where they exist and the flat shader uses the averages everywhere
+  node_tree = scatter_node.id_data
+  for input in far_mix.inputs[1:]:
+    for link in input.links:
+      remove_lod_nodes(link.from_node, node_tree.nodes)
+  averages = get_far_field_averages(scatter_node, far_field_images)
+  channel_sockets = {}
+  for channel_idx, (channel, image) in enumerate(far_field_images.items()):
+    texture = node_tree.nodes.new('ShaderNodeTexImage')
+    texture.name = f"{shader.name} {channel} Far Field"
+    texture.label = f"{lod_label} {channel}"
+    texture.image = image
+    texture.interpolation = 'Linear'
+    texture.hide = True
+    texture.location = [shader.location[0] - 300, shader.location[1] - 700 - channel_idx * 50]
+    node_tree.links.new(scatter_node.outputs['LOD Vector'], texture.inputs[0])
+    channel_sockets[channel] = texture.outputs[0]
+  far_field_shader = create_simplified_shader(scatter_node, shader, averages, 'Far Field', channel_sockets)
+  flat_shader = create_simplified_shader(scatter_node, shader, averages, 'Flat')
+  flat_shader.location[1] -= 100
+  node_tree.links.new(far_field_shader.outputs[0], far_mix.inputs[1])
+  node_tree.links.new(flat_shader.outputs[0], far_mix.inputs[2])
+
+
+def update_far_field(scatter_node, far_field_images):
+  for shader in get_scatter_shaders(scatter_node):
+    far_mix = scatter_node.id_data.nodes.get(f"{shader.name} Far Switch")
+    if far_mix:
+      add_far_field_shaders(scatter_node, shader, far_mix, far_field_images)
+
+
+def add_distance_sockets(scatter_node):
+  # The distances are inputs of the scatter node, and only the camera distance nodes feed the factor outputs
+  node_tree = scatter_node.node_tree
+  nodes = node_tree.nodes
+  links = node_tree.links
+  if get_socket(node_tree, 'OUTPUT', 'LOD Detail'):
+    return
+  for name, default in [('LOD Distance', 20), ('LOD Far Distance', 60), ('LOD Blend', 5)]:
+    socket = create_socket(node_tree, 'INPUT', 'NodeSocketFloat', name)
+    socket.default_value = default
+    socket.min_value = 0
+  for name in ['LOD Detail', 'LOD Far', 'LOD Vector']:
+    create_socket(node_tree, 'OUTPUT', 'NodeSocketVector' if name == 'LOD Vector' else 'NodeSocketFloat', name)
+
+  group_input = nodes['Group Input']
+  group_output = nodes['Group Output']
+  camera = nodes.new('ShaderNodeCameraData')
+  camera.name = 'LOD Camera'
+  camera.location = [group_output.location[0] - 600, group_output.location[1] - 600]
+
+  def add_distance_factor(distance_name, to_min, to_max, output_name, offset):
+    end_distance = nodes.new('ShaderNodeMath')
+    end_distance.operation = 'ADD'
+    end_distance.location = [camera.location[0], camera.location[1] - offset]
+    links.new(group_input.outputs[distance_name], end_distance.inputs[0])
+    links.new(group_input.outputs['LOD Blend'], end_distance.inputs[1])
+    factor = nodes.new('ShaderNodeMapRange')
+    factor.name = f"{output_name} Factor"
+    factor.location = [camera.location[0] + 300, camera.location[1] - offset]
+    links.new(camera.outputs['View Distance'], factor.inputs['Value'])
+    links.new(group_input.outputs[distance_name], factor.inputs['From Min'])
+    links.new(end_distance.outputs[0], factor.inputs['From Max'])
+    factor.inputs['To Min'].default_value = to_min
+    factor.inputs['To Max'].default_value = to_max
+    links.new(factor.outputs[0], group_output.inputs[output_name])
+
+  add_distance_factor('LOD Distance', 1, 0, 'LOD Detail', 200)
+  add_distance_factor('LOD Far Distance', 0, 1, 'LOD Far', 400)
+  # The far field tile repeats once per UV tile like the scatter pattern that it was baked from
+  if 'UVs' in nodes:
+    links.new(nodes['UVs'].outputs[0], group_output.inputs['LOD Vector'])
+  else:
+    texture_coordinates = nodes.new('ShaderNodeTexCoord')
+    texture_coordinates.location = [camera.location[0], camera.location[1] + 200]
+    links.new(texture_coordinates.outputs['UV'], group_output.inputs['LOD Vector'])
+
+
+def add_distance_lod(scatter_node):
+  # Near the camera the full scatter is used, further away a tiling far field texture, and beyond that a flat average.
+  # Until Bake Far Field has been run, the far field also uses the flat average.
+  node_tree = scatter_node.id_data
+  add_distance_sockets(scatter_node)
+  far_field_images = get_far_field_images(scatter_node)
+  for shader in get_scatter_shaders(scatter_node):
+    far_mix = node_tree.nodes.new('ShaderNodeMixShader')
+    far_mix.name = f"{shader.name} Far Switch"
+    far_mix.label = f"{lod_label} Far"
+    far_mix.location = [shader.location[0] + 300, shader.location[1] - 600]
+    node_tree.links.new(scatter_node.outputs['LOD Far'], far_mix.inputs[0])
+    add_far_field_shaders(scatter_node, shader, far_mix, far_field_images)
+    insert_shader_switch(shader, far_mix.outputs[0], scatter_node.outputs['LOD Detail'], 'Distance')
+
+
+class NODE_OT_bake_far_field(bpy.types.Operator):
+  bl_label = "Bake Far Field"
+  bl_idname = "node.bake_scatter_far_field"
+  bl_description = "Bakes a small seamless tile of the selected scatter node for its Distance LOD to show beyond the LOD Distance. Bake it again after changing the scatter"
+  bl_space_type = "NODE_EDITOR"
+  bl_region_type = "UI"
+  bl_options = {'REGISTER', 'UNDO'}
+
+  resolution: bpy.props.IntProperty(
+    name = "Resolution",
+    description = "The width and height of the far field tile in pixels",
+    default = far_field_size,
+    min = 16,
+    max = 2048
+  )
+  samples: bpy.props.IntProperty(
+    name = "Samples",
+    description = "Render samples used for baking the far field",
+    default = far_field_samples,
+    min = 1
+  )
+
+  @classmethod
+  def poll(cls, context):
+    return context.area.ui_type == 'ShaderNodeTree' and get_active_scatter_node(context)
+
+  def invoke(self, context, event):
+    return context.window_manager.invoke_props_dialog(self)
+
+  def draw(self, context):
+    layout = self.layout
+    layout.use_property_split = True
+    layout.prop(self, "resolution")
+    layout.prop(self, "samples")
+
+  def execute(self, context):
+    scatter_node = get_active_scatter_node(context)
+    if not context.active_object or context.active_object.type != 'MESH':
+      self.report({'ERROR'}, 'Select a mesh object with the scatter material to bake the far field')
+      return {'CANCELLED'}
+    if not get_socket(scatter_node.node_tree, 'OUTPUT', 'LOD Far'):
+      self.report({'ERROR'}, 'Scatter with Distance LOD turned on before baking the far field')
+      return {'CANCELLED'}
+    if not get_node_tree_material(scatter_node.id_data):
+      self.report({'ERROR'}, 'Only scatter nodes that are directly in a material can bake a far field')
+      return {'CANCELLED'}
+    tile_error = get_tile_error(scatter_node)
+    if tile_error:
+      self.report({'ERROR'}, tile_error)
+      return {'CANCELLED'}
+    # switching modes prevents context errors
+    prev_mode = mode_toggle(context, 'OBJECT')
+    try:
+      far_field_images = bake_far_field_images(context, scatter_node, self.resolution, self.samples)
+    finally:
+      mode_toggle(context, prev_mode)
+    update_far_field(scatter_node, far_field_images)
+    return {'FINISHED'}
+
+
+def register():
+  bpy.utils.register_class(NODE_OT_bake_far_field)
+
+def unregister():
+  bpy.utils.unregister_class(NODE_OT_bake_far_field)
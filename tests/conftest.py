@@ -0,0 +1,16 @@
+import os
+import sys
+import types
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The NumPy helpers only touch Blender when they are called, so outside of Blender a placeholder bpy module is enough to import them
+try:
+  import bpy
+except ImportError:
+  sys.modules['bpy'] = types.ModuleType('bpy')
+
+# Imports the add-on as a package without running its __init__, which registers the Blender classes
+package = types.ModuleType('scattershot')
+package.__path__ = [root]
+sys.modules.setdefault('scattershot', package)
@@ -0,0 +1,280 @@
+from math import floor, sin, sqrt
+from types import SimpleNamespace
+
+# A small stand in for the parts of bpy that build shader node groups, which can also evaluate the math in a node group.
+# It only knows the nodes and operations that the cell trees use.
+
+
+class Socket:
+  def __init__(self, node, name, socket_type, default_value=None):
+    self.node = node
+    self.name = name
+    self.type = socket_type
+    self.default_value = default_value
+    self.link = None
+
+  @property
+  def links(self):
+    if not self.link:
+      return []
+    return [SimpleNamespace(from_socket=self.link, from_node=self.link_node, is_muted=False)]
+
+  @property
+  def is_linked(self):
+    return self.link is not None
+
+
+class Sockets(list):
+  def __getitem__(self, key):
+    if isinstance(key, str):
+      return next(x for x in self if x.name == key)
+    return list.__getitem__(self, key)
+
+  def __contains__(self, key):
+    return any(x.name == key for x in self)
+
+
+math_inputs = [('Value', 'VALUE', 0.5), ('Value', 'VALUE', 0.5), ('Value', 'VALUE', 0.5)]
+vector_math_inputs = [('Vector', 'VECTOR', (0, 0, 0)), ('Vector', 'VECTOR', (0, 0, 0)), ('Vector', 'VECTOR', (0, 0, 0)), ('Scale', 'VALUE', 1)]
+node_sockets = {
+  'ShaderNodeMath': (math_inputs, [('Value', 'VALUE')]),
+  'ShaderNodeVectorMath': (vector_math_inputs, [('Vector', 'VECTOR'), ('Value', 'VALUE')]),
+  'ShaderNodeSeparateXYZ': ([('Vector', 'VECTOR', (0, 0, 0))], [('X', 'VALUE'), ('Y', 'VALUE'), ('Z', 'VALUE')]),
+  'ShaderNodeCombineXYZ': ([('X', 'VALUE', 0), ('Y', 'VALUE', 0), ('Z', 'VALUE', 0)], [('Vector', 'VECTOR')]),
+  'ShaderNodeTexWhiteNoise': ([('Vector', 'VECTOR', (0, 0, 0)), ('W', 'VALUE', 0)], [('Value', 'VALUE'), ('Color', 'VECTOR')]),
+  'ShaderNodeMixRGB': ([('Fac', 'VALUE', 0.5), ('Color1', 'RGBA', (0.5, 0.5, 0.5, 1)), ('Color2', 'RGBA', (0.5, 0.5, 0.5, 1))], [('Color', 'RGBA')]),
+  'ShaderNodeTexImage': ([('Vector', 'VECTOR', (0, 0, 0))], [('Color', 'RGBA'), ('Alpha', 'VALUE')]),
+  'ShaderNodeValue': ([], [('Value', 'VALUE')]),
+  'NodeReroute': ([('Input', 'RGBA', (0, 0, 0, 1))], [('Output', 'RGBA')]),
+}
+node_types = {
+  'ShaderNodeMath': 'MATH',
+  'ShaderNodeVectorMath': 'VECT_MATH',
+  'ShaderNodeSeparateXYZ': 'SEPXYZ',
+  'ShaderNodeCombineXYZ': 'COMBXYZ',
+  'ShaderNodeTexWhiteNoise': 'TEX_WHITE_NOISE',
+  'ShaderNodeMixRGB': 'MIX_RGB',
+  'ShaderNodeTexImage': 'TEX_IMAGE',
+  'ShaderNodeValue': 'VALUE',
+  'NodeReroute': 'REROUTE',
+  'NodeGroupInput': 'GROUP_INPUT',
+  'NodeGroupOutput': 'GROUP_OUTPUT',
+}
+
+
+class Node:
+  def __init__(self, node_tree, node_type):
+    self.id_data = node_tree
+    self.bl_idname = node_type
+    self.type = node_types.get(node_type, node_type)
+    self.name = node_type
+    self.location = [0, 0]
+    self.mute = False
+    self.operation = None
+    self.blend_type = 'MIX'
+    self.noise_dimensions = '3D'
+    self.use_clamp = False
+    inputs, outputs = node_sockets.get(node_type, ([], []))
+    self.inputs = Sockets(Socket(self, name, socket_type, default) for name, socket_type, default in inputs)
+    self.outputs = Sockets(Socket(self, name, socket_type) for name, socket_type in outputs)
+
+
+class GroupNode(Node):
+  # The sockets of the group input and output nodes follow the sockets of the node group
+  def __init__(self, node_tree, node_type, in_out):
+    super().__init__(node_tree, node_type)
+    self.in_out = in_out
+
+  @property
+  def sockets(self):
+    return Sockets(x for x in self.id_data.interface.sockets if x.in_out == self.in_out)
+
+
+class GroupInputNode(GroupNode):
+  def __init__(self, node_tree, node_type):
+    super().__init__(node_tree, node_type, 'INPUT')
+
+  @property
+  def outputs(self):
+    return self.sockets
+
+  @outputs.setter
+  def outputs(self, value):
+    pass
+
+
+class GroupOutputNode(GroupNode):
+  def __init__(self, node_tree, node_type):
+    super().__init__(node_tree, node_type, 'OUTPUT')
+    self.is_active_output = True
+
+  @property
+  def inputs(self):
+    return self.sockets
+
+  @inputs.setter
+  def inputs(self, value):
+    pass
+
+
+class Interface:
+  def __init__(self, node_tree):
+    self.node_tree = node_tree
+    self.sockets = []
+
+  def new_socket(self, name, in_out, socket_type):
+    socket_types = {'NodeSocketFloat': 'VALUE', 'NodeSocketVector': 'VECTOR', 'NodeSocketColor': 'VECTOR'}
+    socket = Socket(None, name, socket_types[socket_type], 0 if socket_type == 'NodeSocketFloat' else (0, 0, 0))
+    socket.in_out = in_out
+    self.sockets.append(socket)
+    return socket
+
+
+class Nodes(list):
+  def __init__(self, node_tree):
+    super().__init__()
+    self.node_tree = node_tree
+
+  def __getitem__(self, key):
+    if isinstance(key, str):
+      return next(x for x in self if x.name == key)
+    return list.__getitem__(self, key)
+
+  def __contains__(self, key):
+    return any(x.name == key for x in self)
+
+  def new(self, node_type):
+    node_classes = {'NodeGroupInput': GroupInputNode, 'NodeGroupOutput': GroupOutputNode}
+    node = node_classes.get(node_type, Node)(self.node_tree, node_type)
+    # Node names are unique within a node tree
+    node.name = node_type + ('.%03d' % len(self) if node_type in self else '')
+    self.append(node)
+    return node
+
+
+class Links:
+  def __init__(self, node_tree):
+    self.node_tree = node_tree
+
+  def new(self, from_socket, to_socket):
+    to_socket.link = from_socket
+    # Group input sockets are shared with the interface, so their node is looked up in the node tree
+    to_socket.link_node = from_socket.node or next(x for x in self.node_tree.nodes if isinstance(x, GroupInputNode))
+
+
+class NodeTree:
+  def __init__(self, name):
+    self.name = name
+    self.nodes = Nodes(self)
+    self.links = Links(self)
+    self.interface = Interface(self)
+
+  def evaluate(self, **values):
+    # Returns every group output for the group inputs given by name, with spaces written as underscores
+    inputs = {x.name: values.get(x.name.replace(' ', '_'), x.default_value) for x in self.interface.sockets if x.in_out == 'INPUT'}
+    cache = {}
+    return {x.name: get_value(x, inputs, cache) for x in self.interface.sockets if x.in_out == 'OUTPUT'}
+
+
+class NodeGroups(dict):
+  def new(self, name, tree_type):
+    self[name] = NodeTree(name)
+    return self[name]
+
+
+def create_bpy():
+  return SimpleNamespace(
+    app=SimpleNamespace(version=(4, 0, 0)),
+    types=SimpleNamespace(NodeSocket=Socket),
+    data=SimpleNamespace(node_groups=NodeGroups())
+  )
+
+
+def fract(x):
+  return x - floor(x)
+
+
+def hash_values(values, seed):
+  return fract(sin(sum(x * (12.9898 + 78.233 * idx + seed) for idx, x in enumerate(values))) * 43758.5453)
+
+
+def convert(value, socket_type):
+  # Shader sockets convert vectors to floats by averaging and floats to vectors by repeating them
+  is_vector = isinstance(value, tuple)
+  if socket_type == 'VECTOR' and not is_vector:
+    return (value, value, value)
+  if socket_type == 'VALUE' and is_vector:
+    return sum(value) / 3
+  return value
+
+
+def get_input(socket, inputs, cache):
+  if socket.link:
+    return convert(get_value(socket.link, inputs, cache), socket.type)
+  return convert(tuple(socket.default_value) if isinstance(socket.default_value, (list, tuple)) else socket.default_value, socket.type)
+
+
+def get_value(socket, inputs, cache):
+  if socket.node is None:
+    if getattr(socket, 'in_out', None) == 'OUTPUT':
+      return get_input(socket, inputs, cache)
+    return convert(inputs[socket.name], socket.type)
+  node = socket.node
+  if id(node) not in cache:
+    cache[id(node)] = evaluate_node(node, [get_input(x, inputs, cache) for x in node.inputs])
+  return cache[id(node)][list(node.outputs).index(socket)]
+
+
+def safe_divide(a, b):
+  return a / b if b != 0 else 0
+
+
+math_operations = {
+  'ADD': lambda a, b, c: a + b,
+  'SUBTRACT': lambda a, b, c: a - b,
+  'MULTIPLY': lambda a, b, c: a * b,
+  'DIVIDE': lambda a, b, c: safe_divide(a, b),
+  'MULTIPLY_ADD': lambda a, b, c: a * b + c,
+  'MINIMUM': lambda a, b, c: min(a, b),
+  'MAXIMUM': lambda a, b, c: max(a, b),
+  'LESS_THAN': lambda a, b, c: float(a < b),
+  'GREATER_THAN': lambda a, b, c: float(a > b),
+  'FLOOR': lambda a, b, c: floor(a),
+  'ROUND': lambda a, b, c: floor(a + 0.5),
+  'SIGN': lambda a, b, c: float((a > 0) - (a < 0)),
+}
+
+
+def evaluate_node(node, values):
+  if node.bl_idname == 'ShaderNodeMath':
+    result = math_operations[node.operation](*values)
+    return [min(max(result, 0), 1) if node.use_clamp else result]
+  if node.bl_idname == 'ShaderNodeVectorMath':
+    a, b, c, scale = values
+    if node.operation == 'SCALE':
+      return [tuple(x * scale for x in a), 0]
+    if node.operation == 'DISTANCE':
+      return [(0, 0, 0), sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))]
+    if node.operation == 'DOT_PRODUCT':
+      return [(0, 0, 0), sum(x * y for x, y in zip(a, b))]
+    if node.operation == 'LENGTH':
+      return [(0, 0, 0), sqrt(sum(x * x for x in a))]
+    return [tuple(math_operations[node.operation](x, y, z) for x, y, z in zip(a, b, c)), 0]
+  if node.bl_idname == 'ShaderNodeSeparateXYZ':
+    return list(values[0])
+  if node.bl_idname == 'ShaderNodeCombineXYZ':
+    return [tuple(values)]
+  if node.bl_idname == 'ShaderNodeMixRGB':
+    factor, a, b = values
+    return [tuple(x + factor * (y - x) for x, y in zip(a, b))]
+  if node.bl_idname == 'ShaderNodeTexImage':
+    # Every image is a single color
+    return [node.color, 1]
+  if node.bl_idname == 'ShaderNodeValue':
+    return [node.outputs[0].default_value]
+  if node.bl_idname == 'NodeReroute':
+    return values
+  if node.bl_idname == 'ShaderNodeTexWhiteNoise':
+    hashed = list(values[0]) + ([values[1]] if node.noise_dimensions == '4D' else [])
+    return [hash_values(hashed, 0), tuple(hash_values(hashed, seed) for seed in [1, 2, 3])]
+  raise NotImplementedError(node.bl_idname)
@@ -0,0 +1,44 @@
+import numpy as np
+from types import SimpleNamespace
+from scattershot import channel_packing
+from scattershot.channel_packing import get_channel_packs
+
+
+def get_textures(counts):
+  return {channel: ['%s %d' % (channel, idx) for idx in range(count)] for channel, count in counts.items()}
+
+
+def test_channels_with_the_same_image_count_are_packed():
+  sorted_textures = get_textures({'Image': 2, 'AO': 2, 'Roughness': 2, 'Metallic': 1, 'Specular': 1})
+  scatter_sources = get_textures({'Image': 1, 'AO': 1, 'Roughness': 1, 'Metallic': 1, 'Specular': 1})
+  assert get_channel_packs(sorted_textures, scatter_sources) == [['AO', 'Roughness'], ['Metallic', 'Specular']]
+
+
+def test_packs_hold_at_most_three_channels():
+  counts = {'AO': 1, 'Metallic': 1, 'Specular': 1, 'Roughness': 1, 'Glossiness': 1}
+  packs = get_channel_packs(get_textures(counts), get_textures(counts))
+  assert packs == [['AO', 'Metallic', 'Specular'], ['Roughness', 'Glossiness']]
+
+
+def test_single_channels_and_different_source_counts_are_not_packed():
+  sorted_textures = get_textures({'AO': 1, 'Roughness': 1, 'Metallic': 2})
+  scatter_sources = get_textures({'AO': 1, 'Roughness': 2, 'Metallic': 1})
+  assert get_channel_packs(sorted_textures, scatter_sources) == []
+
+
+def test_packed_image_keeps_the_alpha_of_the_kept_channel(monkeypatch):
+  pixels = {
+    'AO': np.full((4, 4, 4), 0.25, dtype=np.float32),
+    'Roughness': np.full((4, 4, 4), 0.75, dtype=np.float32),
+  }
+  pixels['AO'][..., 3] = 1
+  pixels['Roughness'][..., 3] = np.linspace(0, 1, 16).reshape(4, 4)
+  monkeypatch.setattr(channel_packing, 'get_packed_file_path', lambda images, channels, alpha_idx: (None, 'Packed'))
+  monkeypatch.setattr(channel_packing, 'get_image_pixels', lambda image: pixels[image.name])
+  monkeypatch.setattr(channel_packing, 'new_image_from_pixels', lambda name, pixels, is_data: SimpleNamespace(pixels=pixels, pack=lambda: None))
+  monkeypatch.setattr(channel_packing, 'set_data_color_space', lambda image: None)
+  images = [SimpleNamespace(name=x, size=(4, 4)) for x in ['AO', 'Roughness']]
+  packed = channel_packing.get_packed_image(None, images, ['AO', 'Roughness'], 1).pixels
+  assert np.allclose(packed[..., 0], 0.25)
+  assert np.allclose(packed[..., 1], 0.75)
+  assert np.allclose(packed[..., 3], pixels['Roughness'][..., 3])
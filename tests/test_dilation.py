@@ -0,0 +1,48 @@
+import numpy as np
+from scattershot.utilities.image_processing import dilate_pixels, rasterize_uv_triangles
+
+
+def test_dilation_copies_the_nearest_covered_pixel():
+  pixels = np.zeros((8, 8, 4), dtype=np.float32)
+  mask = np.zeros((8, 8), dtype=bool)
+  pixels[2, 2] = [1, 0, 0, 1]
+  pixels[2, 6] = [0, 1, 0, 1]
+  mask[2, 2] = mask[2, 6] = True
+  result = dilate_pixels(pixels, mask, 3)
+  assert np.array_equal(result[2, 3], [1, 0, 0, 1])
+  assert np.array_equal(result[2, 5], [0, 1, 0, 1])
+  assert np.array_equal(result[4, 1], [1, 0, 0, 1])
+  assert np.array_equal(result[4, 7], [0, 1, 0, 1])
+  assert np.array_equal(result[5, 7], [0, 0, 0, 0])
+
+
+def test_dilation_stops_at_the_margin():
+  pixels = np.zeros((16, 16, 4), dtype=np.float32)
+  mask = np.zeros((16, 16), dtype=bool)
+  pixels[0, 0] = 1
+  mask[0, 0] = True
+  result = dilate_pixels(pixels, mask, 4)
+  assert np.all(result[0, :5] == 1)
+  assert np.all(result[0, 5:] == 0)
+  assert np.all(result[3, 3] == 0)
+  assert np.all(result[2, 2] == 1)
+
+
+def test_dilation_keeps_covered_pixels():
+  rng = np.random.default_rng(1)
+  pixels = rng.random((12, 10, 4), dtype=np.float32)
+  mask = rng.random((12, 10)) > 0.7
+  result = dilate_pixels(pixels, mask, 16)
+  assert np.array_equal(result[mask], pixels[mask])
+
+
+def test_dilation_fills_around_rasterized_triangles():
+  triangles = np.array([[[0.25, 0.25], [0.75, 0.25], [0.25, 0.75]]], dtype=np.float32)
+  mask = rasterize_uv_triangles(triangles, 32, 32)
+  pixels = np.zeros((32, 32, 4), dtype=np.float32)
+  pixels[mask] = 1
+  result = dilate_pixels(pixels, mask, 2)
+  grown = result[..., 0] == 1
+  assert np.all(grown[mask])
+  assert grown.sum() > mask.sum()
+  assert not grown[0, 0] and not grown[31, 31]
@@ -0,0 +1,81 @@
+import pytest
+from math import floor, sqrt
+from scattershot import grid_cells
+from scattershot.utilities import node_interface
+import fake_nodes
+
+points = [(0.13, 0.71, 0), (0.52, 0.08, 0), (1.37, 2.94, 0), (-0.61, 0.45, 0), (2.05, -1.33, 0), (-3.3, -2.7, 0)]
+
+
+@pytest.fixture(autouse=True)
+def fake_bpy(monkeypatch):
+  bpy = fake_nodes.create_bpy()
+  monkeypatch.setattr(grid_cells, 'bpy', bpy)
+  monkeypatch.setattr(node_interface, 'bpy', bpy)
+  return bpy
+
+
+def test_square_cells_keep_their_feature_inside_the_cell():
+  node_tree = grid_cells.get_grid_cells_tree('square')
+  for point in points:
+    result = node_tree.evaluate(Vector=point, Scale=2, Randomness=1)
+    feature = [x * 2 for x in result['Position']]
+    assert [floor(x) for x in feature[:2]] == [floor(x * 2) for x in point[:2]]
+    assert result['Distance'] == pytest.approx(sqrt(sum((x * 2 - y) ** 2 for x, y in zip(point[:2], feature[:2]))))
+
+
+def test_square_cells_hash_the_cell():
+  node_tree = grid_cells.get_grid_cells_tree('square')
+  first = node_tree.evaluate(Vector=(0.1, 0.1, 0), Scale=1, Randomness=1)
+  second = node_tree.evaluate(Vector=(0.9, 0.8, 0), Scale=1, Randomness=1)
+  other = node_tree.evaluate(Vector=(1.1, 0.1, 0), Scale=1, Randomness=1)
+  assert first['Color'] == second['Color'] and first['Position'] == second['Position']
+  assert first['Color'] != other['Color']
+
+
+@pytest.mark.parametrize('neighbor', [(1, 0), (0, 1), (1, 1)])
+def test_quadrant_neighbors_are_on_the_side_of_the_point(neighbor):
+  cells = grid_cells.get_grid_cells_tree('square')
+  neighbor_cells = grid_cells.get_grid_cells_tree('square', neighbor, True)
+  for point in points:
+    cell = [floor(x) for x in point[:2]]
+    side = [1 if x - y > 0.5 else -1 for x, y in zip(point[:2], cell)]
+    neighbor_point = (cell[0] + 0.5 + side[0] * neighbor[0], cell[1] + 0.5 + side[1] * neighbor[1], 0)
+    expected = cells.evaluate(Vector=neighbor_point, Scale=1, Randomness=1)
+    assert neighbor_cells.evaluate(Vector=point, Scale=1, Randomness=1)['Color'] == expected['Color']
+
+
+def test_hex_cells_find_the_closest_center():
+  node_tree = grid_cells.get_grid_cells_tree('hex')
+  centers = [(x + 0.5 * (y % 2), y * sqrt(3) / 2) for x in range(-6, 7) for y in range(-6, 7)]
+  for point in points:
+    # With no jitter the feature point is the hexagon center
+    position = node_tree.evaluate(Vector=point, Scale=1, Randomness=0)['Position']
+    closest = min(centers, key=lambda x: (x[0] - point[0]) ** 2 + (x[1] - point[1]) ** 2)
+    assert position[:2] == pytest.approx(closest)
+
+
+def test_hex_tiling_corners_are_barycentric():
+  corner_trees = [grid_cells.get_hex_tiling_tree(x) for x in range(3)]
+  for point in points:
+    results = [x.evaluate(Vector=point, Scale=1) for x in corner_trees]
+    weights = [x['Distance'] for x in results]
+    assert all(-1e-6 <= x <= 1 + 1e-6 for x in weights)
+    assert sum(weights) == pytest.approx(1)
+    # The weights rebuild the point from the three corner positions
+    for axis in range(2):
+      assert sum(x['Distance'] * x['Position'][axis] for x in results) == pytest.approx(point[axis])
+    # Neighboring corners are one cell apart
+    positions = [x['Position'] for x in results]
+    for a, b in [(0, 1), (1, 2), (0, 2)]:
+      assert sqrt(sum((x - y) ** 2 for x, y in zip(positions[a], positions[b]))) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('feature', ['F1', 'F2'])
+def test_periodic_cells_repeat_every_period(feature):
+  node_tree = grid_cells.get_periodic_cells_tree(feature)
+  for point in points:
+    result = node_tree.evaluate(Vector=point, Scale=3, Randomness=1, Period=2)
+    repeated = node_tree.evaluate(Vector=(point[0] + 2, point[1] - 2, 0), Scale=3, Randomness=1, Period=2)
+    assert result['Distance'] == pytest.approx(repeated['Distance'])
+    assert result['Color'] == pytest.approx(repeated['Color'])
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from scattershot.utilities.image_processing import create_mip_levels, downsample_lanczos
+
+
+@pytest.mark.parametrize('width, height', [(128, 128), (9, 7), (3, 2)])
+@pytest.mark.parametrize('method', ['box', 'lanczos'])
+def test_mip_levels_reach_one_pixel(width, height, method):
+  pixels = np.random.default_rng(0).random((height, width, 4), dtype=np.float32)
+  levels = create_mip_levels(pixels, 12, method)
+  assert min(levels[-1].shape[:2]) == 1
+  for level, next_level in zip([pixels] + levels, levels):
+    assert next_level.shape[:2] == ((level.shape[0] + 1) // 2, (level.shape[1] + 1) // 2)
+
+
+def test_lanczos_keeps_flat_images_flat():
+  pixels = np.full((5, 6, 4), 0.25, dtype=np.float32)
+  result = downsample_lanczos(pixels)
+  assert result.shape == (3, 3, 4)
+  assert np.allclose(result, 0.25)
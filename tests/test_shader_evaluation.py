@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from scattershot import grid_cells
+from scattershot.utilities import node_interface
+from scattershot.utilities.node_interface import create_socket
+from scattershot.utilities.shader_evaluation import ShaderEvaluator, adjust_hsv, get_source_selection, hsv_to_rgb, rgb_to_hsv, select_source_images
+import fake_nodes
+
+image_colors = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+
+
+@pytest.fixture(autouse=True)
+def fake_bpy(monkeypatch):
+  bpy = fake_nodes.create_bpy()
+  monkeypatch.setattr(grid_cells, 'bpy', bpy)
+  monkeypatch.setattr(node_interface, 'bpy', bpy)
+  return bpy
+
+
+def create_scatter_source(fake_bpy, image_count):
+  # Builds the image selection of a scatter source the same way that the scatter operator links it
+  node_tree = fake_bpy.data.node_groups.new('Scatter Source', 'ShaderNodeTree')
+  create_socket(node_tree, 'INPUT', 'NodeSocketVector', 'Vector')
+  create_socket(node_tree, 'INPUT', 'NodeSocketColor', 'Random Color')
+  nodes = node_tree.nodes
+  links = node_tree.links
+  group_input = nodes.new('NodeGroupInput')
+  group_input.name = 'Group Input'
+  number_of_images = nodes.new('ShaderNodeValue')
+  number_of_images.name = 'Number of Images'
+  number_of_images.outputs[0].default_value = image_count
+  fraction = nodes.new('ShaderNodeMath')
+  fraction.name = 'Fraction'
+  fraction.operation = 'DIVIDE'
+  fraction.inputs[0].default_value = 1
+  links.new(number_of_images.outputs[0], fraction.inputs[1])
+  color_result = nodes.new('NodeReroute')
+  color_result.name = 'Color Result'
+
+  image_nodes = []
+  for color in image_colors[:image_count]:
+    image_node = nodes.new('ShaderNodeTexImage')
+    image_node.color = color
+    links.new(group_input.outputs[0], image_node.inputs[0])
+    image_nodes.append(image_node)
+  previous = image_nodes[0].outputs[0]
+  for image_idx, image_node in enumerate(image_nodes[1:], 1):
+    multiply = nodes.new('ShaderNodeMath')
+    multiply.operation = 'MULTIPLY'
+    links.new(fraction.outputs[0], multiply.inputs[0])
+    multiply.inputs[1].default_value = image_idx
+    greater = nodes.new('ShaderNodeMath')
+    greater.operation = 'GREATER_THAN'
+    links.new(group_input.outputs[1], greater.inputs[0])
+    links.new(multiply.outputs[0], greater.inputs[1])
+    col_mix = nodes.new('ShaderNodeMixRGB')
+    links.new(greater.outputs[0], col_mix.inputs[0])
+    links.new(previous, col_mix.inputs[1])
+    links.new(image_node.outputs[0], col_mix.inputs[2])
+    previous = col_mix.outputs[0]
+  links.new(previous, color_result.inputs[0])
+  return SimpleNamespace(node_tree=node_tree), image_nodes
+
+
+@pytest.mark.parametrize('image_count', [1, 2, 3])
+def test_source_selection_follows_the_mix_chain(fake_bpy, image_count):
+  source, image_nodes = create_scatter_source(fake_bpy, image_count)
+  selection = get_source_selection(source)
+  assert [x[0] for x in selection] == image_nodes
+  randoms = np.linspace(0.01, 0.99, 37, dtype=np.float32)
+  image_indices = select_source_images(selection, randoms)
+  color_result = source.node_tree.nodes['Color Result']
+  for random, image_idx in zip(randoms, image_indices):
+    inputs = {'Vector': (0, 0, 0), 'Random Color': (float(random),) * 3}
+    assert fake_nodes.get_input(color_result.inputs[0], inputs, {})[:3] == image_nodes[image_idx].color
+
+
+def test_source_selection_rejects_unknown_chains(fake_bpy):
+  source, image_nodes = create_scatter_source(fake_bpy, 2)
+  source.node_tree.nodes['ShaderNodeMixRGB'].blend_type = 'MULTIPLY'
+  assert get_source_selection(source) is None
+
+
+def test_hsv_conversion_round_trips():
+  colors = np.random.default_rng(0).random((64, 3)).astype(np.float32)
+  assert np.allclose(hsv_to_rgb(rgb_to_hsv(colors)), colors, atol=1e-6)
+
+
+def test_neutral_hsv_adjustment_keeps_the_color():
+  colors = np.random.default_rng(1).random((64, 3)).astype(np.float32)
+  ones = np.ones(64, dtype=np.float32)
+  assert np.allclose(adjust_hsv(colors, ones * 0.5, ones, ones, ones), colors, atol=1e-6)
+  assert np.allclose(adjust_hsv(colors, ones * 0.5, ones, ones * 0.5, ones), colors * 0.5, atol=1e-6)
+
+
+def test_evaluator_matches_the_node_math():
+  # Without jitter the square cells only depend on the math nodes, which both evaluators implement
+  node_tree = grid_cells.get_grid_cells_tree('square')
+  group_output = node_tree.nodes['NodeGroupOutput']
+  points = np.array([(0.13, 0.71, 0), (1.37, 2.94, 0), (-0.61, 0.45, 0), (2.05, -1.33, 0)], dtype=np.float32)
+  inputs = {'Vector': points, 'Scale': np.full(len(points), 2, dtype=np.float32), 'Randomness': np.zeros(len(points), dtype=np.float32)}
+  evaluator = ShaderEvaluator({}, inputs, len(points))
+  distances = evaluator.evaluate(group_output.inputs['Distance'])
+  positions = evaluator.evaluate(group_output.inputs['Position'])
+  for point, distance, position in zip(points, distances, positions):
+    expected = node_tree.evaluate(Vector=tuple(float(x) for x in point), Scale=2, Randomness=0)
+    assert distance == pytest.approx(expected['Distance'], abs=1e-5)
+    assert tuple(position) == pytest.approx(expected['Position'], abs=1e-5)
@@ -0,0 +1,52 @@
+import numpy as np
+from scattershot.utilities.image_processing import create_tile_atlas
+
+size = 16
+corners = [(0, 0), (1, 0), (0, 1), (1, 1)]
+
+
+def get_tiles(atlas):
+  return [atlas[(idx // 4) * size:(idx // 4 + 1) * size, (idx % 4) * size:(idx % 4 + 1) * size] for idx in range(16)]
+
+
+def get_corner_colors(tile_idx):
+  return {corner: (tile_idx >> corner_idx) & 1 for corner_idx, corner in enumerate(corners)}
+
+
+def test_tiles_with_the_same_corners_share_their_edges():
+  source = np.random.default_rng(0).random((size * 2, size * 4, 4)).astype(np.float32)
+  tiles = get_tiles(create_tile_atlas(source, size))
+  for a in range(16):
+    for b in range(16):
+      colors_a = get_corner_colors(a)
+      colors_b = get_corner_colors(b)
+      if colors_a[(0, 0)] == colors_b[(0, 0)] and colors_a[(0, 1)] == colors_b[(0, 1)]:
+        assert np.array_equal(tiles[a][:, 0], tiles[b][:, 0])
+      if colors_a[(0, 0)] == colors_b[(0, 0)] and colors_a[(1, 0)] == colors_b[(1, 0)]:
+        assert np.array_equal(tiles[a][0], tiles[b][0])
+
+
+def test_neighboring_tiles_continue_each_other():
+  # Each patch counts up by one per column, so a seamless neighbor continues the count across the edge
+  source = np.zeros((size * 2, size * 4, 4), dtype=np.float32)
+  source[:, :size * 2] = np.arange(size * 2)[None, :, None]
+  source[:, size * 2:] = np.arange(size * 2)[None, :, None] + 100
+  tiles = get_tiles(create_tile_atlas(source, size))
+  for a in range(16):
+    for b in range(16):
+      colors_a = get_corner_colors(a)
+      colors_b = get_corner_colors(b)
+      if colors_a[(1, 0)] == colors_b[(0, 0)] and colors_a[(1, 1)] == colors_b[(0, 1)]:
+        assert np.allclose(tiles[b][:, 0] - tiles[a][:, -1], 1)
+
+
+def test_tile_quarters_are_not_blended():
+  source = np.zeros((size * 2, size * 4, 4), dtype=np.float32)
+  source[:, size * 2:] = 1
+  tiles = get_tiles(create_tile_atlas(source, size, blend_width=0.1))
+  quarter = size // 4
+  for tile_idx, tile in enumerate(tiles):
+    colors = get_corner_colors(tile_idx)
+    for (corner_x, corner_y), color in colors.items():
+      pixel = tile[quarter + corner_y * size // 2, quarter + corner_x * size // 2]
+      assert np.all(pixel == color)
@@ -0,0 +1,41 @@
+import numpy as np
+from scattershot.utilities.image_processing import count_uv_coverage, get_covered_pixels, rasterize_uv_triangles
+
+
+def get_square(x0, y0, x1, y1):
+  # Two triangles with opposite windings that share a diagonal
+  return [[[x0, y0], [x1, y0], [x1, y1]], [[x0, y0], [x0, y1], [x1, y1]]]
+
+
+def test_neighboring_triangles_do_not_overlap():
+  triangles = np.array(get_square(0, 0, 0.5, 1) + get_square(0.5, 0, 1, 1), dtype=np.float32)
+  coverage = count_uv_coverage(triangles, 64, 64)
+  assert coverage.max() == 1
+  assert np.count_nonzero(coverage) > 0.9 * 64 * 64
+
+
+def test_stacked_islands_overlap():
+  triangles = np.array(get_square(0.1, 0.1, 0.6, 0.65) + get_square(0.3, 0.3, 0.8, 0.85), dtype=np.float32)
+  coverage = count_uv_coverage(triangles, 100, 100)
+  overlap = np.count_nonzero(coverage > 1) / np.count_nonzero(coverage)
+  assert np.all(coverage[35:55, 35:55] == 2)
+  assert np.all(coverage[15:25, 15:25] == 1)
+  assert 0.15 < overlap < 0.25
+
+
+def test_coverage_matches_rasterized_mask():
+  triangles = np.random.default_rng(2).random((20, 3, 2), dtype=np.float32)
+  coverage = count_uv_coverage(triangles, 48, 40)
+  mask = rasterize_uv_triangles(triangles, 48, 40)
+  assert coverage.shape == mask.shape == (40, 48)
+  # The inclusive mask also counts pixels on the edges, so it covers at least as much
+  assert np.all(mask[coverage > 0])
+
+
+def test_small_chunks_give_the_same_result():
+  triangles = np.random.default_rng(3).random((30, 3, 2), dtype=np.float32)
+  full = rasterize_uv_triangles(triangles, 32, 32)
+  chunked = np.zeros_like(full)
+  for y, x in get_covered_pixels(triangles, 32, 32, chunk_size=37):
+    chunked[y, x] = True
+  assert np.array_equal(full, chunked)
@@ -24,7 +24,9 @@ along with this program; if not, see <https://www.gnu.org/licenses/>.
 
 import bpy
 from bpy.types import (Operator)
-from .utilities.utilities import append_node, average_location, mode_toggle
+from .utilities.utilities import append_node, average_location, mode_toggle, duplicate_branch
+from .utilities.node_interface import create_socket
+from . import defaults
 from .defaults import node_tree_names
 
 def check_vector_input(selected_nodes):
@@ -37,11 +39,172 @@ def check_vector_input(selected_nodes):
         if has_vector: break
     return has_vector
 
+def get_smooth_triplanar_tree():
+    # Outputs the strongest and second strongest projections along with the weight of the strongest,
+    # so that the nodes after it can be evaluated twice and mixed instead of dithered
+    if node_tree_names['tri-planar_smooth'] in bpy.data.node_groups:
+        return bpy.data.node_groups[node_tree_names['tri-planar_smooth']]
+    node_tree = bpy.data.node_groups.new(node_tree_names['tri-planar_smooth'], 'ShaderNodeTree')
+    nodes = node_tree.nodes
+    links = node_tree.links
+    blending = create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Blending')
+    blending.default_value = 0.2
+    blending.min_value = 0
+    blending.max_value = 1
+    for output_name in ['Vector', 'Axes', 'Second Vector', 'Second Axes']:
+        create_socket(node_tree, 'OUTPUT', 'NodeSocketVector', output_name)
+    create_socket(node_tree, 'OUTPUT', 'NodeSocketFloat', 'Weight')
+    input_node = nodes.new('NodeGroupInput')
+    input_node.location = [-1000, -400]
+    output_node = nodes.new('NodeGroupOutput')
+    output_node.location = [1400, 0]
+
+    def add_math(operation, a, b, location):
+        math_node = nodes.new('ShaderNodeMath')
+        math_node.operation = operation
+        math_node.location = location
+        for idx, value in enumerate([a, b]):
+            if isinstance(value, bpy.types.NodeSocket):
+                links.new(value, math_node.inputs[idx])
+            else:
+                math_node.inputs[idx].default_value = value
+        return math_node.outputs[0]
+
+    def add_axes(values, y):
+        # One-hot vector of the largest value. Ties go to the earlier axis so that exactly one axis is picked.
+        x_axis = add_math('MULTIPLY',
+            add_math('SUBTRACT', 1, add_math('GREATER_THAN', values[1], values[0], [-200, y]), [0, y]),
+            add_math('SUBTRACT', 1, add_math('GREATER_THAN', values[2], values[0], [-200, y - 150]), [0, y - 150]),
+            [200, y]
+        )
+        y_axis = add_math('MULTIPLY',
+            add_math('SUBTRACT', 1, x_axis, [200, y - 300]),
+            add_math('SUBTRACT', 1, add_math('GREATER_THAN', values[2], values[1], [-200, y - 300]), [0, y - 300]),
+            [400, y - 300]
+        )
+        z_axis = add_math('SUBTRACT', add_math('SUBTRACT', 1, x_axis, [400, y - 450]), y_axis, [600, y - 450])
+        axes = nodes.new('ShaderNodeCombineXYZ')
+        axes.location = [800, y]
+        for idx, axis in enumerate([x_axis, y_axis, z_axis]):
+            links.new(axis, axes.inputs[idx])
+        return axes
+
+    def add_projection(axes, y):
+        # Each axis projects the object coordinates along itself onto the plane of the other two axes
+        separate_axes = nodes.new('ShaderNodeSeparateXYZ')
+        separate_axes.location = [1000, y]
+        links.new(axes.outputs[0], separate_axes.inputs[0])
+        projection = None
+        for idx, plane in enumerate(planes):
+            scaled_plane = nodes.new('ShaderNodeVectorMath')
+            scaled_plane.operation = 'SCALE'
+            scaled_plane.location = [1150, y - 150 * idx]
+            links.new(plane.outputs[0], scaled_plane.inputs[0])
+            links.new(separate_axes.outputs[idx], scaled_plane.inputs['Scale'])
+            if projection:
+                add_planes = nodes.new('ShaderNodeVectorMath')
+                add_planes.operation = 'ADD'
+                add_planes.location = [1300, y - 150 * idx]
+                links.new(projection, add_planes.inputs[0])
+                links.new(scaled_plane.outputs[0], add_planes.inputs[1])
+                projection = add_planes.outputs[0]
+            else:
+                projection = scaled_plane.outputs[0]
+        return projection
+
+    coordinates = nodes.new('ShaderNodeTexCoord')
+    coordinates.location = [-1000, 400]
+    position = nodes.new('ShaderNodeSeparateXYZ')
+    position.location = [-800, 400]
+    links.new(coordinates.outputs['Object'], position.inputs[0])
+    planes = []
+    for idx, plane_axes in enumerate([('Y', 'Z'), ('X', 'Z'), ('X', 'Y')]):
+        plane = nodes.new('ShaderNodeCombineXYZ')
+        plane.location = [-600, 400 - 150 * idx]
+        links.new(position.outputs[plane_axes[0]], plane.inputs['X'])
+        links.new(position.outputs[plane_axes[1]], plane.inputs['Y'])
+        planes.append(plane)
+
+    geometry = nodes.new('ShaderNodeNewGeometry')
+    geometry.location = [-1000, 0]
+    object_normal = nodes.new('ShaderNodeVectorTransform')
+    object_normal.vector_type = 'NORMAL'
+    object_normal.convert_from = 'WORLD'
+    object_normal.convert_to = 'OBJECT'
+    object_normal.location = [-800, 0]
+    links.new(geometry.outputs['Normal'], object_normal.inputs[0])
+    absolute_normal = nodes.new('ShaderNodeVectorMath')
+    absolute_normal.operation = 'ABSOLUTE'
+    absolute_normal.location = [-600, 0]
+    links.new(object_normal.outputs[0], absolute_normal.inputs[0])
+    normal_values = nodes.new('ShaderNodeSeparateXYZ')
+    normal_values.location = [-400, 0]
+    links.new(absolute_normal.outputs[0], normal_values.inputs[0])
+    values = list(normal_values.outputs)
+
+    axes = add_axes(values, 0)
+    remaining_values = []
+    for idx, value in enumerate(values):
+        separate_axes = nodes.new('ShaderNodeSeparateXYZ')
+        separate_axes.location = [1000, -600 - 150 * idx]
+        links.new(axes.outputs[0], separate_axes.inputs[0])
+        remaining_values.append(add_math('MULTIPLY', value, add_math('SUBTRACT', 1, separate_axes.outputs[idx], [1150, -600 - 150 * idx]), [1300, -600 - 150 * idx]))
+    second_axes = add_axes(remaining_values, -1200)
+
+    # Outside of the blending band the weight is 1, so only the strongest projection shows. Shader nodes cannot skip
+    # the other branch there, so both projections are still evaluated everywhere.
+    strongest = nodes.new('ShaderNodeVectorMath')
+    strongest.operation = 'DOT_PRODUCT'
+    strongest.location = [1000, -1800]
+    links.new(absolute_normal.outputs[0], strongest.inputs[0])
+    links.new(axes.outputs[0], strongest.inputs[1])
+    second_strongest = nodes.new('ShaderNodeVectorMath')
+    second_strongest.operation = 'DOT_PRODUCT'
+    second_strongest.location = [1000, -1950]
+    links.new(absolute_normal.outputs[0], second_strongest.inputs[0])
+    links.new(second_axes.outputs[0], second_strongest.inputs[1])
+    weight = nodes.new('ShaderNodeMapRange')
+    weight.interpolation_type = 'SMOOTHSTEP'
+    weight.location = [1200, -1800]
+    links.new(add_math('SUBTRACT', strongest.outputs['Value'], second_strongest.outputs['Value'], [1150, -1650]), weight.inputs['Value'])
+    links.new(input_node.outputs['Blending'], weight.inputs['From Max'])
+    weight.inputs['From Min'].default_value = 0
+    weight.inputs['To Min'].default_value = 0.5
+    weight.inputs['To Max'].default_value = 1
+
+    links.new(add_projection(axes, 0), output_node.inputs['Vector'])
+    links.new(axes.outputs[0], output_node.inputs['Axes'])
+    links.new(add_projection(second_axes, -1200), output_node.inputs['Second Vector'])
+    links.new(second_axes.outputs[0], output_node.inputs['Second Axes'])
+    links.new(weight.outputs[0], output_node.inputs['Weight'])
+    return node_tree
+
+def add_smooth_triplanar_node(nodes):
+    triplanar_node = nodes.new('ShaderNodeGroup')
+    triplanar_node.node_tree = get_smooth_triplanar_tree()
+    triplanar_node.name = 'Tri-Planar Mapping'
+    triplanar_node.label = 'Tri-Planar Mapping'
+    return triplanar_node
+
+def blend_triplanar_projections(node_tree, triplanar_node):
+    # Everything after the tri-planar node is evaluated again for the second projection and mixed in near the corners
+    return duplicate_branch(
+        node_tree,
+        [
+            (triplanar_node.outputs['Vector'], triplanar_node.outputs['Second Vector']),
+            (triplanar_node.outputs['Axes'], triplanar_node.outputs['Second Axes'])
+        ],
+        triplanar_node.outputs['Weight']
+    )
+
 def create_triplanar_node(self, context):
     nodes = context.selected_nodes[0].id_data.nodes
     links = context.selected_nodes[0].id_data.links
     textures = context.selected_nodes
-    triplanar_node = append_node(self, nodes, node_tree_names['tri-planar'])
+    if self.blend_method == 'smooth':
+        triplanar_node = add_smooth_triplanar_node(nodes)
+    else:
+        triplanar_node = append_node(self, nodes, node_tree_names['tri-planar'])
     triplanar_node.label = 'Tri-Planar Mapping'
     triplanar_node.location = [
         min([x.location[0] for x in textures]) - 250,
@@ -55,6 +218,8 @@ def create_triplanar_node(self, context):
                 self.report({'WARNING'},
                     'Image texture interpolation should be set to Closest or Cubic instead of Linear to avoid blending issues'
                 )
+    if self.blend_method == 'smooth':
+        blend_triplanar_projections(triplanar_node.id_data, triplanar_node)
 
 class NODE_OT_triplanar_mapping(Operator):
     bl_label = "Tri-Planar Mapping"
@@ -64,6 +229,16 @@ class NODE_OT_triplanar_mapping(Operator):
     bl_region_type = "UI"
     bl_options = {'REGISTER', 'UNDO'}
 
+    blend_method: bpy.props.EnumProperty(
+        name = "Blending Method",
+        description = "How the projections are blended where they meet",
+        items = [
+            ("dither", "Dithered", "Jitters between the projections with white noise. Needs many render samples to look smooth"),
+            ("smooth", "Smooth", "Evaluates the connected nodes a second time for the second strongest projection and mixes the two. Smooth after a single sample and works with displacement, but the connected nodes are evaluated twice everywhere, not only where the projections meet")
+        ],
+        default = defaults.scatter['triplanar_blend_method'],
+    )
+
     @classmethod
     def poll(cls, context):
         return context.area.ui_type == 'ShaderNodeTree' and check_vector_input(context.selected_nodes)
@@ -0,0 +1,276 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+import numpy as np
+
+
+def get_image_pixels(image):
+  # foreach_get is orders of magnitude faster than iterating over image.pixels
+  width, height = image.size
+  pixels = np.empty(width * height * 4, dtype=np.float32)
+  image.pixels.foreach_get(pixels)
+  return pixels.reshape(height, width, 4)
+
+
+def set_image_pixels(image, pixels):
+  image.pixels.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).ravel())
+  image.update()
+
+
+def new_image_from_pixels(name, pixels, is_float=True, is_data=False):
+  height, width = pixels.shape[:2]
+  image = bpy.data.images.new(name, width, height, alpha=True, float_buffer=is_float, is_data=is_data)
+  set_image_pixels(image, pixels)
+  return image
+
+
+def downsample_box(pixels):
+  # Averages each 2x2 block. Odd rows and columns are folded into the last block.
+  height, width = pixels.shape[:2]
+  if height % 2:
+    pixels = np.concatenate([pixels, pixels[-1:]], axis=0)
+  if width % 2:
+    pixels = np.concatenate([pixels, pixels[:, -1:]], axis=1)
+  return (pixels[0::2, 0::2] + pixels[1::2, 0::2] + pixels[0::2, 1::2] + pixels[1::2, 1::2]) * 0.25
+
+
+def lanczos_kernel(factor, lobes=3):
+  # Taps for a 2x reduction: the kernel is stretched by the reduction factor
+  radius = lobes * factor
+  x = (np.arange(-radius, radius) + 0.5) / factor
+  kernel = np.sinc(x) * np.sinc(x / lobes)
+  return (kernel / kernel.sum()).astype(np.float32)
+
+
+def downsample_lanczos(pixels, lobes=3):
+  kernel = lanczos_kernel(2, lobes)
+  radius = len(kernel) // 2
+
+  def reduce_axis(data, axis):
+    data = np.moveaxis(data, axis, 0)
+    if data.shape[0] % 2:
+      data = np.concatenate([data, data[-1:]], axis=0)
+    # Wrapping with modulo indices also works when the image is smaller than the kernel
+    padded = np.take(data, np.arange(-radius, data.shape[0] + radius) % data.shape[0], axis=0)
+    length = data.shape[0] // 2
+    result = np.zeros((length,) + data.shape[1:], dtype=np.float32)
+    for tap_idx, weight in enumerate(kernel):
+      result += weight * padded[tap_idx + 1:tap_idx + 1 + length * 2:2]
+    return np.moveaxis(result, 0, axis)
+
+  return reduce_axis(reduce_axis(pixels, 0), 1)
+
+
+def renormalize_normals(pixels):
+  # Averaging tangent or object space normals shortens them, so they need to be rescaled to unit length
+  vectors = pixels[..., :3] * 2 - 1
+  length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+  vectors = vectors / np.maximum(length, 1e-6)
+  result = pixels.copy()
+  result[..., :3] = vectors * 0.5 + 0.5
+  return result
+
+
+def create_mip_levels(pixels, level_count, method='box', is_normal=False):
+  levels = []
+  for level in range(level_count):
+    if min(pixels.shape[:2]) < 2:
+      break
+    if method == 'lanczos':
+      # Lanczos rings slightly below zero next to hard edges
+      pixels = np.clip(downsample_lanczos(pixels), 0, None)
+    else:
+      pixels = downsample_box(pixels)
+    if is_normal:
+      pixels = renormalize_normals(pixels)
+    levels.append(pixels)
+  return levels
+
+
+def get_covered_pixels(triangles, width, height, inclusive=True, chunk_size=1 << 20):
+  # Yields the rows and columns of the pixels whose centers fall inside each of the (n, 3, 2) UV triangles
+  points = (triangles * np.array([width, height]) - 0.5).astype(np.float32)
+  low = points.min(axis=1)
+  high = points.max(axis=1)
+  x0 = np.maximum(np.ceil(low[:, 0]), 0).astype(np.int64)
+  y0 = np.maximum(np.ceil(low[:, 1]), 0).astype(np.int64)
+  x1 = np.minimum(np.floor(high[:, 0]), width - 1).astype(np.int64)
+  y1 = np.minimum(np.floor(high[:, 1]), height - 1).astype(np.int64)
+  visible = np.nonzero((x1 >= x0) & (y1 >= y0))[0]
+  box_widths = x1 - x0 + 1
+  counts = box_widths[visible] * (y1 - y0 + 1)[visible]
+  if not len(counts):
+    return
+
+  # Tests every pixel inside each triangle's bounding box, a chunk of candidate pixels at a time
+  ends = np.cumsum(counts)
+  splits = np.searchsorted(ends, np.arange(chunk_size, ends[-1], chunk_size))
+  for indices, chunk_counts in zip(np.split(visible, splits), np.split(counts, splits)):
+    if not len(indices):
+      continue
+    triangle = np.repeat(indices, chunk_counts)
+    offset = np.arange(chunk_counts.sum()) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+    x = x0[triangle] + offset % box_widths[triangle]
+    y = y0[triangle] + offset // box_widths[triangle]
+    a, b, c = (points[triangle, i] for i in range(3))
+    edges = [
+      (end[:, 0] - start[:, 0]) * (y - start[:, 1]) - (end[:, 1] - start[:, 1]) * (x - start[:, 0])
+      for start, end in ((a, b), (b, c), (c, a))
+    ]
+    # Either winding counts as inside. Leaving out the edges keeps neighboring triangles from counting the same pixel.
+    if inclusive:
+      inside = ((edges[0] >= 0) & (edges[1] >= 0) & (edges[2] >= 0)) | ((edges[0] <= 0) & (edges[1] <= 0) & (edges[2] <= 0))
+    else:
+      inside = ((edges[0] > 0) & (edges[1] > 0) & (edges[2] > 0)) | ((edges[0] < 0) & (edges[1] < 0) & (edges[2] < 0))
+    yield y[inside], x[inside]
+
+
+def rasterize_uv_triangles(triangles, width, height):
+  # Marks the pixels that Cycles bakes for the triangles
+  mask = np.zeros((height, width), dtype=bool)
+  for y, x in get_covered_pixels(triangles, width, height):
+    mask[y, x] = True
+  return mask
+
+
+def count_uv_coverage(triangles, width, height):
+  # Counts how many triangles cover each pixel. Anything above one is overlapping UVs.
+  coverage = np.zeros((height, width), dtype=np.int32)
+  for y, x in get_covered_pixels(triangles, width, height, inclusive=False):
+    np.add.at(coverage, (y, x), 1)
+  return coverage
+
+
+def shift_array(array, dy, dx, fill):
+  # result[y, x] = array[y + dy, x + dx], with fill outside of the array
+  result = np.full_like(array, fill)
+  height, width = array.shape[:2]
+  if abs(dy) >= height or abs(dx) >= width:
+    return result
+  result[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+    array[max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+  return result
+
+
+def dilate_pixels(pixels, mask, margin):
+  # Jump flooding finds the nearest covered pixel of every pixel in log2(margin) passes, which is then copied outward
+  height, width = mask.shape
+  rows, columns = np.indices((height, width), dtype=np.int32)
+  seeds = np.where(mask[..., None], np.stack([rows, columns], axis=-1), -1).astype(np.int32)
+  distances = np.where(mask, 0, np.inf).astype(np.float32)
+  step = 1 << max(int(margin).bit_length() - 1, 0)
+  while step >= 1:
+    for dy in (-step, 0, step):
+      for dx in (-step, 0, step):
+        if dy == dx == 0:
+          continue
+        candidates = shift_array(seeds, dy, dx, -1)
+        candidate_distances = ((candidates[..., 0] - rows) ** 2 + (candidates[..., 1] - columns) ** 2).astype(np.float32)
+        candidate_distances[candidates[..., 0] < 0] = np.inf
+        closer = candidate_distances < distances
+        seeds[closer] = candidates[closer]
+        distances[closer] = candidate_distances[closer]
+    step //= 2
+
+  result = pixels.copy()
+  fill = ~mask & (distances <= margin * margin)
+  result[fill] = pixels[seeds[fill][:, 0], seeds[fill][:, 1]]
+  return result
+
+
+def get_tile_blend_weight(position, blend_width):
+  # 0 in the half of the tile closest to the first corner and 1 in the other half, with a smooth blend of blend_width around the middle
+  weight = np.clip((position - 0.5) / max(blend_width, 1e-6) + 0.5, 0, 1)
+  return weight * weight * (3 - 2 * weight)
+
+
+def create_tile_atlas(source, tile_resolution, blend_width=0.1, corner_colors=2, atlas_columns=4):
+  # Each corner color has a two by two tile patch of the source centered on that corner.
+  # Each quarter of a tile is cut from the patch of its closest corner and the quarters are only blended in a narrow band through the middle,
+  # so the edges only depend on their two corners and neighbors that share corners continue each other seamlessly.
+  size = tile_resolution
+  patches = [source[:, color * size * 2:(color + 1) * size * 2] for color in range(corner_colors)]
+  positions = (np.arange(size) + 0.5) / size
+  x_weights = [1 - get_tile_blend_weight(positions, blend_width), get_tile_blend_weight(positions, blend_width)]
+  tile_count = corner_colors ** 4
+  rows = tile_count // atlas_columns
+  atlas = np.zeros((rows * size, atlas_columns * size, source.shape[2]), dtype=np.float32)
+  for tile_idx in range(tile_count):
+    tile = np.zeros((size, size, source.shape[2]), dtype=np.float32)
+    for corner_idx, (corner_x, corner_y) in enumerate([(0, 0), (1, 0), (0, 1), (1, 1)]):
+      color = (tile_idx // corner_colors ** corner_idx) % corner_colors
+      piece = patches[color][(1 - corner_y) * size:(2 - corner_y) * size, (1 - corner_x) * size:(2 - corner_x) * size]
+      weight = x_weights[corner_y][:, None] * x_weights[corner_x][None, :]
+      tile += piece * weight[..., None]
+    row = tile_idx // atlas_columns
+    column = tile_idx % atlas_columns
+    atlas[row * size:(row + 1) * size, column * size:(column + 1) * size] = tile
+  return atlas
+
+
+def srgb_to_linear(pixels):
+  # Byte images store sRGB values, while baked float images are scene linear
+  result = pixels.copy()
+  rgb = pixels[..., :3]
+  result[..., :3] = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+  return result
+
+
+def get_luminance(pixels):
+  return pixels[..., 0] * 0.2126 + pixels[..., 1] * 0.7152 + pixels[..., 2] * 0.0722
+
+
+def sample_image(pixels, u, v, interpolation='Linear', extension='REPEAT'):
+  # Looks up the (h, w, 4) pixels at UV coordinates the same way an Image Texture node does. Cubic and Smart are sampled linearly.
+  height, width = pixels.shape[:2]
+
+  def fetch(x, y):
+    if extension == 'REPEAT':
+      return pixels[y % height, x % width]
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    result = pixels[np.clip(y, 0, height - 1), np.clip(x, 0, width - 1)]
+    if extension == 'CLIP':
+      result = result * inside[:, None]
+    return result
+
+  if interpolation == 'Closest':
+    return fetch(np.floor(u * width).astype(np.int64), np.floor(v * height).astype(np.int64))
+
+  x = u * width - 0.5
+  y = v * height - 0.5
+  x0 = np.floor(x).astype(np.int64)
+  y0 = np.floor(y).astype(np.int64)
+  fx = (x - x0)[:, None]
+  fy = (y - y0)[:, None]
+  bottom = fetch(x0, y0) * (1 - fx) + fetch(x0 + 1, y0) * fx
+  top = fetch(x0, y0 + 1) * (1 - fx) + fetch(x0 + 1, y0 + 1) * fx
+  return bottom * (1 - fy) + top * fy
+
+
+def resize_pixels(pixels, width, height):
+  # Box filters down close to the target size first so that sampling does not alias
+  while pixels.shape[0] >= height * 2 and pixels.shape[1] >= width * 2:
+    pixels = downsample_box(pixels)
+  v, u = np.meshgrid((np.arange(height) + 0.5) / height, (np.arange(width) + 0.5) / width, indexing='ij')
+  return sample_image(pixels, u.ravel(), v.ravel()).reshape(height, width, 4)
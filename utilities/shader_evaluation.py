@@ -0,0 +1,386 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+# Evaluates the math between the scatter sources and the outputs of a scatter node for many pixels at once,
+# so that adjustments like Cell HSV can be applied to resampled channels without baking them in Cycles.
+# Floats are arrays of shape (n,) and colors and vectors are arrays of shape (n, 3).
+
+# Scene linear luminance, which Cycles uses to convert colors to floats
+luminance_weights = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+class UnsupportedNodeError(Exception):
+  pass
+
+
+def to_array(value, count):
+  # Broadcasts the default value of a socket to every pixel
+  if np.ndim(value) == 0:
+    return np.full(count, value, dtype=np.float32)
+  return np.tile(np.asarray(tuple(value), dtype=np.float32)[:3], (count, 1))
+
+
+def convert(value, from_type, to_type):
+  is_vector = value.ndim == 2
+  if to_type in ['VALUE', 'INT', 'BOOLEAN']:
+    if not is_vector:
+      return value
+    if from_type == 'RGBA':
+      return value @ luminance_weights
+    return value.mean(axis=1)
+  if to_type in ['RGBA', 'VECTOR']:
+    return value if is_vector else np.repeat(value[:, None], 3, axis=1)
+  raise UnsupportedNodeError(f'{to_type} sockets are not supported')
+
+
+# Bob Jenkins' lookup3 hash as used by Cycles for the White Noise Texture
+def rotate_bits(x, k):
+  return (x << np.uint32(k)) | (x >> np.uint32(32 - k))
+
+
+def final_hash(a, b, c):
+  c ^= b; c -= rotate_bits(b, 14)
+  a ^= c; a -= rotate_bits(c, 11)
+  b ^= a; b -= rotate_bits(a, 25)
+  c ^= b; c -= rotate_bits(b, 16)
+  a ^= c; a -= rotate_bits(c, 4)
+  b ^= a; b -= rotate_bits(a, 14)
+  c ^= b; c -= rotate_bits(b, 24)
+  return c
+
+
+def mix_hash(a, b, c):
+  a -= c; a ^= rotate_bits(c, 4); c += b
+  b -= a; b ^= rotate_bits(a, 6); a += c
+  c -= b; c ^= rotate_bits(b, 8); b += a
+  a -= c; a ^= rotate_bits(c, 16); c += b
+  b -= a; b ^= rotate_bits(a, 19); a += c
+  c -= b; c ^= rotate_bits(b, 4); b += a
+  return a, b, c
+
+
+def hash_floats(*values):
+  # Hashes the bits of one to four floats into a float between 0 and 1
+  keys = [np.ascontiguousarray(x, dtype=np.float32).view(np.uint32) for x in values]
+  with np.errstate(over='ignore'):
+    start = np.full(keys[0].shape, 0xdeadbeef + (len(keys) << 2) + 13, dtype=np.uint32)
+    a, b, c = start.copy(), start.copy(), start.copy()
+    if len(keys) == 4:
+      a += keys[0]; b += keys[1]; c += keys[2]
+      a, b, c = mix_hash(a, b, c)
+      a += keys[3]
+    else:
+      for key, target in zip(keys, [a, b, c]):
+        target += key
+    return final_hash(a, b, c).astype(np.float64) / 0xFFFFFFFF
+
+
+def white_noise(vector, w, dimensions):
+  x, y, z = vector[:, 0], vector[:, 1], vector[:, 2]
+  ones = np.ones_like(w)
+  if dimensions == '1D':
+    keys = [[w], [w, ones], [w, ones * 2]]
+  elif dimensions == '2D':
+    keys = [[x, y], [x, y, ones], [x, y, ones * 2]]
+  elif dimensions == '3D':
+    keys = [[x, y, z], [x, y, z, ones], [x, y, z, ones * 2]]
+  else:
+    keys = [[x, y, z, w], [w, x, y, z], [z, w, x, y]]
+  color = np.stack([hash_floats(*x) for x in keys], axis=1).astype(np.float32)
+  return color[:, 0], color
+
+
+def rgb_to_hsv(rgb):
+  maximum = rgb.max(axis=1)
+  delta = maximum - rgb.min(axis=1)
+  saturation = np.where(maximum != 0, delta / np.where(maximum != 0, maximum, 1), 0)
+  safe_delta = np.where(delta != 0, delta, 1)
+  c = (maximum[:, None] - rgb) / safe_delta[:, None]
+  hue = np.where(rgb[:, 0] == maximum, c[:, 2] - c[:, 1], np.where(rgb[:, 1] == maximum, 2 + c[:, 0] - c[:, 2], 4 + c[:, 1] - c[:, 0]))
+  hue = hue / 6
+  hue = np.where(hue < 0, hue + 1, hue)
+  hue = np.where(saturation != 0, hue, 0)
+  return np.stack([hue, saturation, maximum], axis=1).astype(np.float32)
+
+
+def hsv_to_rgb(hsv):
+  hue, saturation, value = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+  hue = np.where(hue == 1, 0, hue) * 6
+  sector = np.floor(hue)
+  fraction = hue - sector
+  p = value * (1 - saturation)
+  q = value * (1 - saturation * fraction)
+  t = value * (1 - saturation * (1 - fraction))
+  choices = [
+    np.stack([value, t, p], axis=1), np.stack([q, value, p], axis=1), np.stack([p, value, t], axis=1),
+    np.stack([p, q, value], axis=1), np.stack([t, p, value], axis=1), np.stack([value, p, q], axis=1)
+  ]
+  rgb = np.select([sector[:, None] == x for x in range(5)], choices[:5], choices[5])
+  return np.where(saturation[:, None] != 0, rgb, value[:, None]).astype(np.float32)
+
+
+def adjust_hsv(color, hue, saturation, value, factor):
+  # The Hue/Saturation/Value node
+  hsv = rgb_to_hsv(color)
+  hsv[:, 0] = np.mod(hsv[:, 0] + hue + 0.5, 1)
+  hsv[:, 1] = np.clip(hsv[:, 1] * saturation, 0, 1)
+  hsv[:, 2] = hsv[:, 2] * value
+  result = factor[:, None] * hsv_to_rgb(hsv) + (1 - factor[:, None]) * color
+  return np.maximum(result, 0)
+
+
+def safe_divide(a, b):
+  return np.where(b != 0, a / np.where(b != 0, b, 1), 0)
+
+
+def safe_modulo(a, b):
+  return np.where(b != 0, np.fmod(a, np.where(b != 0, b, 1)), 0)
+
+
+math_operations = {
+  'ADD': lambda a, b, c: a + b,
+  'SUBTRACT': lambda a, b, c: a - b,
+  'MULTIPLY': lambda a, b, c: a * b,
+  'DIVIDE': lambda a, b, c: safe_divide(a, b),
+  'MULTIPLY_ADD': lambda a, b, c: a * b + c,
+  'POWER': lambda a, b, c: np.where(a >= 0, np.power(np.abs(a), b), 0),
+  'MINIMUM': lambda a, b, c: np.minimum(a, b),
+  'MAXIMUM': lambda a, b, c: np.maximum(a, b),
+  'LESS_THAN': lambda a, b, c: (a < b).astype(np.float32),
+  'GREATER_THAN': lambda a, b, c: (a > b).astype(np.float32),
+  'SIGN': lambda a, b, c: np.sign(a),
+  'ROUND': lambda a, b, c: np.floor(a + 0.5),
+  'FLOOR': lambda a, b, c: np.floor(a),
+  'CEIL': lambda a, b, c: np.ceil(a),
+  'FRACT': lambda a, b, c: a - np.floor(a),
+  'MODULO': lambda a, b, c: safe_modulo(a, b),
+  'FLOORED_MODULO': lambda a, b, c: np.where(b != 0, a - np.floor(safe_divide(a, b)) * b, 0),
+  'ABSOLUTE': lambda a, b, c: np.abs(a),
+  'SQRT': lambda a, b, c: np.sqrt(np.maximum(a, 0)),
+  'SINE': lambda a, b, c: np.sin(a),
+  'COSINE': lambda a, b, c: np.cos(a),
+}
+
+vector_operations = {
+  'ADD': lambda a, b, c, s: a + b,
+  'SUBTRACT': lambda a, b, c, s: a - b,
+  'MULTIPLY': lambda a, b, c, s: a * b,
+  'DIVIDE': lambda a, b, c, s: safe_divide(a, b),
+  'MULTIPLY_ADD': lambda a, b, c, s: a * b + c,
+  'SCALE': lambda a, b, c, s: a * s[:, None],
+  'MINIMUM': lambda a, b, c, s: np.minimum(a, b),
+  'MAXIMUM': lambda a, b, c, s: np.maximum(a, b),
+  'FLOOR': lambda a, b, c, s: np.floor(a),
+  'FRACTION': lambda a, b, c, s: a - np.floor(a),
+  'ABSOLUTE': lambda a, b, c, s: np.abs(a),
+}
+
+mix_blends = {
+  'MIX': lambda a, b: b,
+  'ADD': lambda a, b: a + b,
+  'SUBTRACT': lambda a, b: a - b,
+  'MULTIPLY': lambda a, b: a * b,
+}
+
+
+def mix_colors(blend_type, factor, a, b, use_clamp):
+  if blend_type not in mix_blends:
+    raise UnsupportedNodeError(f'{blend_type} mixing is not supported')
+  result = a + factor[:, None] * (mix_blends[blend_type](a, b) - a)
+  return np.clip(result, 0, 1) if use_clamp else result
+
+
+class ShaderEvaluator:
+  # leaves maps output sockets to the arrays they stand for, and group_inputs maps the names of the top level group inputs to their values
+  def __init__(self, leaves, group_inputs, count):
+    self.leaves = leaves
+    self.count = count
+    self.group_inputs = [group_inputs]
+    self.cache = [{}]
+
+  def evaluate(self, socket):
+    # Evaluates an input socket from whatever is linked to it
+    if not socket.is_linked:
+      if not hasattr(socket, 'default_value'):
+        raise UnsupportedNodeError(f'{socket.name} has no value')
+      return to_array(socket.default_value, self.count)
+    link = socket.links[0]
+    if link.is_muted:
+      raise UnsupportedNodeError('Muted links are not supported')
+    return convert(self.evaluate_output(link.from_node, link.from_socket), link.from_socket.type, socket.type)
+
+  def evaluate_output(self, node, socket):
+    for leaf, value in self.leaves.items():
+      if leaf == socket:
+        return value
+    if node.type == 'GROUP_INPUT':
+      if socket.name not in self.group_inputs[-1]:
+        raise UnsupportedNodeError(f'The {socket.name} input is linked')
+      return self.group_inputs[-1][socket.name]
+    key = node.name
+    if key not in self.cache[-1]:
+      self.cache[-1][key] = self.evaluate_node(node)
+    outputs = self.cache[-1][key]
+    return outputs[socket.name if node.type == 'GROUP' else list(node.outputs).index(socket)]
+
+  def evaluate_group(self, node):
+    node_tree = node.node_tree
+    group_output = next((x for x in node_tree.nodes if x.type == 'GROUP_OUTPUT' and x.is_active_output), None)
+    if not group_output:
+      raise UnsupportedNodeError(f'{node_tree.name} has no output')
+    self.group_inputs.append({x.name: self.evaluate(x) for x in node.inputs if x.type in ['VALUE', 'INT', 'BOOLEAN', 'RGBA', 'VECTOR']})
+    self.cache.append({})
+    try:
+      return {x.name: self.evaluate(group_output.inputs[x.name]) for x in node.outputs if x.name in group_output.inputs}
+    finally:
+      self.group_inputs.pop()
+      self.cache.pop()
+
+  def evaluate_node(self, node):
+    if node.mute:
+      raise UnsupportedNodeError(f'{node.name} is muted')
+    inputs = node.inputs
+    if node.type == 'GROUP':
+      return self.evaluate_group(node)
+    if node.type == 'REROUTE':
+      return [self.evaluate(inputs[0])]
+    if node.type in ['VALUE', 'RGB']:
+      return [to_array(node.outputs[0].default_value, self.count)]
+    if node.type == 'MATH':
+      if node.operation not in math_operations:
+        raise UnsupportedNodeError(f'{node.operation} is not supported')
+      result = math_operations[node.operation](*[self.evaluate(x) for x in list(inputs)[:3]])
+      return [np.clip(result, 0, 1) if node.use_clamp else result]
+    if node.type == 'VECT_MATH':
+      a, b, c = [self.evaluate(x) for x in list(inputs)[:3]]
+      if node.operation == 'DOT_PRODUCT':
+        return [np.zeros_like(a), (a * b).sum(axis=1)]
+      if node.operation == 'LENGTH':
+        return [np.zeros_like(a), np.sqrt((a * a).sum(axis=1))]
+      if node.operation == 'DISTANCE':
+        return [np.zeros_like(a), np.sqrt(((a - b) ** 2).sum(axis=1))]
+      if node.operation not in vector_operations:
+        raise UnsupportedNodeError(f'{node.operation} is not supported')
+      return [vector_operations[node.operation](a, b, c, self.evaluate(inputs['Scale'])), np.zeros(self.count, dtype=np.float32)]
+    if node.type == 'MIX_RGB':
+      return [mix_colors(node.blend_type, self.evaluate(inputs[0]), self.evaluate(inputs[1]), self.evaluate(inputs[2]), node.use_clamp)]
+    if node.type == 'MIX':
+      factor = self.evaluate(inputs[0])
+      if node.clamp_factor:
+        factor = np.clip(factor, 0, 1)
+      if node.data_type == 'FLOAT':
+        a, b = self.evaluate(inputs[2]), self.evaluate(inputs[3])
+        return [a + factor * (b - a), None, None]
+      if node.data_type != 'RGBA':
+        raise UnsupportedNodeError(f'{node.data_type} mixing is not supported')
+      return [None, None, mix_colors(node.blend_type, factor, self.evaluate(inputs[6]), self.evaluate(inputs[7]), node.clamp_result)]
+    if node.type == 'HUE_SAT':
+      return [adjust_hsv(self.evaluate(inputs['Color']), self.evaluate(inputs['Hue']), self.evaluate(inputs['Saturation']), self.evaluate(inputs['Value']), self.evaluate(inputs['Fac']))]
+    if node.type == 'INVERT':
+      color = self.evaluate(inputs['Color'])
+      return [color + self.evaluate(inputs['Fac'])[:, None] * (1 - 2 * color)]
+    if node.type == 'RGBTOBW':
+      return [self.evaluate(inputs[0]) @ luminance_weights]
+    if node.type in ['SEPRGB', 'SEPXYZ', 'SEPARATE_COLOR', 'SEPHSV']:
+      value = self.evaluate(inputs[0])
+      if node.type == 'SEPHSV' or (node.type == 'SEPARATE_COLOR' and node.mode == 'HSV'):
+        value = rgb_to_hsv(value)
+      elif node.type == 'SEPARATE_COLOR' and node.mode != 'RGB':
+        raise UnsupportedNodeError(f'{node.mode} colors are not supported')
+      return [value[:, 0], value[:, 1], value[:, 2]] + ([np.ones(self.count, dtype=np.float32)] if node.type == 'SEPRGB' and len(node.outputs) > 3 else [])
+    if node.type in ['COMBRGB', 'COMBXYZ', 'COMBINE_COLOR', 'COMBHSV']:
+      value = np.stack([self.evaluate(x) for x in list(inputs)[:3]], axis=1)
+      if node.type == 'COMBHSV' or (node.type == 'COMBINE_COLOR' and node.mode == 'HSV'):
+        value = hsv_to_rgb(value)
+      elif node.type == 'COMBINE_COLOR' and node.mode != 'RGB':
+        raise UnsupportedNodeError(f'{node.mode} colors are not supported')
+      return [value]
+    if node.type == 'CLAMP':
+      value, low, high = [self.evaluate(inputs[x]) for x in ['Value', 'Min', 'Max']]
+      if node.clamp_type == 'RANGE':
+        low, high = np.minimum(low, high), np.maximum(low, high)
+      return [np.minimum(np.maximum(value, low), high)]
+    if node.type == 'MAP_RANGE' and node.data_type == 'FLOAT' and node.interpolation_type in ['LINEAR', 'SMOOTHSTEP']:
+      value, from_min, from_max, to_min, to_max = [self.evaluate(inputs[x]) for x in ['Value', 'From Min', 'From Max', 'To Min', 'To Max']]
+      factor = safe_divide(value - from_min, from_max - from_min)
+      if node.interpolation_type == 'SMOOTHSTEP':
+        factor = np.clip(factor, 0, 1)
+        factor = factor * factor * (3 - 2 * factor)
+      result = to_min + factor * (to_max - to_min)
+      if node.clamp and node.interpolation_type == 'LINEAR':
+        result = np.clip(result, np.minimum(to_min, to_max), np.maximum(to_min, to_max))
+      return [result] + [None] * (len(node.outputs) - 1)
+    if node.type == 'TEX_WHITE_NOISE':
+      w = self.evaluate(inputs['W']) if node.noise_dimensions in ['1D', '4D'] else np.zeros(self.count, dtype=np.float32)
+      vector = self.evaluate(inputs['Vector']) if node.noise_dimensions != '1D' else np.zeros((self.count, 3), dtype=np.float32)
+      return list(white_noise(vector, w, node.noise_dimensions))
+    raise UnsupportedNodeError(f'{node.bl_idname} nodes are not supported')
+
+
+def is_group_input(socket, name):
+  links = socket.links
+  return bool(links) and links[0].from_node.type == 'GROUP_INPUT' and links[0].from_socket.name == name
+
+
+def get_source_selection(scatter_source):
+  # Follows the mix chain of a scatter source from its color result back to the first image.
+  # Each mix switches to its own image where the random value is greater than its threshold.
+  # Returns the image nodes with their thresholds, or None when the chain is not one that the resampler can rebuild
+  nodes = scatter_source.node_tree.nodes
+  if 'Color Result' not in nodes:
+    return None
+  socket = nodes['Color Result'].inputs[0]
+  selection = []
+  while socket.links:
+    node = socket.links[0].from_node
+    if node.type == 'TEX_IMAGE':
+      if socket.links[0].from_socket.name != 'Color' or not is_group_input(node.inputs[0], 'Vector'):
+        return None
+      selection.append((node, None))
+      return selection[::-1]
+    if node.type != 'MIX_RGB' or node.blend_type != 'MIX' or node.mute or not node.inputs[0].links or not node.inputs[2].links:
+      return None
+    greater = node.inputs[0].links[0].from_node
+    image_node = node.inputs[2].links[0].from_node
+    if greater.type != 'MATH' or greater.operation != 'GREATER_THAN' or greater.mute or not is_group_input(greater.inputs[0], 'Random Color'):
+      return None
+    if image_node.type != 'TEX_IMAGE' or node.inputs[2].links[0].from_socket.name != 'Color' or not is_group_input(image_node.inputs[0], 'Vector'):
+      return None
+    try:
+      threshold = float(ShaderEvaluator({}, {}, 1).evaluate(greater.inputs[1])[0])
+    except UnsupportedNodeError:
+      return None
+    selection.append((image_node, threshold))
+    socket = node.inputs[1]
+  return None
+
+
+def select_source_images(selection, random):
+  # Later mixes override earlier ones, just like the chain does
+  image_indices = np.zeros(len(random), dtype=np.int64)
+  for image_idx, (image_node, threshold) in enumerate(selection):
+    if threshold is not None:
+      image_indices = np.where(random > threshold, image_idx, image_indices)
+  return image_indices
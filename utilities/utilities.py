@@ -99,26 +99,57 @@ def create_friendly_name(context, texture_name):
     return 'Image'
 
 
+def is_scatter_source(node):
+  if node.type != 'GROUP' or not node.node_tree:
+    return False
+  name = node.node_tree.name
+  return node_tree_names['scatter_source'] in name or prev_node_tree_names['scatter_source'] in name
+
+
+def get_node_scatter_sources(group_node):
+  scatter_sources = []
+  if group_node.type == 'GROUP' and group_node.node_tree:
+    for node in group_node.node_tree.nodes:
+      if is_scatter_source(node):
+        scatter_sources.append(node)
+      elif node.type == 'GROUP' and node.node_tree and 'Scatter' in node.node_tree.name:
+        for inner_node in node.node_tree.nodes:
+          if is_scatter_source(inner_node):
+            scatter_sources.append(inner_node)
+  return scatter_sources
+
+
 def get_scatter_sources(selected_nodes):
   scatter_sources = []
   if selected_nodes:
     nodes = selected_nodes[0].id_data.nodes
     selected_group_nodes = [x for x in nodes if x.select and x.type == 'GROUP']
     for group_node in selected_group_nodes:
-      for node in group_node.node_tree.nodes:
-        if node.type == 'GROUP' and node.node_tree:
-          name = node.node_tree.name
-          if node_tree_names['scatter_source'] in name or prev_node_tree_names['scatter_source'] in name:
-            scatter_sources.append(node)
-          elif 'Scatter' in node.node_tree.name:
-            for inner_node in node.node_tree.nodes:
-              if inner_node.type == 'GROUP' and inner_node.node_tree:
-                inner_name = inner_node.node_tree.name
-                if node_tree_names['scatter_source'] in inner_name or prev_node_tree_names['scatter_source'] in inner_name:
-                  scatter_sources.append(inner_node)
+      scatter_sources.extend(get_node_scatter_sources(group_node))
   return scatter_sources
 
 
+def get_active_scatter_node(context):
+  # Prefers the active node when several scatter nodes are selected
+  scatter_nodes = [x for x in context.selected_nodes if get_node_scatter_sources(x)]
+  if context.active_node in scatter_nodes:
+    return context.active_node
+  return scatter_nodes[0] if scatter_nodes else None
+
+
+def get_material_scatter_nodes(material):
+  # Unlike get_scatter_sources, this does not depend on the node selection
+  if not material or not material.node_tree:
+    return []
+  return [x for x in material.node_tree.nodes if get_node_scatter_sources(x)]
+
+
+def get_node_tree_material(node_tree):
+  for material in bpy.data.materials:
+    if material.node_tree == node_tree:
+      return material
+
+
 def get_groups(nodes):
     # Could be changed to use recursion
     groups = []
@@ -141,7 +172,8 @@ def get_baked_sources(selected_nodes):
   baked_nodes = []
   if selected_nodes:
     for node in selected_nodes:
-      if node.bl_idname == 'ShaderNodeGroup' and get_scatter_sources([node]) and 'TEX_IMAGE' in [x.type for x in node.node_tree.nodes]:
+      baked_types = ['TEX_IMAGE', 'VERTEX_COLOR']
+      if node.bl_idname == 'ShaderNodeGroup' and get_node_scatter_sources(node) and any(x.type in baked_types for x in node.node_tree.nodes):
         baked_nodes.append(node)
   return baked_nodes
 
@@ -181,6 +213,91 @@ def is_shader(node):
   return node.bl_idname in shader_types
 
 
+def copy_node(nodes, node):
+  # Copies the settings and unlinked input values of a node, which bpy.ops.node.duplicate can only do from the node editor
+  new_node = nodes.new(node.bl_idname)
+  for prop in node.bl_rna.properties:
+    if prop.is_readonly or prop.identifier in ['name', 'select', 'parent']:
+      continue
+    try:
+      setattr(new_node, prop.identifier, getattr(node, prop.identifier))
+    except (AttributeError, TypeError, ValueError):
+      pass
+  for input, new_input in zip(node.inputs, new_node.inputs):
+    if hasattr(input, 'default_value'):
+      new_input.default_value = input.default_value
+  # The ramp of a Color Ramp node is read only, so its elements are copied one by one
+  if node.type == 'VALTORGB':
+    copy_color_ramp(node.color_ramp, new_node.color_ramp)
+  return new_node
+
+
+def copy_color_ramp(color_ramp, new_color_ramp):
+  for prop in ['color_mode', 'hue_interpolation', 'interpolation']:
+    setattr(new_color_ramp, prop, getattr(color_ramp, prop))
+  while len(new_color_ramp.elements) > len(color_ramp.elements):
+    new_color_ramp.elements.remove(new_color_ramp.elements[-1])
+  while len(new_color_ramp.elements) < len(color_ramp.elements):
+    new_color_ramp.elements.new(1)
+  for element, new_element in zip(color_ramp.elements, new_color_ramp.elements):
+    new_element.position = element.position
+    new_element.color = element.color
+
+
+def get_downstream_nodes(sockets):
+  # Every node fed by the sockets, stopping at shaders and outputs
+  downstream_nodes = []
+  to_check = [link.to_node for socket in sockets for link in socket.links]
+  while to_check:
+    node = to_check.pop()
+    if node in downstream_nodes or not node.outputs or [x for x in node.outputs if x.type == 'SHADER']:
+      continue
+    downstream_nodes.append(node)
+    to_check.extend([link.to_node for output in node.outputs for link in output.links])
+  return downstream_nodes
+
+
+def duplicate_branch(node_tree, socket_pairs, factor_socket, offset=(0, -1000)):
+  # Evaluates everything fed by the first socket of each pair a second time from the second socket,
+  # then mixes the two results by the factor wherever they leave the branch. A factor from inside the branch
+  # is taken from the second evaluation.
+  nodes = node_tree.nodes
+  links = node_tree.links
+  branch = get_downstream_nodes([x[0] for x in socket_pairs])
+  copies = [copy_node(nodes, x) for x in branch]
+
+  def get_copied_socket(from_socket):
+    for socket, replacement in socket_pairs:
+      if from_socket == socket:
+        return replacement
+    if from_socket.node in branch:
+      copy = copies[branch.index(from_socket.node)]
+      return copy.outputs[list(from_socket.node.outputs).index(from_socket)]
+    return from_socket
+
+  for node, copy in zip(branch, copies):
+    copy.location = [node.location[0] + offset[0], node.location[1] + offset[1]]
+    for input, copy_input in zip(node.inputs, copy.inputs):
+      if input.links:
+        links.new(get_copied_socket(input.links[0].from_socket), copy_input)
+
+  mix_nodes = []
+  for node, copy in zip(branch, copies):
+    for output, copy_output in zip(node.outputs, copy.outputs):
+      to_sockets = [x.to_socket for x in output.links if x.to_node not in branch]
+      if not to_sockets:
+        continue
+      mix = nodes.new('ShaderNodeMixRGB')
+      mix.location = [node.location[0] + 250, node.location[1] + offset[1] / 2]
+      links.new(get_copied_socket(factor_socket), mix.inputs[0])
+      links.new(copy_output, mix.inputs[1])
+      links.new(output, mix.inputs[2])
+      for to_socket in to_sockets:
+        links.new(mix.outputs[0], to_socket)
+      mix_nodes.append(mix)
+  return mix_nodes
+
+
 def name_array_to_string(name_array):
   name_string = ''
   for name in name_array:
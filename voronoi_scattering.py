@@ -23,6 +23,7 @@ along with this program; if not, see <https://www.gnu.org/licenses/>.
 
 
 import bpy
+from math import sqrt
 from random import random
 from pprint import pprint
 from bpy.types import (Object, Operator)
@@ -31,9 +32,44 @@ from . import defaults
 from .defaults import data_channels, detail_channels, data_color_spaces, section_labels, node_tree_names
 from .noise_blending import noise_blend
 from .unscatter import extract_images
-from .utilities.utilities import append_node, create_friendly_name, average_location, remove_section, get_scatter_sources, mode_toggle, get_groups
+from .shader_lod import clear_shader_lods, add_distance_lod, add_light_path_switch
+from .triplanar_mapping import add_smooth_triplanar_node, blend_triplanar_projections
+from .osl_scatter import create_osl_scatter_node
+from .channel_packing import pack_scatter_sources
+from .grid_cells import use_grid_cells, replace_voronoi, get_grid_cells_tree, get_hex_tiling_tree, get_shared_cells_tree, add_math_node
+from .utilities.utilities import append_node, create_friendly_name, average_location, remove_section, get_scatter_sources, mode_toggle, get_groups, duplicate_branch
 from .utilities.node_interface import get_io_sockets, create_socket, remove_socket, get_socket, move_socket
 
+def get_suggested_overlap_cells():
+  # How far a texture can reach from the center of its cell, in cells, with the default Overlapping Alpha values.
+  # Within half a cell it never leaves its own cell, and within one cell it only reaches the near half of its neighbors.
+  values = {**defaults.layering.get('common', {}), **defaults.layering.get('overlapping', {})}
+  location = max([values.get(x, 0) for x in ['Random Texture Location', 'Random Texture Location X', 'Random Texture Location Y']])
+  size = (1 + values.get('Random Texture Scale', 0)) / max(values.get('Texture Scale', 1), 0.001)
+  reach = 0.5 * values.get('Random Cell Shape', 1) + 0.5 * location + sqrt(2) * 0.5 * size
+  if reach <= 0.5:
+    return 1
+  elif reach <= 1:
+    return 4
+  return 9
+
+def get_overlap_cell_count(self):
+  return int(self.overlap_cells)
+
+def get_overlap_cells_items():
+  # The suggested count is only marked, so the Scatter Overlapping tree is kept unless a count is picked
+  suggested = get_suggested_overlap_cells()
+  items = [
+    ("1", "1", "Only the closest cell, so textures are clipped at the cell edges like Interspersed Alpha"),
+    ("4", "4", "The cell and the three neighbors on the side of the cell that the point is on. Textures can reach up to one cell from the center of their cell. Needs Square Grid cells, otherwise only the closest cell is searched"),
+    ("9", "9", "The cell and all eight of its neighbors using the Scatter Overlapping node. Textures can reach up to one and a half cells from the center of their cell")
+  ]
+  return [(x[0], x[1] + " (Suggested)" if int(x[0]) == suggested else x[1], x[2]) for x in items]
+
+def uses_overlapping_tree(self):
+  # Only searching all nine cells uses the Scatter Overlapping tree. Fewer cells are built on top of Interspersed Alpha.
+  return self.layering == 'overlapping' and get_overlap_cell_count(self) == 9
+
 def sort_textures(self, context, selected_nodes):
   textures = [x for x in selected_nodes if x.type == 'TEX_IMAGE' and x.image]
   sorted_textures = {
@@ -63,16 +99,17 @@ def sort_textures(self, context, selected_nodes):
     if sorted_textures[map_type] != []:
       filtered_textures[map_type] = sorted_textures[map_type]
 
-  if self.layering == 'overlapping' and len(selected_nodes) > 4:
+  if self.layering == 'overlapping' and get_overlap_cell_count(self) > 1 and len(selected_nodes) > 4:
     self.report({'WARNING'},
-      'Each texture must be computed 9 times for the overlapping method. Compilation may be slow. Try simple layering for faster renders'
+      'Each texture must be computed %d times for the overlapping method. Compilation may be slow. Try simple layering for faster renders'
+      %(get_overlap_cell_count(self))
     )
   return filtered_textures
 
 def append_scatter_node(self, context, selected_nodes):
   nodes = selected_nodes[0].id_data.nodes
   selected_textures = [x for x in selected_nodes if x.type == 'TEX_IMAGE']
-  if self.layering == 'overlapping':
+  if uses_overlapping_tree(self):
     scatter_node = append_node(self, nodes, node_tree_names['scatter_overlapping'])
   else:
     scatter_node = append_node(self, nodes, node_tree_names['scatter'])
@@ -126,7 +163,7 @@ def create_scatter_sources(self, scatter_node, sorted_textures, transparency):
       # Normal maps only work with Linear interpolation as of Blender 3.0 Alpha
       # It causes bad smoothing around tri-planar blending but can't be used at all by the overlapping method
       # https://developer.blender.org/T92589
-      if channel == 'Normal' and self.layering != 'overlapping':
+      if channel == 'Normal' and not uses_overlapping_tree(self):
         image_node.interpolation = 'Linear'
       else:
         image_node.interpolation = self.texture_interpolation
@@ -223,7 +260,7 @@ def create_scatter_sources(self, scatter_node, sorted_textures, transparency):
         scatter_source_outputs[0].name = channel
         connect_scatter_source(scatter_source, channel)
         scatter_sources[channel].append(scatter_source)
-    elif self.layering == 'overlapping':
+    elif uses_overlapping_tree(self):
       scatter_source = nodes['Scatter Source']
       scatter_source.node_tree = bpy.data.node_groups[node_tree_names['scatter_source_empty']].copy()
       image_nodes = setup_image_nodes(scatter_source, channel, sorted_textures[channel])
@@ -276,19 +313,125 @@ def blend_colors(self, scatter_node, scatter_sources):
     for input_name in blending_inputs:
       links.new(nodes['Group Input'].outputs["Mix Noise " + input_name], blending_node.inputs['Noise ' + input_name])
     return blending_results
-  elif self.layering != 'overlapping':
+  elif not uses_overlapping_tree(self):
     for input_name in blending_inputs:
       remove_socket(scatter_node.node_tree, 'INPUT', "Mix Noise " + input_name)
     return color_results
   else:
     return color_results
 
+def get_random_adjustments_tree():
+  # Turns one random color into the hue, saturation, and value changes of every color channel and into three centered
+  # offsets that the data channels take turns using
+  name = node_tree_names['random_adjustments']
+  if name in bpy.data.node_groups:
+    return bpy.data.node_groups[name]
+  node_tree = bpy.data.node_groups.new(name, 'ShaderNodeTree')
+  create_socket(node_tree, 'INPUT', 'NodeSocketColor', 'Random')
+  for input_name in ['Hue', 'Saturation', 'Value']:
+    create_socket(node_tree, 'INPUT', 'NodeSocketFloat', input_name)
+    create_socket(node_tree, 'OUTPUT', 'NodeSocketFloat', input_name)
+  for output_name in ['Offset X', 'Offset Y', 'Offset Z']:
+    create_socket(node_tree, 'OUTPUT', 'NodeSocketFloat', output_name)
+  nodes = node_tree.nodes
+  links = node_tree.links
+  input_node = nodes.new('NodeGroupInput')
+  input_node.location = [-800, 0]
+  output_node = nodes.new('NodeGroupOutput')
+  output_node.location = [400, 0]
+  separate = nodes.new('ShaderNodeSeparateXYZ')
+  separate.location = [-400, 0]
+  links.new(add_math_node(node_tree, 'ShaderNodeVectorMath', 'SUBTRACT', [input_node.outputs['Random'], (0.5, 0.5, 0.5)], [-600, 0]), separate.inputs[0])
+  for offset_idx, output_name in enumerate(['Offset X', 'Offset Y', 'Offset Z']):
+    links.new(separate.outputs[offset_idx], output_node.inputs[output_name])
+
+  # Hue wraps around 0.5, while saturation and value are multiplied by up to twice the amount either way
+  hue = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY_ADD', [separate.outputs[0], input_node.outputs['Hue'], 0.5], [-200, 200])
+  links.new(hue, output_node.inputs['Hue'])
+  for offset_idx, input_name in [(1, 'Saturation'), (2, 'Value')]:
+    amount = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY', [input_node.outputs[input_name], 2], [-200, -200 * offset_idx])
+    factor = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY_ADD', [separate.outputs[offset_idx], amount, 1], [0, -200 * offset_idx])
+    links.new(factor, output_node.inputs[input_name])
+  return node_tree
+
+def get_shared_random_node(scatter_node, name, random_socket, amount_names):
+  # Every channel reads from the same adjustments node, so its random field is only evaluated once
+  nodes = scatter_node.node_tree.nodes
+  if name in nodes:
+    return nodes[name]
+  random_node = nodes.new('ShaderNodeGroup')
+  random_node.node_tree = get_random_adjustments_tree()
+  random_node.name = name
+  random_node.label = name
+  random_node.location = [random_socket.node.location[0] + 250, random_socket.node.location[1] - 400]
+  links = scatter_node.node_tree.links
+  links.new(random_socket, random_node.inputs['Random'])
+  group_inputs = nodes['Group Input'].outputs
+  for input_name, amount_name in zip(['Hue', 'Saturation', 'Value'], amount_names):
+    if amount_name in group_inputs:
+      links.new(group_inputs[amount_name], random_node.inputs[input_name])
+  return random_node
+
+def add_channel_random(scatter_node, node_type, name, vector_socket, channel):
+  # A 4D texture with the channel index as W gives every data channel its own value from the same shared input
+  nodes = scatter_node.node_tree.nodes
+  if name in nodes:
+    return nodes[name]
+  random_node = nodes.new(node_type)
+  random_node.name = name
+  random_node.label = name
+  random_node.noise_dimensions = '4D'
+  random_node.inputs['W'].default_value = data_channels.index(channel)
+  random_node.location = [vector_socket.node.location[0] + 250, vector_socket.node.location[1] - 600 - 200 * data_channels.index(channel)]
+  scatter_node.node_tree.links.new(vector_socket, random_node.inputs['Vector'])
+  return random_node
+
+def add_random_adjustment(scatter_node, random_socket, color_output, channel, amount_socket=None):
+  # Color channels take hue, saturation and value factors from a shared adjustments node,
+  # while data channels get a value between 0 and 1 of their own that is centered and scaled by the amount
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  location = [color_output.node.location[0] + 250, color_output.node.location[1]]
+  if channel in data_channels:
+    offset = add_math_node(scatter_node.node_tree, 'ShaderNodeMath', 'SUBTRACT', [random_socket, 0.5], [location[0] - 150, location[1] - 200])
+    adjusted_output = add_math_node(scatter_node.node_tree, 'ShaderNodeMath', 'MULTIPLY_ADD', [offset, amount_socket, color_output], location)
+    adjusted_output.node.use_clamp = True
+  else:
+    random_node = random_socket.node
+    hsv_node = nodes.new('ShaderNodeHueSaturation')
+    hsv_node.location = location
+    for input_name in ['Hue', 'Saturation', 'Value']:
+      links.new(random_node.outputs[input_name], hsv_node.inputs[input_name])
+    links.new(color_output, hsv_node.inputs['Color'])
+    adjusted_output = hsv_node.outputs[0]
+  links.new(adjusted_output, nodes['Group Output'].inputs[channel])
+  return adjusted_output.node
+
 def randomize_cell_colors(self, context, scatter_node, scatter_sources, prev_outputs):
   nodes = scatter_node.node_tree.nodes
   links = scatter_node.node_tree.links
   inputs = get_io_sockets(scatter_node.node_tree, 'INPUT')
   color_results = {}
 
+  def create_shared_randomize_node(prev_output, channel):
+    # White noise of the cell's random color gives the color channels the same random vector per cell.
+    # Data channels hash the cell's random color together with their channel index instead.
+    if channel in data_channels:
+      random_node = add_channel_random(scatter_node, 'ShaderNodeTexWhiteNoise', channel + ' Cell Random', nodes['Scatter Coordinates'].outputs['Random Color'], channel)
+      return add_random_adjustment(scatter_node, random_node.outputs['Value'], prev_output, channel, nodes['Group Input'].outputs['Random Cell ' + channel])
+    random_node = get_shared_random_node(scatter_node, 'Shared Cell Random', get_cell_random(), ['Random Cell Hue', 'Random Cell Saturation', 'Random Cell Value'])
+    return add_random_adjustment(scatter_node, random_node.outputs['Hue'], prev_output, channel)
+
+  def get_cell_random():
+    if 'Cell Random' in nodes:
+      return nodes['Cell Random'].outputs['Color']
+    white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+    white_noise.name = 'Cell Random'
+    white_noise.noise_dimensions = '3D'
+    white_noise.location = [nodes['Scatter Coordinates'].location[0] + 250, nodes['Scatter Coordinates'].location[1] - 400]
+    links.new(nodes['Scatter Coordinates'].outputs['Random Color'], white_noise.inputs['Vector'])
+    return white_noise.outputs['Color']
+
   def create_randomize_node(prev_node, scatter_source, channel):
     if channel in data_channels:
       randomize_node = append_node(self, nodes, node_tree_names['randomize_cell_value'])
@@ -326,31 +469,34 @@ def randomize_cell_colors(self, context, scatter_node, scatter_sources, prev_out
       remove_socket(scatter_node.node_tree, 'INPUT', 'Random Cell Saturation')
       remove_socket(scatter_node.node_tree, 'INPUT', 'Random Cell Value')
 
-  if self.use_random_col and self.layering != 'overlapping':
+  if self.use_random_col and not uses_overlapping_tree(self):
     channels = [*prev_outputs]
     for channel in channels:
       color_results[channel] = []
       for output_idx, output in enumerate(prev_outputs[channel]):
         if channel != 'Normal' and channel != 'Displacement':
           scatter_source = scatter_sources[channel][output_idx]
-          randomize_node = create_randomize_node(output.node, scatter_source, channel)
+          if self.use_shared_random:
+            randomize_node = create_shared_randomize_node(output, channel)
+          else:
+            randomize_node = create_randomize_node(output.node, scatter_source, channel)
           color_results[channel].append(randomize_node.outputs[0])
         else:
           color_results[channel].append(output)
     remove_unused_inputs()
 
-  elif not self.use_random_col and self.layering != 'overlapping':
+  elif not self.use_random_col and not uses_overlapping_tree(self):
     for channel in prev_outputs:
       color_results[channel] = []
       for output in prev_outputs[channel]:
         color_results[channel].append(output)
     remove_unused_inputs()
 
-  elif self.use_random_col and self.layering == 'overlapping':
+  elif self.use_random_col and uses_overlapping_tree(self):
     color_results['Image'] = []
     color_results['Image'].append(nodes['Color Output'].outputs[0])
 
-  elif not self.use_random_col and self.layering == 'overlapping':
+  elif not self.use_random_col and uses_overlapping_tree(self):
     color_results['Image'] = []
     color_results['Image'].append(nodes['Color Result'].outputs[0])
     nodes['Randomize Cell HSV'].mute = True
@@ -367,6 +513,30 @@ def randomize_texture_colors(self, context, scatter_node, scatter_sources, prev_
   group_inputs = nodes['Group Input'].outputs
   color_results = {}
 
+  def create_shared_randomize_hsv(color_output, channel):
+    # One noise texture drives every color channel. Each data channel reads the same scaled coordinates
+    # at its own W offset with its own noise settings.
+    if channel in data_channels:
+      noise = add_channel_random(scatter_node, 'ShaderNodeTexNoise', channel + ' Noise Field', nodes['Scaled Coordinates'].outputs[0], channel)
+      links.new(group_inputs[channel + ' Noise Scale'], noise.inputs['Scale'])
+      links.new(group_inputs[channel + ' Noise Detail'], noise.inputs['Detail'])
+      links.new(group_inputs[channel + ' Noise Warp'], noise.inputs['Distortion'])
+      return add_random_adjustment(scatter_node, noise.outputs['Fac'], color_output, channel, group_inputs[channel + ' Noise'])
+    random_node = get_shared_random_node(scatter_node, 'Shared Noise Random', get_noise_field(), ['Hue Noise', 'Saturation Noise', 'Value Noise'])
+    return add_random_adjustment(scatter_node, random_node.outputs['Hue'], color_output, channel)
+
+  def get_noise_field():
+    if 'Noise Field' in nodes:
+      return nodes['Noise Field'].outputs['Color']
+    noise = nodes.new('ShaderNodeTexNoise')
+    noise.name = 'Noise Field'
+    noise.location = [nodes['Scaled Coordinates'].location[0] + 250, nodes['Scaled Coordinates'].location[1] - 400]
+    links.new(nodes['Scaled Coordinates'].outputs[0], noise.inputs['Vector'])
+    links.new(group_inputs['Color Noise Scale'], noise.inputs['Scale'])
+    links.new(group_inputs['Color Noise Detail'], noise.inputs['Detail'])
+    links.new(group_inputs['Color Noise Warp'], noise.inputs['Distortion'])
+    return noise.outputs['Color']
+
   def create_randomize_hsv(color_output, channel):
     if channel in data_channels:
       randomize_node = append_node(self, nodes, node_tree_names['randomize_noise_value'])
@@ -393,7 +563,7 @@ def randomize_texture_colors(self, context, scatter_node, scatter_sources, prev_
     return randomize_node
 
   def remove_unused_inputs():
-    if self.use_noise_col and self.layering != 'overlapping':
+    if self.use_noise_col and not uses_overlapping_tree(self):
       channels = scatter_sources.keys()
       for value_channel in data_channels:
         if value_channel not in channels and value_channel != 'Displacement':
@@ -409,7 +579,7 @@ def randomize_texture_colors(self, context, scatter_node, scatter_sources, prev_
         remove_socket(scatter_node.node_tree, 'INPUT', 'Color Noise Detail')
         remove_socket(scatter_node.node_tree, 'INPUT', 'Color Noise Warp')
     else:
-      if self.layering != 'overlapping':
+      if not uses_overlapping_tree(self):
         channels = ['Alpha', 'AO', 'Bump', 'Glossiness', 'Metallic', 'Roughness', 'Specular']
         for channel in channels:
             remove_socket(scatter_node.node_tree, 'INPUT', channel + " Noise")
@@ -423,23 +593,26 @@ def randomize_texture_colors(self, context, scatter_node, scatter_sources, prev_
       remove_socket(scatter_node.node_tree, 'INPUT', 'Color Noise Detail')
       remove_socket(scatter_node.node_tree, 'INPUT', 'Color Noise Warp')
 
-  if self.use_noise_col and self.layering != 'overlapping':
+  if self.use_noise_col and not uses_overlapping_tree(self):
     channels = [*prev_outputs]
     for channel in channels:
       color_results[channel] = []
       for color_output in prev_outputs[channel]:
         if channel != 'Normal' and channel != 'Displacement':
-          randomize_node = create_randomize_hsv(color_output, channel)
+          if self.use_shared_random:
+            randomize_node = create_shared_randomize_hsv(color_output, channel)
+          else:
+            randomize_node = create_randomize_hsv(color_output, channel)
           color_results[channel].append(randomize_node.outputs[0])
         else:
           color_results[channel].append(color_output)
     remove_unused_inputs()
 
-  elif not self.use_noise_col and self.layering != 'overlapping':
+  elif not self.use_noise_col and not uses_overlapping_tree(self):
     color_results = prev_outputs
     remove_unused_inputs()
 
-  elif self.use_noise_col and self.layering == 'overlapping':
+  elif self.use_noise_col and uses_overlapping_tree(self):
     color_results['Image'] = []
     if not self.use_random_col:
       links.new(nodes['Color Result'].outputs[0], nodes['Randomize Texture HSV'].inputs[0])
@@ -450,7 +623,7 @@ def randomize_texture_colors(self, context, scatter_node, scatter_sources, prev_
     links.new(group_inputs['Color Noise Detail'], nodes['Randomize Texture HSV'].inputs['Noise Detail'])
     links.new(group_inputs['Color Noise Warp'], nodes['Randomize Texture HSV'].inputs['Noise Warp'])
 
-  elif not self.use_noise_col and self.layering == 'overlapping':
+  elif not self.use_noise_col and uses_overlapping_tree(self):
     color_results['Image'] = []
     nodes['Randomize Texture HSV'].mute = True
     remove_unused_inputs()
@@ -541,7 +714,7 @@ def manage_alpha(self, scatter_node, scatter_sources, color_results, transparenc
       else:
         new_input.default_value = [0.5, 0.5, 1, 1]
 
-  if transparency and self.layering != 'overlapping':
+  if transparency and not uses_overlapping_tree(self):
     for channel_idx, channel in enumerate(color_results.keys()):
       for output_idx, output in enumerate(color_results[channel]):
         mix_background(channel, output)
@@ -571,22 +744,30 @@ def cleanup_layering(self, scatter_node, scatter_sources):
       output_count = len(outputs)
       move_socket(scatter_node.node_tree, 'OUTPUT', outputs[0], output_count - 1)
 
-  if (self.layering == 'simple' or self.layering == 'simple_alpha' or self.layering == 'layered') and self.use_pbr:
+  if (self.layering == 'simple' or self.layering == 'hex_tiling' or self.layering == 'simple_alpha' or self.layering == 'layered') and self.use_pbr:
     outputs = get_io_sockets(scatter_node.node_tree, 'OUTPUT')
     output_count = len(outputs)
     move_socket(scatter_node.node_tree, 'OUTPUT', outputs[1], output_count - 1)
 
-  if self.layering != 'layered' and self.layering != 'overlapping':
+  if self.layering != 'layered' and not uses_overlapping_tree(self):
     remove_section(nodes, 'Randomize Layers')
     links.new(nodes['Warped Coordinates'].outputs[0], nodes['Scatter Coordinates'].inputs['Vector'])
 
   # Optimize random locations to avoid clipping
-  if self.layering != 'overlapping':
+  if not uses_overlapping_tree(self):
     nodes['Scatter Coordinates'].node_tree.nodes['Location Origin'].inputs[1].default_value = [0.5, 0.5, 0]
-  if self.layering == 'simple' or self.layering == 'blended':
+  if self.layering == 'simple' or self.layering == 'blended' or self.layering == 'hex_tiling':
     nodes['Scatter Coordinates'].node_tree.nodes['Location Range X'].inputs['To Max'].default_value = 3
     nodes['Scatter Coordinates'].node_tree.nodes['Location Range Y'].inputs['To Max'].default_value = 3
 
+def use_dithered_blending(self):
+  # Smooth blending needs the texture lookups and the second closest Voronoi cell, so anything else always dithers.
+  # Hex tiling blends on its own.
+  return self.use_edge_blur and self.layering != 'hex_tiling' and (
+    self.cell_blend_method == 'dither' or self.layering in ['coordinates', 'overlapping'] or self.cell_engine != 'voronoi'
+    or (self.layering == 'layered' and self.use_shared_cells)
+  )
+
 def cleanup_options(self, scatter_node, scatter_coordinates):
   nodes = scatter_node.node_tree.nodes
   links = scatter_node.node_tree.links
@@ -600,8 +781,9 @@ def cleanup_options(self, scatter_node, scatter_coordinates):
     nodes.remove(nodes['Centered UVs'])
     remove_socket(scatter_node.node_tree, 'INPUT', 'UV Map')
 
-  if not self.use_edge_blur:
+  if not self.use_edge_blur and self.layering != 'hex_tiling':
     remove_socket(scatter_node.node_tree, 'INPUT', 'Cell Blending')
+  if not use_dithered_blending(self):
     nodes.remove(nodes['White Noise Texture'])
     remove_socket(scatter_coordinates, 'INPUT', 'Edge Blur')
     remove_socket(scatter_coordinates, 'INPUT', 'Edge Blur Noise')
@@ -620,7 +802,7 @@ def cleanup_options(self, scatter_node, scatter_coordinates):
     remove_socket(scatter_coordinates, 'INPUT', 'Edge Warp')
     remove_socket(scatter_coordinates, 'INPUT', 'Edge Warp Noise')
     scatter_coordinates.nodes.remove(scatter_coordinates.nodes['Edge Warp'])
-    if self.use_edge_blur:
+    if use_dithered_blending(self):
       scatter_coordinates.links.new(scatter_coordinates.nodes['Edge Blur'].outputs[2], scatter_coordinates.nodes['Voronoi Texture'].inputs[0])
     else:
       scatter_coordinates.links.new(scatter_coordinates.nodes['Shift Cells'].outputs[0], scatter_coordinates.nodes['Voronoi Texture'].inputs[0])
@@ -631,6 +813,226 @@ def cleanup_options(self, scatter_node, scatter_coordinates):
     remove_socket(scatter_node.node_tree, 'INPUT', 'Texture Warp')
     remove_socket(scatter_node.node_tree, 'INPUT', 'Texture Warp Scale')
 
+  if self.cell_engine != 'voronoi' and self.layering != 'hex_tiling':
+    use_grid_cells(scatter_coordinates, self.cell_engine)
+
+def add_cell_distance_output(scatter_coordinates, cells_node_name):
+  create_socket(scatter_coordinates, 'OUTPUT', 'NodeSocketFloat', 'Cell Distance')
+  coordinates_output = [x for x in scatter_coordinates.nodes if x.type == 'GROUP_OUTPUT'][0]
+  scatter_coordinates.links.new(scatter_coordinates.nodes[cells_node_name].outputs['Distance'], coordinates_output.inputs['Cell Distance'])
+
+def copy_coordinates_node(scatter_node, node_tree, name, offset):
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  coordinates_node = nodes['Scatter Coordinates']
+  new_coordinates = nodes.new('ShaderNodeGroup')
+  new_coordinates.node_tree = node_tree
+  new_coordinates.name = name
+  new_coordinates.label = name
+  new_coordinates.location = [coordinates_node.location[0], coordinates_node.location[1] - offset]
+  for input, new_input in zip(coordinates_node.inputs, new_coordinates.inputs):
+    if hasattr(input, 'default_value'):
+      new_input.default_value = input.default_value
+    if input.links:
+      links.new(input.links[0].from_socket, new_input)
+  return new_coordinates
+
+def mix_scatter_lookups(scatter_node, coordinates_node, other_coordinates, factor):
+  # Everything that depends on the cell, including normal correction and cell HSV, is evaluated again for the other coordinates
+  socket_pairs = [
+    (output, other_output) for output, other_output in zip(coordinates_node.outputs, other_coordinates.outputs)
+    if output.name != 'Cell Distance'
+  ]
+  return duplicate_branch(scatter_node.node_tree, socket_pairs, factor, offset=(0, other_coordinates.location[1] - coordinates_node.location[1] - 1000))
+
+def blend_cell_edges(self, scatter_node, scatter_coordinates):
+  # Looks up the second closest cell as well and fades into it near the cell edges, which is smooth after a single sample
+  if not self.use_edge_blur or use_dithered_blending(self) or self.layering == 'hex_tiling':
+    return
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  coordinates_node = nodes['Scatter Coordinates']
+
+  add_cell_distance_output(scatter_coordinates, 'Voronoi Texture')
+  second_coordinates = copy_coordinates_node(scatter_node, scatter_coordinates.copy(), 'Second Scatter Coordinates', 450)
+  second_coordinates.node_tree.nodes['Voronoi Texture'].feature = 'F2'
+
+  # F2 - F1 is twice the distance to the edge, so the weight is one half right on the edge
+  edge_distance = nodes.new('ShaderNodeMath')
+  edge_distance.operation = 'SUBTRACT'
+  edge_distance.name = 'Edge Distance'
+  edge_distance.location = [coordinates_node.location[0] + 200, coordinates_node.location[1] - 650]
+  links.new(second_coordinates.outputs['Cell Distance'], edge_distance.inputs[0])
+  links.new(coordinates_node.outputs['Cell Distance'], edge_distance.inputs[1])
+  edge_weight = nodes.new('ShaderNodeMapRange')
+  edge_weight.interpolation_type = 'SMOOTHSTEP'
+  edge_weight.name = 'Edge Weight'
+  edge_weight.location = [coordinates_node.location[0] + 400, coordinates_node.location[1] - 650]
+  edge_weight.inputs['From Min'].default_value = 0
+  edge_weight.inputs['To Min'].default_value = 0.5
+  edge_weight.inputs['To Max'].default_value = 1
+  links.new(edge_distance.outputs[0], edge_weight.inputs['Value'])
+  links.new(nodes['Group Input'].outputs['Cell Blending'], edge_weight.inputs['From Max'])
+
+  mix_scatter_lookups(scatter_node, coordinates_node, second_coordinates, edge_weight.outputs[0])
+
+def blend_hex_tiles(self, scatter_node, scatter_coordinates):
+  # Each point lies in a triangle of hexagon centers. Every corner places its own randomly transformed copy of the textures
+  # and the three copies are mixed by the barycentric weights, sharpened by Cell Blending.
+  if self.layering != 'hex_tiling':
+    return
+  nodes = scatter_node.node_tree.nodes
+  coordinates_node = nodes['Scatter Coordinates']
+  hex_corner = replace_voronoi(scatter_coordinates, get_hex_tiling_tree(0))
+  add_cell_distance_output(scatter_coordinates, hex_corner.name)
+  coordinates_nodes = [coordinates_node]
+  for corner in [1, 2]:
+    corner_tree = scatter_coordinates.copy()
+    corner_tree.nodes[hex_corner.name].node_tree = get_hex_tiling_tree(corner)
+    coordinates_nodes.append(copy_coordinates_node(scatter_node, corner_tree, 'Hex Corner %d Coordinates' % (corner + 1), 450 * corner))
+
+  def add_math(operation, a, b, location):
+    location = [coordinates_node.location[0] + location[0], coordinates_node.location[1] + location[1]]
+    return add_math_node(scatter_node.node_tree, 'ShaderNodeMath', operation, [a, b], location)
+
+  sharpness = add_math('DIVIDE', 1, add_math('MAXIMUM', nodes['Group Input'].outputs['Cell Blending'], 0.01, [200, -1350]), [400, -1350])
+  weights = [add_math('POWER', x.outputs['Cell Distance'], sharpness, [600, -1350 - 150 * idx]) for idx, x in enumerate(coordinates_nodes)]
+  first_two = add_math('ADD', weights[0], weights[1], [800, -1350])
+  all_three = add_math('ADD', first_two, weights[2], [800, -1500])
+  # The third corner is mixed in first, so the second corner's copy also contains that mix and the weights come out right
+  mix_scatter_lookups(scatter_node, coordinates_node, coordinates_nodes[2], add_math('DIVIDE', first_two, all_three, [1000, -1500]))
+  mix_scatter_lookups(scatter_node, coordinates_node, coordinates_nodes[1], add_math('DIVIDE', weights[0], first_two, [1000, -1350]))
+
+def add_overlap_cells(self, scatter_node, scatter_coordinates):
+  # Looks up the textures of the three neighboring square cells on the side of the cell that the point is on
+  # and lays each one over the result by its alpha. Neighbors are only defined for square cells.
+  if self.layering != 'overlapping' or get_overlap_cell_count(self) != 4:
+    return
+  if self.cell_engine != 'square':
+    self.report({'WARNING'}, 'Four overlap cells need Square Grid cells, so only the closest cell is searched')
+    return
+  nodes = scatter_node.node_tree.nodes
+  coordinates_node = nodes['Scatter Coordinates']
+  cells_node = scatter_coordinates.nodes['Cells']
+  # The factor is taken from each neighbor's lookup, so the mix is an alpha over of the already premultiplied neighbor
+  transparency = add_math_node(scatter_node.node_tree, 'ShaderNodeMath', 'SUBTRACT', [1, nodes['Scatter Source'].outputs[1]], [
+    coordinates_node.location[0] + 600, coordinates_node.location[1] - 450
+  ])
+  transparency.node.use_clamp = True
+  for neighbor_idx, neighbor in enumerate([(1, 0), (0, 1), (1, 1)]):
+    neighbor_tree = scatter_coordinates.copy()
+    neighbor_tree.nodes[cells_node.name].node_tree = get_grid_cells_tree('square', neighbor, True)
+    neighbor_coordinates = copy_coordinates_node(scatter_node, neighbor_tree, 'Neighbor Cell %d Coordinates' % (neighbor_idx + 1), 450 * (neighbor_idx + 1))
+    mix_scatter_lookups(scatter_node, coordinates_node, neighbor_coordinates, transparency)
+
+def replace_dithered_triplanar(node_tree, dithered_node):
+  nodes = node_tree.nodes
+  links = node_tree.links
+  triplanar_node = add_smooth_triplanar_node(nodes)
+  triplanar_node.location = dithered_node.location
+  triplanar_node.width = dithered_node.width
+  if 'Blending' in dithered_node.inputs:
+    triplanar_node.inputs['Blending'].default_value = dithered_node.inputs['Blending'].default_value
+  for output in dithered_node.outputs:
+    if output.name in triplanar_node.outputs:
+      for link in output.links:
+        links.new(triplanar_node.outputs[output.name], link.to_socket)
+  bpy.data.node_groups.remove(dithered_node.node_tree)
+  nodes.remove(dithered_node)
+  triplanar_node.name = 'Tri-Planar Mapping'
+  blend_triplanar_projections(node_tree, triplanar_node)
+  return triplanar_node
+
+def blend_triplanar_edges(self, scatter_node):
+  if self.projection_method != 'tri-planar' or self.triplanar_blend_method != 'smooth':
+    return
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  triplanar_node = replace_dithered_triplanar(scatter_node.node_tree, nodes['Tri-Planar Mapping'])
+  links.new(nodes['Group Input'].outputs['Tri-Planar Blending'], triplanar_node.inputs['Blending'])
+
+def get_object_variation_node(self, scatter_node):
+  # One random color per object, instance, or attribute value that the seed, scale, and color variation all read from
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  if 'Object Variation' in nodes:
+    return nodes['Object Variation']
+  location = [nodes['Group Input'].location[0], nodes['Group Input'].location[1] - 600]
+  if self.variation_source == 'object_random':
+    source_node = nodes.new('ShaderNodeObjectInfo')
+    source_output = source_node.outputs['Random']
+  else:
+    source_node = nodes.new('ShaderNodeAttribute')
+    source_node.attribute_type = 'INSTANCER' if self.variation_source == 'instancer_attribute' else 'OBJECT'
+    source_node.attribute_name = self.variation_attribute
+    source_output = source_node.outputs['Fac']
+  source_node.location = location
+  # Hashing the value lets whole numbers like object IDs vary just as much as random values
+  white_noise = nodes.new('ShaderNodeTexWhiteNoise')
+  white_noise.noise_dimensions = '1D'
+  white_noise.location = [location[0] + 200, location[1]]
+  links.new(source_output, white_noise.inputs['W'])
+  variation_node = get_shared_random_node(scatter_node, 'Object Variation', white_noise.outputs['Color'], ['Object Hue', 'Object Saturation', 'Object Value'])
+  return variation_node
+
+def vary_object_coordinates(self, scatter_node):
+  # Shifting the pattern by a few hundred cells per object has the same effect as a new seed
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  if self.variation_source == 'none':
+    return
+  # Tri-planar scatters do not go through the Pattern Scale node, so their coordinates are varied where they enter the cells
+  target_inputs = [nodes[name].inputs[input_name] for name, input_name in [('Pattern Scale', 0), ('Scatter Coordinates', 'Vector')] if name in nodes]
+  target_inputs = [x for x in target_inputs if x.links]
+  if not target_inputs:
+    self.report({'WARNING'}, 'Object Variation could not find the scatter coordinates, so only the colors vary per object')
+    return
+  target_input = target_inputs[0]
+  node_tree = scatter_node.node_tree
+  for name, default in [('Object Seed', 1), ('Object Scale', 0)]:
+    socket = create_socket(node_tree, 'INPUT', 'NodeSocketFloat', name)
+    socket.default_value = default
+    socket.min_value = 0
+    socket.max_value = 1
+  group_inputs = nodes['Group Input'].outputs
+  variation_node = get_object_variation_node(self, scatter_node)
+  location = [target_input.node.location[0] - 400, target_input.node.location[1] - 200]
+
+  offset = nodes.new('ShaderNodeCombineXYZ')
+  offset.location = location
+  for axis_idx, output_name in enumerate(['Offset X', 'Offset Y']):
+    axis_offset = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY', [variation_node.outputs[output_name], group_inputs['Object Seed']], [location[0] - 200, location[1] - 150 * axis_idx])
+    links.new(add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY', [axis_offset, 400], [location[0] - 200, location[1] - 300 - 150 * axis_idx]), offset.inputs[axis_idx])
+  # The scale changes by up to the Object Scale fraction either way
+  scale = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY', [variation_node.outputs['Offset Z'], group_inputs['Object Scale']], [location[0], location[1] + 200])
+  scale = add_math_node(node_tree, 'ShaderNodeMath', 'MULTIPLY_ADD', [scale, 2, 1], [location[0] + 200, location[1] + 200])
+  vector = target_input.links[0].from_socket
+  scaled_vector = add_math_node(node_tree, 'ShaderNodeVectorMath', 'MULTIPLY_ADD', [vector, scale, offset.outputs[0]], [location[0] + 200, location[1]])
+  links.new(scaled_vector, target_input)
+
+def vary_object_colors(self, scatter_node):
+  nodes = scatter_node.node_tree.nodes
+  links = scatter_node.node_tree.links
+  color_inputs = [x for x in nodes['Group Output'].inputs if x.name in ['Albedo', 'Image', 'Emission'] and x.links]
+  if self.variation_source == 'none' or not color_inputs:
+    return
+  for name, default in [('Object Hue', 0.1), ('Object Saturation', 0.1), ('Object Value', 0.1)]:
+    socket = create_socket(scatter_node.node_tree, 'INPUT', 'NodeSocketFloat', name)
+    socket.default_value = default
+    socket.min_value = 0
+    socket.max_value = 1
+  variation_node = get_object_variation_node(self, scatter_node)
+  for input_name in ['Hue', 'Saturation', 'Value']:
+    links.new(nodes['Group Input'].outputs['Object ' + input_name], variation_node.inputs[input_name])
+  output_location = nodes['Group Output'].location
+  for color_idx, color_input in enumerate(color_inputs):
+    hsv_node = nodes.new('ShaderNodeHueSaturation')
+    hsv_node.location = [output_location[0] - 200, output_location[1] - 200 * color_idx]
+    for input_name in ['Hue', 'Saturation', 'Value']:
+      links.new(variation_node.outputs[input_name], hsv_node.inputs[input_name])
+    links.new(color_input.links[0].from_socket, hsv_node.inputs['Color'])
+    links.new(hsv_node.outputs[0], color_input)
+
 def cleanup_sockets(self, scatter_node, transparency):
   inputs = scatter_node.inputs
   node_tree_inputs = get_io_sockets(scatter_node.node_tree, 'INPUT')
@@ -728,7 +1130,15 @@ def setup_scatter_node(self, context, selected_nodes, should_remove_images=True)
   corrected_normal_outputs = correct_normals(self, context, scatter_node, randomize_color_outputs)
   manage_alpha(self, scatter_node, scatter_sources, corrected_normal_outputs, transparency)
   cleanup_layering(self, scatter_node, scatter_sources)
+  if not uses_overlapping_tree(self):
+    pack_scatter_sources(self, context, scatter_node, scatter_sources, sorted_textures)
   cleanup_options(self, scatter_node, scatter_coordinates)
+  vary_object_coordinates(self, scatter_node)
+  blend_cell_edges(self, scatter_node, scatter_coordinates)
+  blend_hex_tiles(self, scatter_node, scatter_coordinates)
+  add_overlap_cells(self, scatter_node, scatter_coordinates)
+  blend_triplanar_edges(self, scatter_node)
+  vary_object_colors(self, scatter_node)
   cleanup_sockets(self, scatter_node, transparency)
   cleanup_groups()
   connect_shader(self, selected_nodes, scatter_node, transparency)
@@ -789,8 +1199,47 @@ def create_coordinates_node(self, context, selected_nodes):
     remove_socket(scatter_node.node_tree, 'INPUT', 'Texture Warp')
     remove_socket(scatter_node.node_tree, 'INPUT', 'Texture Warp Scale')
 
+  if self.cell_engine != 'voronoi':
+    use_grid_cells(scatter_node.node_tree, self.cell_engine)
+  if self.projection_method == 'tri-planar' and self.triplanar_blend_method == 'smooth':
+    replace_dithered_triplanar(tri_planar.id_data, tri_planar)
+
   return scatter_node
 
+def share_layer_cells(self, master_node, scatter_nodes):
+  # Only the first layer searches for cells. The other layers reuse its closest cell and hash their own random values
+  # and offsets from it, so adding layers only adds texture lookups.
+  if not self.use_shared_cells or len(scatter_nodes) < 2:
+    return
+  links = master_node.node_tree.links
+  first_node = scatter_nodes[0]
+  first_coordinates = first_node.node_tree.nodes['Scatter Coordinates']
+  cells_name = 'Voronoi Texture' if 'Voronoi Texture' in first_coordinates.node_tree.nodes else 'Cells'
+  cells_node = first_coordinates.node_tree.nodes[cells_name]
+  coordinates_output = [x for x in first_coordinates.node_tree.nodes if x.type == 'GROUP_OUTPUT'][0]
+  cell_sockets = {'Cell Color': ('NodeSocketColor', 'Color'), 'Cell Position': ('NodeSocketVector', 'Position')}
+  for name, (socket_type, cells_output) in cell_sockets.items():
+    create_socket(first_coordinates.node_tree, 'OUTPUT', socket_type, name)
+    first_coordinates.node_tree.links.new(cells_node.outputs[cells_output], coordinates_output.inputs[name])
+    create_socket(first_node.node_tree, 'OUTPUT', socket_type, name)
+    first_node.node_tree.links.new(first_coordinates.outputs[name], first_node.node_tree.nodes['Group Output'].inputs[name])
+
+  for layer_idx, scatter_node in enumerate(scatter_nodes[1:], 1):
+    nodes = scatter_node.node_tree.nodes
+    # The layers have to look at the same cells, so they cannot be offset from each other
+    for randomize_name in ['Randomize X', 'Randomize Y']:
+      nodes[randomize_name].inputs[1].default_value = first_node.node_tree.nodes[randomize_name].inputs[1].default_value
+    coordinates_node = nodes['Scatter Coordinates']
+    shared_cells = replace_voronoi(coordinates_node.node_tree, get_shared_cells_tree(), cells_name)
+    shared_cells.inputs['Layer'].default_value = layer_idx
+    coordinates_input = [x for x in coordinates_node.node_tree.nodes if x.type == 'GROUP_INPUT'][0]
+    for name, (socket_type, cells_output) in cell_sockets.items():
+      create_socket(coordinates_node.node_tree, 'INPUT', socket_type, name).hide_value = True
+      coordinates_node.node_tree.links.new(coordinates_input.outputs[name], shared_cells.inputs[name])
+      create_socket(scatter_node.node_tree, 'INPUT', socket_type, name).hide_value = True
+      scatter_node.node_tree.links.new(nodes['Group Input'].outputs[name], coordinates_node.inputs[name])
+      links.new(first_node.outputs[name], scatter_node.inputs[name])
+
 def create_layered_node(self, context, selected_nodes):
 
   def create_master_node():
@@ -884,6 +1333,7 @@ def create_layered_node(self, context, selected_nodes):
   master_node = create_master_node()
   scatter_nodes = create_inner_nodes(master_node)
   link_inner_nodes(master_node, scatter_nodes)
+  share_layer_cells(self, master_node, scatter_nodes)
   connect_shader(self, selected_nodes, master_node, transparency=True)
   remove_images(selected_nodes)
   return master_node
@@ -918,13 +1368,21 @@ def voronoi_scatter(self, context, prev_scatter_sources):
     selected_nodes = prev_textures + new_textures
 
 
-  if self.layering == 'coordinates':
+  if self.backend == 'osl':
+    scatter_node = create_osl_scatter_node(self, context, selected_nodes, sort_textures(self, context, selected_nodes))
+    if not scatter_node:
+      return
+    if self.layering != 'coordinates':
+      connect_shader(self, selected_nodes, scatter_node, transparency=False)
+      remove_images(selected_nodes)
+  elif self.layering == 'coordinates':
     scatter_node = create_coordinates_node(self, context, selected_nodes)
   elif self.layering == 'layered':
     scatter_node = create_layered_node(self, context, selected_nodes)
   else:
     scatter_node = setup_scatter_node(self, context, selected_nodes)
-  setup_defaults(self, scatter_node)
+  if self.backend == 'nodes':
+    setup_defaults(self, scatter_node)
 
   if prev_values:
     for input in scatter_node.inputs:
@@ -939,6 +1397,13 @@ def voronoi_scatter(self, context, prev_scatter_sources):
     scatter_node.location = prev_scatter_node.location
     nodes.remove(prev_scatter_node)
 
+  if self.layering != 'coordinates' and self.backend == 'nodes':
+    clear_shader_lods(scatter_node)
+    if self.use_distance_lod:
+      add_distance_lod(scatter_node)
+    if self.use_simple_indirect:
+      add_light_path_switch(scatter_node)
+
 class NODE_OT_scatter(Operator):
   bl_label = "Scatter Images"
   bl_idname = "node.scatter"
@@ -947,6 +1412,15 @@ class NODE_OT_scatter(Operator):
   bl_region_type = "UI"
   bl_options = {'REGISTER', 'UNDO'}
 
+  backend: bpy.props.EnumProperty(
+    name = "Backend",
+    description = "What the scatter is built out of",
+    items = [
+      ("nodes", "Nodes", "Builds the scatter out of shader nodes, which works in Eevee and Cycles and is fully editable"),
+      ("osl", "OSL Script", "Writes the whole scatter into a single Open Shading Language script, which compiles much faster for large image sets. Cycles only and images must be saved to disk")
+    ],
+    default = defaults.scatter['backend'],
+  )
   projection_method: bpy.props.EnumProperty(
     name = "Mapping",
     description = "How the texture is projected onto the model. The performance difference is negligible",
@@ -956,6 +1430,15 @@ class NODE_OT_scatter(Operator):
     ],
     default = defaults.scatter['projection_method'],
   )
+  triplanar_blend_method: bpy.props.EnumProperty(
+    name = "Tri-Planar Blending",
+    description = "How the tri-planar projections are blended where they meet",
+    items = [
+      ("dither", "Dithered", "Jitters between the projections with white noise. Needs many render samples to look smooth and makes displacement jagged"),
+      ("smooth", "Smooth", "Evaluates the scatter a second time for the second strongest projection and mixes the two. Smooth after a single sample and works with displacement, but the second evaluation runs everywhere, not only where the projections meet, so it doubles the cost of the scatter")
+    ],
+    default = defaults.scatter['triplanar_blend_method'],
+  )
   texture_interpolation: bpy.props.EnumProperty(
     name = "Pixel Interpolation",
     description = "The pixel interpolation for each image",
@@ -972,17 +1455,48 @@ class NODE_OT_scatter(Operator):
       ("coordinates", "Just Coordinates", "Creates a scatter node that only outputs the scattered vectors for greater flexibility"),
       ("simple", "Interspersed", "A random texture is chosen per cell and each texture is set to repeat to prevent gaps and all transparency settings are removed to improve performance"),
       ("blended", "Noise Mixed", "Each texture is scattered on its own and then they are all blended together using a noise texture"),
+      ("hex_tiling", "Hex Tiling", "Three randomly rotated and offset copies of the textures are placed on a hexagonal grid and smoothly blended together. Good for breaking up the repetition of tileable textures with no noise and a fixed cost of three lookups"),
       ("simple_alpha", "Interspersed Alpha", "A random texture is chosen per cell and adds ability to change the background, alpha clip threshold, and scatter density"),
       ("layered", "Layered Alpha", "Creates Interspersed Alpha scatter nodes for each texture and chains them all together, which allows for very a basic overlap that is faster than using Overlapping"),
-      ("overlapping", "Overlapping Alpha", "All the options of Simple Alpha with the additional benefit of enabling neighboring cells to overlap each other. This increases shader compilation time since 9 cells are calculated rather than 1")
+      ("overlapping", "Overlapping Alpha", "All the options of Simple Alpha with the additional benefit of enabling neighboring cells to overlap each other. This increases shader compilation time since up to 9 cells are calculated rather than 1")
     ],
     default = defaults.scatter['layering'],
   )
+  use_shared_cells: bpy.props.BoolProperty(
+    name = "Shared Cells",
+    description = "Layers reuse the cells of the first layer with their own random values and offsets instead of each searching for cells, so adding layers only adds texture lookups. The layers are less independent of each other and Cell Blending is always dithered",
+    default = defaults.scatter['use_shared_cells'],
+  )
+  overlap_cells: bpy.props.EnumProperty(
+    name = "Overlap Cells",
+    description = "How many cells are searched for textures that overlap each point in the Overlapping Alpha method. Fewer cells compile and render faster but clip textures that reach further",
+    items = get_overlap_cells_items(),
+    default = defaults.scatter['overlap_cells'],
+  )
+  cell_engine: bpy.props.EnumProperty(
+    name = "Cells",
+    description = "The pattern that divides the surface into cells",
+    items = [
+      ("voronoi", "Voronoi", "Organic cells from a Voronoi texture, which searches the neighboring cells for every pixel"),
+      ("square", "Square Grid", "Jittered square cells found with a single floor and hash. Cheaper than Voronoi but the cell edges form a grid"),
+      ("hex", "Hex Grid", "Jittered hexagonal cells found with two floors and a hash. Cheaper than Voronoi with less obvious rows than the square grid")
+    ],
+    default = defaults.scatter['cell_engine'],
+  )
   use_edge_blur: bpy.props.BoolProperty(
     name = "Cell Blending",
     description = "Adds ability to blend the edges of each voronoi cell without distorting the texture. This helps seams between cells appear less obvious, especially for tileable textures, but requires more render samples for smooth results. Must be baked to use with true displacement",
     default = defaults.scatter['use_edge_blur'],
   )
+  cell_blend_method: bpy.props.EnumProperty(
+    name = "Blending Method",
+    description = "How the edges of neighboring cells are blended together",
+    items = [
+      ("dither", "Dithered", "Jitters the cell lookup with white noise. Only one texture lookup is needed, but it takes many render samples to look smooth"),
+      ("smooth", "Smooth", "Looks up the two closest cells and fades between them near the edges. This doubles the texture lookups but is smooth after a single sample and works with true displacement. Not supported in the Just Coordinates or Overlapping Alpha methods")
+    ],
+    default = defaults.scatter['cell_blend_method'],
+  )
   use_edge_warp: bpy.props.BoolProperty(
     name = "Cell Warping",
     description = "Adds ability to distort the edges of each voronoi cell without distorting the texture. This helps seams between cells appear less obvious, especially for tileable textures",
@@ -1003,11 +1517,47 @@ class NODE_OT_scatter(Operator):
     description = "Adds easy controls for varying the color of each instance",
     default = defaults.scatter['use_random_col'],
   )
+  use_shared_random: bpy.props.BoolProperty(
+    name = "Shared Random Fields",
+    description = "Cell HSV and Noise HSV compute one random field for all channels and adjust each channel with a single node, instead of adding a noise or random group per channel. Data channels share the color noise scale, detail, and warp",
+    default = defaults.scatter['use_shared_random'],
+  )
+  variation_source: bpy.props.EnumProperty(
+    name = "Object Variation",
+    description = "Varies the scatter seed, scale, and color of each object that uses the material, so that one material can be shared instead of duplicated for variety",
+    items = [
+      ("none", "None", "Every object that uses the material looks the same"),
+      ("object_random", "Object Random", "Uses the Random output of Object Info, which is different for every object and instance"),
+      ("object_attribute", "Object Attribute", "Uses a custom property or attribute of the object, so that objects with the same value look the same"),
+      ("instancer_attribute", "Instancer Attribute", "Uses an attribute of the instancer, such as a geometry nodes instance attribute or a particle property")
+    ],
+    default = defaults.scatter['variation_source'],
+  )
+  variation_attribute: bpy.props.StringProperty(
+    name = "Attribute",
+    description = "Name of the attribute that drives the per-object variation",
+    default = defaults.scatter['variation_attribute'],
+  )
+  use_simple_indirect: bpy.props.BoolProperty(
+    name = "Simplify Indirect",
+    description = "Only camera rays evaluate the full scatter. Reflections, bounces and shadows use the average color of each channel instead, which can greatly speed up interior renders in Cycles",
+    default = defaults.scatter['use_simple_indirect'],
+  )
+  use_distance_lod: bpy.props.BoolProperty(
+    name = "Distance LOD",
+    description = "Switches to a far field texture of the scatter beyond the LOD Distance and to a flat average color beyond the LOD Far Distance. Both distances are inputs on the scatter node. Run Bake Far Field afterwards to create the far field texture",
+    default = defaults.scatter['use_distance_lod'],
+  )
   use_pbr: bpy.props.BoolProperty(
     name = "Auto Detect",
     description = "Automatically detects PBR textures based on the image name and scatters each texture set accordingly. Not supported in the Overlapping Alpha method",
     default = defaults.scatter['use_pbr'],
   )
+  use_channel_packing: bpy.props.BoolProperty(
+    name = "Pack Data Channels",
+    description = "Packs up to three data maps of each texture set, such as roughness, metallic, and AO, into the red, green, and blue of one image that is saved next to the source images. Each pack is looked up once and split back into the channels, which saves texture lookups and texture slots",
+    default = defaults.scatter['use_channel_packing'],
+  )
   use_manage_col: bpy.props.BoolProperty(
     name = "Auto Manage",
     description = "Automatically sets non-color maps to the right color space",
@@ -1050,19 +1600,43 @@ class NODE_OT_scatter(Operator):
   def draw(self, context):
     layout = self.layout
     layout.use_property_split = True
+    layout.prop(self, "backend", expand=True)
     layout.prop(self, "projection_method", expand=True)
+    triplanar_row = layout.row()
+    triplanar_row.enabled = self.projection_method == "tri-planar" and self.backend == "nodes"
+    triplanar_row.prop(self, "triplanar_blend_method", expand=True)
     layout.prop(self, "layering")
+    shared_cells_row = layout.row()
+    shared_cells_row.enabled = self.backend == "nodes" and self.layering == "layered"
+    shared_cells_row.prop(self, "use_shared_cells")
+    overlap_row = layout.row()
+    overlap_row.enabled = self.backend == "nodes" and self.layering == "overlapping"
+    overlap_row.prop(self, "overlap_cells")
+    cell_row = layout.row()
+    cell_row.enabled = self.backend == "nodes" and self.layering != "hex_tiling"
+    # Four cells search the square grid neighbors, so other cells fall back to the closest cell
+    cell_row.alert = self.layering == "overlapping" and self.overlap_cells == "4" and self.cell_engine != "square"
+    cell_row.prop(self, "cell_engine")
+    if cell_row.alert:
+      layout.label(text="Four overlap cells need Square Grid cells", icon='ERROR')
     layout.prop(self, "texture_interpolation")
     pbr = layout.column(heading="PBR Channels")
     pbr_row = pbr.row()
-    pbr_row.enabled = (self.layering != "coordinates" and self.layering != "overlapping")
+    pbr_row.enabled = (self.layering != "coordinates" and not uses_overlapping_tree(self))
     pbr_row.prop(self, "use_pbr")
+    packing_row = pbr.row()
+    packing_row.enabled = self.use_pbr and self.backend == "nodes" and self.layering != "coordinates" and not uses_overlapping_tree(self)
+    packing_row.prop(self, "use_channel_packing")
     col = layout.column(heading="Color")
     col_row = col.row()
     col_row.enabled = (self.layering != "coordinates")
     col_row.prop(self, "use_manage_col")
     options = layout.column(heading="Additional Controls")
+    options.enabled = self.backend == "nodes"
     options.prop(self, "use_edge_blur")
+    blend_method_row = options.row()
+    blend_method_row.enabled = self.use_edge_blur and self.layering not in ["coordinates", "overlapping", "hex_tiling"] and self.cell_engine == "voronoi" and not (self.layering == "layered" and self.use_shared_cells)
+    blend_method_row.prop(self, "cell_blend_method", expand=True)
     options.prop(self, "use_edge_warp")
     random_col_row = options.row()
     random_col_row.enabled = self.layering != "coordinates"
@@ -1070,7 +1644,20 @@ class NODE_OT_scatter(Operator):
     noise_col_row = options.row()
     noise_col_row.enabled = self.layering != "coordinates"
     noise_col_row.prop(self, "use_noise_col")
+    shared_random_row = options.row()
+    shared_random_row.enabled = (self.use_random_col or self.use_noise_col) and self.backend == "nodes" and self.layering != "coordinates" and not uses_overlapping_tree(self)
+    shared_random_row.prop(self, "use_shared_random")
     options.prop(self, "use_texture_warp")
+    variation = layout.column(heading="Variation")
+    variation.enabled = self.layering != "coordinates" and self.backend == "nodes"
+    variation.prop(self, "variation_source")
+    attribute_row = variation.row()
+    attribute_row.enabled = self.variation_source in ["object_attribute", "instancer_attribute"]
+    attribute_row.prop(self, "variation_attribute")
+    performance = layout.column(heading="Performance")
+    performance.enabled = self.layering != "coordinates" and self.backend == "nodes"
+    performance.prop(self, "use_simple_indirect")
+    performance.prop(self, "use_distance_lod")
 
   @classmethod
   def poll(cls, context):
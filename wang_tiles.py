@@ -0,0 +1,256 @@
+'''
+Copyright (C) 2020-2023 Orange Turbine
+https://orangeturbine.com
+orangeturbine@cgcookie.com
+
+This file is part of Scattershot, created by Jonathan Lampel.
+
+All code distributed with this add-on is open source as described below.
+
+Scattershot is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 3
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <https://www.gnu.org/licenses/>.
+'''
+
+import bpy
+import numpy as np
+from .bake import (
+  get_bake_properties, set_bake_properties, set_plane_bake_properties, set_bake_color_space, create_bake_plane, remove_bake_plane,
+  bake_plane_channel, get_format_settings, get_file_path
+)
+from .defaults import data_channels, node_tree_names
+from .grid_cells import add_math_node
+from .utilities.node_interface import create_socket
+from .utilities.utilities import get_active_scatter_node, get_node_tree_material, mode_toggle, save_image
+from .utilities.image_processing import get_image_pixels, new_image_from_pixels, create_tile_atlas
+
+# Two colors per corner make the complete set of 16 tiles, so any random choice of corner colors has a matching tile
+corner_colors = 2
+atlas_columns = 4
+
+
+def get_scatter_channels(scatter_node):
+  return [x for x in scatter_node.outputs if x.name != 'Random Color' and not x.name.startswith('Baked ')]
+
+
+def create_runtime_tree(name, atlas_images, tile_resolution):
+  # Each tile corner is hashed into a corner color, the four colors together pick the tile and each channel is a single image lookup
+  node_tree = bpy.data.node_groups.new(name, 'ShaderNodeTree')
+  nodes = node_tree.nodes
+  links = node_tree.links
+  create_socket(node_tree, 'INPUT', 'NodeSocketVector', 'Vector')
+  tile_scale = create_socket(node_tree, 'INPUT', 'NodeSocketFloat', 'Tile Scale')
+  tile_scale.default_value = 1
+  for channel in atlas_images:
+    if channel in data_channels:
+      socket_type = 'NodeSocketFloat'
+    elif channel == 'Normal':
+      socket_type = 'NodeSocketVector'
+    else:
+      socket_type = 'NodeSocketColor'
+    create_socket(node_tree, 'OUTPUT', socket_type, channel)
+  input_node = nodes.new('NodeGroupInput')
+  input_node.location = [-1200, 0]
+  output_node = nodes.new('NodeGroupOutput')
+  output_node.location = [1400, 0]
+
+  def add_vector_math(operation, a, b=None, location=(0, 0)):
+    return add_math_node(node_tree, 'ShaderNodeVectorMath', operation, [a, b], location)
+
+  def add_math(operation, a, b=None, location=(0, 0)):
+    return add_math_node(node_tree, 'ShaderNodeMath', operation, [a, b], location)
+
+  scaled = add_vector_math('SCALE', input_node.outputs['Vector'], None, (-1000, 0))
+  links.new(input_node.outputs['Tile Scale'], scaled.node.inputs['Scale'])
+  position = add_vector_math('MULTIPLY', scaled, (1, 1, 0), (-850, 0))
+  cell = add_vector_math('FLOOR', position, None, (-700, 0))
+  # The texel inset keeps linear filtering from reaching into the neighboring tile of the atlas
+  inset = 0.5 / tile_resolution
+  fraction = add_vector_math('MINIMUM', add_vector_math('MAXIMUM', add_vector_math('SUBTRACT', position, cell, (-550, 100)), (inset, inset, 0), (-400, 100)), (1 - inset, 1 - inset, 0), (-250, 100))
+
+  tile_idx = None
+  for corner_idx, corner in enumerate([(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0)]):
+    hash_node = nodes.new('ShaderNodeTexWhiteNoise')
+    hash_node.noise_dimensions = '3D'
+    hash_node.location = [-400, -200 - 200 * corner_idx]
+    links.new(add_vector_math('ADD', cell, corner, (-550, -200 - 200 * corner_idx)), hash_node.inputs['Vector'])
+    color = add_math('MULTIPLY', add_math('FLOOR', add_math('MULTIPLY', hash_node.outputs['Value'], corner_colors - 0.0001, (-200, -200 - 200 * corner_idx)), None, (-50, -200 - 200 * corner_idx)), corner_colors ** corner_idx, (100, -200 - 200 * corner_idx))
+    tile_idx = color if tile_idx is None else add_math('ADD', tile_idx, color, (250, -200 - 200 * corner_idx))
+
+  rows = corner_colors ** 4 // atlas_columns
+  column = add_math('FLOORED_MODULO', tile_idx, atlas_columns, (400, -300))
+  row = add_math('FLOOR', add_math('DIVIDE', tile_idx, atlas_columns, (400, -450)), None, (550, -450))
+  tile_offset = nodes.new('ShaderNodeCombineXYZ')
+  tile_offset.location = [700, -300]
+  links.new(column, tile_offset.inputs[0])
+  links.new(row, tile_offset.inputs[1])
+  atlas_vector = add_vector_math('DIVIDE', add_vector_math('ADD', tile_offset.outputs[0], fraction, (850, 0)), (atlas_columns, rows, 1), (1000, 0))
+
+  for channel_idx, (channel, image) in enumerate(atlas_images.items()):
+    texture = nodes.new('ShaderNodeTexImage')
+    texture.image = image
+    texture.extension = 'EXTEND'
+    texture.location = [1150, -300 * channel_idx]
+    links.new(atlas_vector, texture.inputs['Vector'])
+    links.new(texture.outputs[0], output_node.inputs[channel])
+  return node_tree
+
+
+def bake_wang_tiles(self, context, scatter_node):
+  material = get_node_tree_material(scatter_node.id_data)
+  scatter_name = scatter_node.node_tree.name
+  preferences = context.preferences.addons[__package__].preferences
+  prev_selected = [x.name for x in context.selected_objects]
+  prev_active = context.view_layer.objects.active
+  prev_bake_properties = get_bake_properties(context.scene)
+  set_plane_bake_properties(context.scene, self.samples)
+  # Each corner color gets a two by two tile patch of the scatter
+  plane = create_bake_plane(context, material, corner_colors * 2 * self.tile_size, 2 * self.tile_size)
+  atlas_images = {}
+  try:
+    for output in get_scatter_channels(scatter_node):
+      source_image = bake_plane_channel(
+        context, plane, material, output, 'Scattershot Wang Source', self.tile_resolution * corner_colors * 2, self.tile_resolution * 2
+      )
+      source = get_image_pixels(source_image)
+      bpy.data.images.remove(source_image)
+      atlas = create_tile_atlas(source, self.tile_resolution, self.blend_width, corner_colors, atlas_columns)
+      image_name = f"{scatter_name} {output.name} Wang Tiles"
+      if image_name in bpy.data.images:
+        bpy.data.images.remove(bpy.data.images[image_name])
+      image = new_image_from_pixels(image_name, atlas, is_data=True)
+      set_bake_color_space(image, output.name)
+      format_settings = get_format_settings(preferences, output.name)
+      image.filepath_raw = get_file_path(preferences, image.name, format_settings)
+      save_image(context, image, format_settings)
+      atlas_images[output.name] = image
+  finally:
+    remove_bake_plane(plane)
+    set_bake_properties(context.scene, prev_bake_properties)
+    for obj in context.scene.objects:
+      obj.select_set(obj.name in prev_selected)
+    context.view_layer.objects.active = prev_active
+
+  tree_name = f"{node_tree_names['wang_tiles']} {scatter_name}"
+  prev_tree = bpy.data.node_groups.get(tree_name)
+  node_tree = create_runtime_tree(tree_name, atlas_images, self.tile_resolution)
+  nodes = scatter_node.id_data.nodes
+  links = scatter_node.id_data.links
+  runtime_node = nodes.new('ShaderNodeGroup')
+  runtime_node.node_tree = node_tree
+  runtime_node.label = 'Wang Tiles'
+  runtime_node.width = scatter_node.width
+  runtime_node.inputs['Tile Scale'].default_value = 1 / self.tile_size
+  # Baking again replaces the previous Wang Tiles node and keeps its connections
+  prev_runtime_nodes = [x for x in nodes if x.type == 'GROUP' and x.node_tree == prev_tree]
+  if prev_runtime_nodes:
+    prev_runtime_node = prev_runtime_nodes[0]
+    runtime_node.location = prev_runtime_node.location
+    for input in prev_runtime_node.inputs:
+      for link in input.links:
+        links.new(link.from_socket, runtime_node.inputs[input.name])
+    for output in prev_runtime_node.outputs:
+      if output.name in runtime_node.outputs:
+        for link in output.links:
+          links.new(runtime_node.outputs[output.name], link.to_socket)
+    for node in prev_runtime_nodes:
+      nodes.remove(node)
+  else:
+    runtime_node.location = [scatter_node.location[0], scatter_node.location[1] + 300]
+    uv_node = nodes.new('ShaderNodeUVMap')
+    uv_node.location = [runtime_node.location[0] - 250, runtime_node.location[1]]
+    links.new(uv_node.outputs[0], runtime_node.inputs['Vector'])
+  # The scatter node is left in place so that it can be reconnected if the tiles need to be baked again
+  for output in get_scatter_channels(scatter_node):
+    for link in output.links:
+      links.new(runtime_node.outputs[output.name], link.to_socket)
+  if prev_tree and not prev_tree.users:
+    bpy.data.node_groups.remove(prev_tree)
+    node_tree.name = tree_name
+  return runtime_node
+
+
+class NODE_OT_bake_wang_tiles(bpy.types.Operator):
+  bl_label = "Bake Wang Tiles"
+  bl_idname = "node.bake_wang_tiles"
+  bl_description = "Bakes the selected scatter node into a set of 16 seamless tiles and replaces it with a node that randomly lays them out, which is much faster to render"
+  bl_space_type = "NODE_EDITOR"
+  bl_region_type = "UI"
+  bl_options = {'REGISTER', 'UNDO'}
+
+  tile_resolution: bpy.props.IntProperty(
+    name = "Tile Resolution",
+    description = "The width and height of each tile in pixels. The tiles are saved together in one image that is four tiles wide and tall",
+    default = 512,
+    min = 16,
+    max = 4096
+  )
+  tile_size: bpy.props.FloatProperty(
+    name = "Tile Size",
+    description = "How much of the scatter's UV space each tile covers. Larger tiles repeat less often but need a higher resolution",
+    default = 1,
+    min = 0.01,
+    soft_max = 4
+  )
+  blend_width: bpy.props.FloatProperty(
+    name = "Blend Width",
+    description = "How much of each tile is blended where the pieces of its four corners meet. Narrow blends keep the tiles sharp, wide blends hide the seams through the middle of the tiles but look ghosted",
+    default = 0.1,
+    min = 0.01,
+    max = 0.9,
+    subtype = 'FACTOR'
+  )
+  samples: bpy.props.IntProperty(
+    name = "Samples",
+    description = "Render samples used for baking the scatter",
+    default = 8,
+    min = 1
+  )
+
+  @classmethod
+  def poll(cls, context):
+    return context.area.ui_type == 'ShaderNodeTree' and get_active_scatter_node(context)
+
+  def invoke(self, context, event):
+    return context.window_manager.invoke_props_dialog(self)
+
+  def draw(self, context):
+    layout = self.layout
+    layout.use_property_split = True
+    layout.prop(self, "tile_resolution")
+    layout.prop(self, "tile_size")
+    layout.prop(self, "blend_width")
+    layout.prop(self, "samples")
+
+  def execute(self, context):
+    scatter_node = get_active_scatter_node(context)
+    if not get_node_tree_material(scatter_node.id_data):
+      self.report({'ERROR'}, 'Wang tiles can only be baked from scatter nodes that are directly in a material')
+      return {'CANCELLED'}
+    if 'Tri-Planar Mapping' in scatter_node.node_tree.nodes:
+      self.report({'ERROR'}, 'Wang tiles are laid out in UV space, so the scatter node must use UV mapping')
+      return {'CANCELLED'}
+    if not get_scatter_channels(scatter_node):
+      self.report({'ERROR'}, 'The scatter node has no channels to bake')
+      return {'CANCELLED'}
+    # switching modes prevents context errors
+    prev_mode = mode_toggle(context, 'OBJECT')
+    bake_wang_tiles(self, context, scatter_node)
+    mode_toggle(context, prev_mode)
+    return {'FINISHED'}
+
+
+def register():
+  bpy.utils.register_class(NODE_OT_bake_wang_tiles)
+
+def unregister():
+  bpy.utils.unregister_class(NODE_OT_bake_wang_tiles)